@@ -14,6 +14,17 @@ uint64_t last_sample_time = 0;
 #define CONVERT_G_TO_MS2 9.80665
 float buffer[TOTAL_BUFFER_SIZE] = {0};
 int buffer_index = 0;
+// Set to 1 to send packed binary frames instead of ASCII CSV (see 0_PythonScript/imu_protocol.py)
+#define BINARY_FRAMES 0
+#define FRAME_MAGIC 0xA5
+#define SAMPLES_PER_FRAME 4
+#define ACCEL_SCALE 100.0
+#define GYRO_SCALE 10.0
+#define TEMP_SCALE 100.0
+#define FRAME_HEADER_SIZE 6
+uint8_t frame[FRAME_HEADER_SIZE + SAMPLES_PER_FRAME * 6 * 2];
+uint8_t frame_samples = 0;
+uint16_t frame_seq = 0;
 // Bluetooth setup
 BLEDis bledis; 
 BLEUart bleuart; 
@@ -54,6 +65,35 @@ float ei_get_sign(float number) {
     return (number >= 0.0) ? 1.0 : -1.0;
 }
 
+void put_int16(uint8_t* dst, float value) {
+    int32_t scaled = lroundf(value);
+    if (scaled > 32767) scaled = 32767;
+    if (scaled < -32768) scaled = -32768;
+    dst[0] = scaled & 0xFF;
+    dst[1] = (scaled >> 8) & 0xFF;
+}
+
+void sendBinarySample(float ax, float ay, float az, float gx, float gy, float gz) {
+    uint8_t* dst = frame + FRAME_HEADER_SIZE + frame_samples * 12;
+    put_int16(dst, ax * ACCEL_SCALE);
+    put_int16(dst + 2, ay * ACCEL_SCALE);
+    put_int16(dst + 4, az * ACCEL_SCALE);
+    put_int16(dst + 6, gx * GYRO_SCALE);
+    put_int16(dst + 8, gy * GYRO_SCALE);
+    put_int16(dst + 10, gz * GYRO_SCALE);
+    frame_samples++;
+    if (frame_samples == SAMPLES_PER_FRAME) {
+        frame[0] = FRAME_MAGIC;
+        frame[1] = frame_samples;
+        frame[2] = frame_seq & 0xFF;
+        frame[3] = (frame_seq >> 8) & 0xFF;
+        put_int16(frame + 4, myIMU.readTempC() * TEMP_SCALE);
+        bleuart.write(frame, FRAME_HEADER_SIZE + frame_samples * 12);
+        frame_seq++;
+        frame_samples = 0;
+    }
+}
+
 void collectIMUData() {
     uint64_t current_time = micros();
     if (current_time - last_sample_time >= SAMPLING_INTERVAL_US) {
@@ -72,6 +112,10 @@ void collectIMUData() {
             buffer[buffer_index + i] *= CONVERT_G_TO_MS2;
         }
 
+#if BINARY_FRAMES
+        sendBinarySample(buffer[buffer_index], buffer[buffer_index + 1], buffer[buffer_index + 2],
+                         myIMU.readFloatGyroX(), myIMU.readFloatGyroY(), myIMU.readFloatGyroZ());
+#else
         // Send raw data via Bluetooth
         String dataString = String(buffer[buffer_index], 3) + ',' +
                             String(buffer[buffer_index + 1], 3) + ',' +
@@ -81,6 +125,7 @@ void collectIMUData() {
                             String(myIMU.readFloatGyroZ(), 3) + ',' +
                             String(myIMU.readTempC(), 3) + '\n';
         bleuart.print(dataString);
+#endif
         buffer_index = (buffer_index + 3) % TOTAL_BUFFER_SIZE;
     }
 }
@@ -0,0 +1,565 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import data_sources
+import dataset_preprocessing
+import gesture_protocol
+import imu_protocol
+import motion_gate
+import realtime_server
+import spectral_features
+import training
+
+warnings.filterwarnings("ignore")
+
+RESULTS_DIR = ".benchmarks"  # Suite results, one JSON file per commit
+REGRESSION_THRESHOLD = 0.10  # compare flags benchmarks whose median got this much slower
+
+
+def quiet():
+    """
+    Silences the log lines the server, data sources and training print while a benchmark drives them.
+    """
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def report(name, samples_us):
+    samples_us = np.asarray(samples_us)
+    print(
+        f"{name}: n={len(samples_us)} "
+        f"p50={np.percentile(samples_us, 50):.1f}us "
+        f"p95={np.percentile(samples_us, 95):.1f}us "
+        f"p99={np.percentile(samples_us, 99):.1f}us"
+    )
+
+
+async def bench_tcp_fanout(num_clients=300, num_messages=200, port=0):
+    """
+    Connects num_clients local readers to the asyncio broadcast hub and measures
+    the time from broadcast_tcp() until every client has read the message.
+    One client never reads, to check that a stalled peer does not hold up the rest.
+    """
+    with quiet():
+        server = await realtime_server.start_tcp_server(port=port)
+        port = server.sockets[0].getsockname()[1]
+
+        connections = [await asyncio.open_connection("127.0.0.1", port) for _ in range(num_clients)]
+        _, stalled_writer = await asyncio.open_connection("127.0.0.1", port)
+        while len(realtime_server.tcp_clients) < num_clients + 1:
+            await asyncio.sleep(0.01)
+
+        latencies = []
+        for i in range(num_messages):
+            start = time.perf_counter()
+            realtime_server.broadcast_tcp(f"Leaning Left {i}")
+            await asyncio.gather(*(reader.readline() for reader, _ in connections))
+            latencies.append((time.perf_counter() - start) * 1e6)
+
+        dropped = sum(client.dropped for client in realtime_server.tcp_clients)
+        for _, writer in connections + [(None, stalled_writer)]:
+            writer.close()
+        while realtime_server.tcp_clients:
+            await asyncio.sleep(0.01)
+        server.close()
+        await server.wait_closed()
+    report(f"tcp fan-out to {num_clients} clients", latencies)
+    print(f"messages dropped for slow clients: {dropped}")
+    return latencies
+
+
+async def bench_transport(clients=8, rate=1000, seconds=3.0):
+    """
+    One-way latency and loss of binary gesture events under load: a gesture_client.py
+    subprocess with `clients` receivers per transport while the in-process server
+    broadcasts rate events per second for seconds, over TCP (TCP_NODELAY, binary
+    events) and over UDP. Loss counts events sent but never received by a client.
+    """
+    realtime_server.EVENT_FORMAT = "binary"
+    with quiet():
+        server = await realtime_server.start_tcp_server(port=0)
+        udp = await realtime_server.start_udp_server(port=0)
+    ports = {"tcp": server.sockets[0].getsockname()[1], "udp": udp.get_extra_info("sockname")[1]}
+    connected = {"tcp": lambda: len(realtime_server.tcp_clients), "udp": lambda: len(realtime_server.udp_subscribers)}
+    session = realtime_server.PlayerSession("P1")
+    session.slot = 1
+    states = gesture_protocol.STATES[:5]
+    for transport in ("tcp", "udp"):
+        with quiet():
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "gesture_client.py", "--transport", transport, "--port", str(ports[transport]),
+                "--clients", str(clients), "--seconds", str(seconds + 30), "--json", stdout=subprocess.PIPE,
+            )
+            while connected[transport]() < clients:
+                await asyncio.sleep(0.01)
+            sent = 0
+            start = time.perf_counter()
+            while (elapsed := time.perf_counter() - start) < seconds:
+                while sent < int(elapsed * rate):
+                    realtime_server.broadcast_tcp(states[sent % len(states)], None, session, 0.9)
+                    sent += 1
+                await asyncio.sleep(0.001)
+            output, _ = await process.communicate()
+            while realtime_server.tcp_clients:
+                await asyncio.sleep(0.01)
+        summaries = [json.loads(line) for line in output.decode().splitlines()]
+        received = sum(summary["received"] for summary in summaries)
+        print(
+            f"{transport}: {clients} clients x {sent} events @ {rate}/s, lost {1 - received / (clients * sent):.2%}, "
+            f"one-way latency p50={np.median([summary['p50_us'] for summary in summaries]):.0f}us "
+            f"p99={max(summary['p99_us'] for summary in summaries):.0f}us "
+            f"max={max(summary['max_us'] for summary in summaries):.0f}us"
+        )
+    udp.close()
+    server.close()
+    await server.wait_closed()
+    realtime_server.EVENT_FORMAT = "text"
+
+
+def bench_decode(num_samples=20000, samples_per_frame=4):
+    """
+    Decode throughput of the text protocol (one line per notification, as the
+    firmware sends today) against packed binary frames.
+    """
+    rng = np.random.default_rng(0)
+    samples = rng.normal(0, 5, size=(num_samples, imu_protocol.NUM_AXES))
+    text_messages = [imu_protocol.encode_text(row[None, :], temp=25.0) for row in samples]
+    binary_messages = [
+        imu_protocol.encode_binary(seq, samples[i:i + samples_per_frame], temp=25.0)
+        for seq, i in enumerate(range(0, num_samples, samples_per_frame))
+    ]
+
+    for name, messages in [("text", text_messages), ("binary", binary_messages)]:
+        start = time.perf_counter()
+        decoded = 0
+        for message in messages:
+            decoded += len(imu_protocol.decode_notification(message).samples)
+        elapsed = time.perf_counter() - start
+        print(f"decode {name}: {decoded / elapsed:,.0f} samples/s ({elapsed / len(messages) * 1e6:.2f}us per notification)")
+
+
+def bench_features(path="movement_data.csv", repeat=3):
+    """
+    Per-movement welch() loop against the batched feature engine on a full recording.
+    """
+    raw = pd.read_csv(path)
+    timings = {}
+    for name, function in [
+        ("per-group welch loop", dataset_preprocessing.calculate_spectral_features_per_group),
+        ("batched", dataset_preprocessing.calculate_spectral_features),
+    ]:
+        best = float("inf")
+        for _ in range(repeat):
+            data = raw.copy()
+            start = time.perf_counter()
+            processed = function(data)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        print(f"features {name}: {len(processed)} movements in {best * 1e3:.1f}ms")
+    print(f"speedup: {timings['per-group welch loop'] / timings['batched']:.1f}x")
+
+
+async def replay_controllers(count, duration, speed, rate=20):
+    realtime_server.sessions.clear()
+    realtime_server.latency.reset()
+    realtime_server.batcher = None
+    sources = [data_sources.ReplaySource.synthetic(duration, rate=rate, seed=i, speed=speed) for i in range(count)]
+    sessions = [realtime_server.create_session(f"P{i + 1}") for i in range(count)]
+    wall, cpu = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(source.run(session.notification_handler) for source, session in zip(sources, sessions)))
+    if realtime_server.batcher is not None:
+        realtime_server.batcher.flush()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return sum(source.samples_sent for source in sources), wall, cpu, sources
+
+
+def bench_controllers(counts=(1, 16, 64, 256), duration=10.0, realtime_seconds=5.0):
+    """
+    How many simulated controllers one core can serve. For each count, N synthetic
+    sessions are first replayed as fast as possible through N PlayerSessions on one
+    loop (samples per CPU second / FS = controllers per core), then in real time
+    at FS Hz each, reporting CPU use, replay lag and per-window classify latency.
+    """
+    with quiet():
+        realtime_server.load_models()
+    for count in counts:
+        with quiet():
+            samples, wall, cpu, _ = asyncio.run(replay_controllers(count, duration, None))
+            capacity = samples / cpu / realtime_server.FS
+            samples, wall, cpu, sources = asyncio.run(replay_controllers(count, realtime_seconds, 1.0))
+        lag = max(source.elapsed - source.offsets[-1] for source in sources)
+        summary = realtime_server.latency.summary()
+        classify_p99 = sum(summary[stage]["p99_us"] for stage in ("features", "projection", "svm"))
+        print(
+            f"{count:4d} controllers: {capacity:,.0f} controllers/core as fast as possible; "
+            f"real time {cpu / wall:.1%} CPU, replay lag {lag * 1e3:.0f}ms, classify p99 {classify_p99:.0f}us"
+        )
+
+
+def bench_batching(counts=(16, 64, 256), rate=50, seconds=5.0, batch_size=None, deadline_ms=None):
+    """
+    Per-window classify_state against the cross-session InferenceBatcher with N
+    synthetic controllers streaming at rate Hz in real time: process CPU use (which
+    includes simulating the devices), inference time per window (features,
+    projection and model stages only) and the sample-arrival-to-decision latency.
+    """
+    with quiet():
+        realtime_server.load_models()
+    realtime_server.BATCH_MAX_SIZE = batch_size or realtime_server.BATCH_MAX_SIZE
+    realtime_server.BATCH_DEADLINE_MS = deadline_ms or realtime_server.BATCH_DEADLINE_MS
+    for count in counts:
+        for mode, batched in [("per-window", False), ("batched", True)]:
+            realtime_server.BATCH_INFERENCE = batched
+            with quiet():
+                _, wall, cpu, _ = asyncio.run(replay_controllers(count, seconds, 1.0, rate))
+            windows = sum(session.windows_classified for session in realtime_server.sessions.values())
+            summary = realtime_server.latency.summary()
+            inference_us = sum(summary[stage]["mean_us"] * summary[stage]["count"] for stage in ("features", "projection", "svm"))
+            decision = summary["decision"]
+            batches = realtime_server.batcher.batches if batched else windows
+            print(
+                f"{count:4d} controllers @ {rate} Hz {mode:>10}: {cpu / wall:6.1%} CPU, "
+                f"inference {inference_us / windows:5.1f}us/window, {windows / max(batches, 1):5.1f} windows/batch, "
+                f"decision p50={decision['p50_us']:.0f}us p99={decision['p99_us']:.0f}us"
+            )
+    realtime_server.BATCH_INFERENCE = False
+
+
+def replay_session(samples, decisions=None):
+    """
+    Feeds samples through a fresh PlayerSession the way notification_handler does,
+    minus decoding. With decisions, each classified window's outcome ("idle",
+    "shake" or None when not confident) is stored under its newest sample's index.
+    """
+    session = realtime_server.PlayerSession()
+    if decisions is not None:
+        def record_prediction(classes, probabilities, *args, **kwargs):
+            confident = probabilities.max() >= realtime_server.CONFIDENCE_THRESHOLD
+            decisions[session.sample_count - 1] = classes[probabilities.argmax()] if confident else None
+
+        session.apply_prediction = record_prediction
+        session.apply_gate = lambda: decisions.__setitem__(session.sample_count - 1, motion_gate.IDLE_LABEL)
+    for sample in samples:
+        session.append_sample(sample)
+        if session.sample_count >= realtime_server.WINDOW_SIZE:
+            session.schedule_classification()
+    return session
+
+
+def bench_gate(data_file="movement_data.csv", repeat=5):
+    """
+    Replays data_file through a PlayerSession with and without the motion gate:
+    share of windows that skip the SVM, process CPU for the whole replay, and
+    window accuracy against the label of each window's newest sample (a window
+    without a confident decision counts as wrong).
+    """
+    realtime_server.tcp_loop = None
+    realtime_server.model = realtime_server.load_joblib_models()
+    raw = pd.read_csv(data_file)
+    samples = raw[spectral_features.AXES].values
+    truth = raw["MovementLabel"].values
+    gate = motion_gate.MotionGate.from_csv(realtime_server.GATE_TRAINING_FILE, realtime_server.WINDOW_SIZE)
+    print(f"{gate}, learned from {realtime_server.GATE_TRAINING_FILE}")
+    results = {}
+    for mode, current_gate in [("SVM only", None), ("motion gate", gate)]:
+        realtime_server.motion_gate = current_gate
+        cpu = []
+        decisions = {}
+        with quiet():
+            for _ in range(repeat):
+                start = time.process_time()
+                session = replay_session(samples)
+                cpu.append(time.process_time() - start)
+            replay_session(samples, decisions)
+        indices = np.fromiter(decisions, int)
+        predicted = np.array([decisions[i] for i in indices], dtype=object)
+        results[mode] = predicted
+        accuracy = np.mean(predicted == truth[indices])
+        gated = session.windows_gated / session.windows_classified
+        print(
+            f"{mode:>11}: {session.windows_classified} windows, {gated:5.1%} skip the SVM, "
+            f"CPU {min(cpu) * 1e3:6.1f}ms ({min(cpu) / session.windows_classified * 1e6:5.1f}us/window), accuracy {accuracy:.2%}"
+        )
+        results[f"{mode} cpu"] = min(cpu)
+    realtime_server.motion_gate = None
+    saved = 1 - results["motion gate cpu"] / results["SVM only cpu"]
+    agreement = np.mean(results["motion gate"] == results["SVM only"])
+    print(f"CPU saved: {saved:.1%}; decisions identical to SVM only on {agreement:.2%} of windows")
+
+
+def bench_startup(repeat=5):
+    """
+    Cold start of realtime_server in a fresh interpreter: import plus model load,
+    from the three joblib pickles (sklearn stack) versus the NumPy model bundle.
+    """
+    scripts = {
+        "joblib models": "import realtime_server as r; r.model = r.load_joblib_models()",
+        "model bundle": "import realtime_server as r; r.load_models()",
+    }
+    for name, script in scripts.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-W", "ignore", "-c", script], check=True, capture_output=True)
+            timings.append(time.perf_counter() - start)
+        print(f"cold start with {name}: best {min(timings) * 1e3:.0f}ms, median {np.median(timings) * 1e3:.0f}ms")
+
+
+def bench_svm(calls=2000):
+    """
+    Per-window model call: sklearn scaler -> PCA -> SVC.predict_proba on one row
+    versus the NumPy bundle (fused projection + RBF decision + Platt coupling).
+    """
+    from joblib import load
+    from model_bundle import ModelBundle
+
+    scaler, pca, svc = load("scaler_spectral.joblib"), load("pca_spectral.joblib"), load("svm_model_pca_spectral.joblib")
+    bundle = ModelBundle.from_estimators(scaler, pca, svc)
+    features = pd.read_csv("processed_training_data.csv")[bundle.meta["feature_spec"]["feature_columns"]].values
+    rows = [features[i % len(features)][None, :] for i in range(calls)]
+
+    candidates = {
+        "sklearn": lambda x: svc.predict_proba(pca.transform(scaler.transform(x))),
+        "numpy float64": lambda x: bundle.predict_proba(bundle.project(x)),
+        "numpy float32": lambda x, model=bundle.astype(np.float32): model.predict_proba(model.project(x)),
+    }
+    medians = {}
+    for name, predict in candidates.items():
+        timings = []
+        for x in rows:
+            start = time.perf_counter()
+            predict(x)
+            timings.append((time.perf_counter() - start) * 1e6)
+        medians[name] = np.median(timings)
+        report(f"svm {name}", timings)
+    for name in ("numpy float64", "numpy float32"):
+        print(f"{name} speedup over sklearn: {medians['sklearn'] / medians[name]:.1f}x")
+
+
+def measure(function, rounds, warmup=1):
+    """
+    Runs function() warmup + rounds times and summarizes the timed rounds in seconds.
+    """
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def summarize(timings):
+    """
+    Summary statistics of a list of timings in seconds, as stored in suite results.
+    """
+    timings = np.array(timings)
+    return {
+        "rounds": len(timings),
+        "min": float(timings.min()),
+        "median": float(np.median(timings)),
+        "mean": float(timings.mean()),
+        "p95": float(np.percentile(timings, 95)),
+        "max": float(timings.max()),
+        "stddev": float(timings.std()),
+    }
+
+
+def cycle(items):
+    """
+    Callable returning the next item on each call, wrapping around.
+    """
+    state = {"index": -1}
+
+    def next_item():
+        state["index"] = (state["index"] + 1) % len(items)
+        return items[state["index"]]
+
+    return next_item
+
+
+def suite_benchmarks(data_file="movement_data.csv", quick=False):
+    """
+    (name, function, rounds) for every pipeline stage, built on the bundled recording
+    and the shipped joblib models. Per-call benchmarks time a single call.
+    """
+    scale = 10 if quick else 1
+    raw = pd.read_csv(data_file)
+    samples = raw[spectral_features.AXES].values
+    lines = [imu_protocol.encode_text(row[None, :], temp=25.0) for row in samples[:2000]]
+    frames = [imu_protocol.encode_binary(seq, samples[i:i + 4], temp=25.0) for seq, i in enumerate(range(0, 2000, 4))]
+    windows = [samples[i:i + realtime_server.WINDOW_SIZE] for i in range(0, 2000, realtime_server.HOP_SAMPLES)]
+
+    realtime_server.tcp_loop = None  # No TCP clients: update_state stops at the broadcast hand-off
+    realtime_server.model = realtime_server.load_joblib_models()
+    session = realtime_server.PlayerSession()
+    for sample in samples[:realtime_server.WINDOW_SIZE]:
+        session.append_sample(sample)
+    next_line, next_frame, next_window = cycle(lines), cycle(frames), cycle(windows)
+
+    with quiet():
+        X, y, feature_columns, _ = training.load_training_data()
+
+    def handle_line():
+        session.notification_handler(None, next_line())
+
+    return [
+        ("parse_text_line", lambda: imu_protocol.decode_notification(next_line()), 20000 // scale),
+        ("parse_binary_frame", lambda: imu_protocol.decode_notification(next_frame()), 20000 // scale),
+        ("notification_handler_text", handle_line, 20000 // scale),
+        ("features_per_window", lambda: spectral_features.compute_window_features(next_window()), 5000 // scale),
+        ("classify_state", lambda: session.classify_state(next_window()), 3000 // scale),
+        ("preprocess_full_file", lambda: dataset_preprocessing.calculate_spectral_features(raw.copy()), max(20 // scale, 3)),
+        ("train_model_fit", lambda: training.fit_models(X, y, feature_columns), max(10 // scale, 3)),
+    ]
+
+
+def run_suite(output=None, quick=False, tcp_clients=100, tcp_messages=200):
+    """
+    Runs every stage benchmark and writes the results as JSON, keyed by commit, so
+    runs from different commits can be compared with `benchmark.py compare`.
+    """
+    results = {}
+    for name, function, rounds in suite_benchmarks(quick=quick):
+        with quiet():
+            results[name] = measure(function, rounds)
+        print(f"{name:<28} median {results[name]['median'] * 1e6:12.1f}us  p95 {results[name]['p95'] * 1e6:12.1f}us  ({rounds} rounds)")
+    # Fan-out latencies are taken per message by the readers, so they only share measure()'s summary.
+    latencies = np.array(asyncio.run(bench_tcp_fanout(tcp_clients, tcp_messages // (10 if quick else 1)))) / 1e6
+    results[f"broadcast_fanout_{tcp_clients}_clients"] = summarize(latencies)
+
+    commit = git_commit()
+    document = {
+        "commit": commit,
+        "datetime": datetime.now().isoformat(),
+        "machine": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "unit": "seconds",
+        "benchmarks": results,
+    }
+    output = output or os.path.join(RESULTS_DIR, f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(document, file, indent=2)
+    print(f"Results saved to {output}.")
+    return document
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def compare_results(baseline_path, current_path, threshold=REGRESSION_THRESHOLD):
+    """
+    Median-to-median comparison of two suite result files. Returns the names of
+    benchmarks that got slower by more than threshold.
+    """
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    with open(current_path) as file:
+        current = json.load(file)
+    print(f"{baseline.get('commit')} -> {current.get('commit')}")
+    regressions = []
+    for name, stats in current["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            print(f"{name:<28} new")
+            continue
+        before, after = baseline["benchmarks"][name]["median"], stats["median"]
+        change = after / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<28} {before * 1e6:12.1f}us -> {after * 1e6:12.1f}us  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Movement pipeline benchmarks.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    tcp_parser = subparsers.add_parser("tcp", help="Broadcast fan-out latency to local TCP clients")
+    tcp_parser.add_argument("--clients", type=int, default=300)
+    tcp_parser.add_argument("--messages", type=int, default=200)
+    transport_parser = subparsers.add_parser("transport", help="Binary gesture events over TCP and UDP: one-way latency and loss")
+    transport_parser.add_argument("--clients", type=int, default=8)
+    transport_parser.add_argument("--rate", type=int, default=1000, help="Events broadcast per second")
+    transport_parser.add_argument("--seconds", type=float, default=3.0)
+    decode_parser = subparsers.add_parser("decode", help="BLE notification decode throughput")
+    decode_parser.add_argument("--samples", type=int, default=20000)
+    decode_parser.add_argument("--samples-per-frame", type=int, default=4)
+    features_parser = subparsers.add_parser("features", help="Per-group vs batched spectral features")
+    features_parser.add_argument("--input", default="movement_data.csv")
+    subparsers.add_parser("svm", help="Per-call sklearn predict_proba vs NumPy evaluator")
+    controllers_parser = subparsers.add_parser("controllers", help="Simulated controllers one core can sustain")
+    controllers_parser.add_argument("--counts", type=int, nargs="+", default=[1, 16, 64, 256])
+    controllers_parser.add_argument("--duration", type=float, default=10.0, help="Seconds per replay in the as-fast-as-possible pass")
+    controllers_parser.add_argument("--realtime-seconds", type=float, default=5.0)
+    batching_parser = subparsers.add_parser("batching", help="Per-window vs micro-batched inference across controllers")
+    batching_parser.add_argument("--counts", type=int, nargs="+", default=[16, 64, 256])
+    batching_parser.add_argument("--rate", type=int, default=50, help="Samples per second per controller")
+    batching_parser.add_argument("--seconds", type=float, default=5.0)
+    batching_parser.add_argument("--batch-size", type=int)
+    batching_parser.add_argument("--deadline-ms", type=float)
+    suite_parser = subparsers.add_parser("suite", help="Run every pipeline stage benchmark and save JSON results")
+    suite_parser.add_argument("--output", help=f"Results file (default {RESULTS_DIR}/<commit>.json)")
+    suite_parser.add_argument("--quick", action="store_true", help="Fewer rounds, for a smoke test")
+    suite_parser.add_argument("--tcp-clients", type=int, default=100)
+    compare_parser = subparsers.add_parser("compare", help="Compare two suite result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    subparsers.add_parser("startup", help="realtime_server cold start: joblib models vs model bundle")
+    gate_parser = subparsers.add_parser("gate", help="Motion gate cascade vs SVM on every window, on a recording replay")
+    gate_parser.add_argument("--input", default="movement_data.csv")
+    args = parser.parse_args()
+
+    if args.benchmark == "tcp":
+        asyncio.run(bench_tcp_fanout(args.clients, args.messages))
+    elif args.benchmark == "transport":
+        asyncio.run(bench_transport(args.clients, args.rate, args.seconds))
+    elif args.benchmark == "decode":
+        bench_decode(args.samples, args.samples_per_frame)
+    elif args.benchmark == "features":
+        bench_features(args.input)
+    elif args.benchmark == "svm":
+        bench_svm()
+    elif args.benchmark == "controllers":
+        bench_controllers(args.counts, args.duration, args.realtime_seconds)
+    elif args.benchmark == "batching":
+        bench_batching(args.counts, args.rate, args.seconds, args.batch_size, args.deadline_ms)
+    elif args.benchmark == "suite":
+        run_suite(args.output, args.quick, args.tcp_clients)
+    elif args.benchmark == "compare":
+        if compare_results(args.baseline, args.current, args.threshold):
+            sys.exit(1)
+    elif args.benchmark == "startup":
+        bench_startup()
+    elif args.benchmark == "gate":
+        bench_gate(args.input)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,99 +1,275 @@
+import argparse
 import asyncio
-from bleak import BleakClient, BleakScanner
+import time
 import tkinter as tk
 from threading import Thread
 
-# https://docs.nordicsemi.com/bundle/ncs-latest/page/nrf/libraries/bluetooth/services/nus.html
-UART_TX_CHARACTERISTIC_UUID = "6E400003-B5A3-F393-E0A9-E50E24DCCA9E" 
-imu_data = {"AccelX": 0, "AccelY": 0, "AccelZ": 0, "GyroX": 0, "GyroY": 0, "GyroZ": 0, "Temp": 0}
-button_state = "Released"
+import numpy as np
 
-def update_gui():
-    global imu_data, button_state
-    accel_label.config(text=f"Accelerometer: X={imu_data['AccelX']} , Y={imu_data['AccelY']}, Z={imu_data['AccelZ']}")
-    gyro_label.config(text=f"Gyroscope: X={imu_data['GyroX']}, Y={imu_data['GyroY']}, Z={imu_data['GyroZ']}")
-    temp_label.config(text=f"Temperature: {imu_data['Temp']}")
-    button_label.config(text=f"Button: {button_state}")
-    root.after(100, update_gui)  # Schedule this function to run every 100ms
+from data_sources import add_source_arguments, source_from_args
+from imu_protocol import decode_notification, sequence_gap
+from rolling_stats import RollingStats
+from spectral_features import AXES
 
-def notification_handler(sender, data):
+TRACE_COLORS = ["red", "green", "blue"]  # X, Y, Z in both the accelerometer and gyroscope plots
+HISTORY_SECONDS = 10  # Scrolling trace length
+RING_CAPACITY = 8192  # Samples kept; comfortably more than HISTORY_SECONDS at the fastest link rate
+MAX_FRAME_SAMPLES = 64  # Most samples one notification can carry; the reader never trusts the slots they may overwrite
+FPS = 30  # Monitor redraw rate
+TRACE_WIDTH = 800  # Pixel columns per trace
+TRACE_HEIGHT = 180
+JITTER_WINDOW = 100  # Notifications in the inter-arrival jitter window
+STATS_INTERVAL = 1.0  # Seconds between link stats refreshes (printed once per interval when headless)
+
+
+class SampleRing:
     """
-    Callback to handle received data.
+    Last `capacity` samples of all six axes with their arrival times. One writer (the
+    BLE thread) and any number of readers, without a lock: the writer fills slots and
+    only then advances count, and a reader copies out a snapshot and discards the
+    rows the writer could have overwritten while it was copying.
     """
-    global imu_data, button_state
-    message = data.decode("utf-8").strip()
-    lines = message.split("\n")  # Split multi-line messages
-    for line in lines:
-        print(f"Raw line: {line}")  # Debugging line
-        try:
-            if message.startswith("Button"):
-                button_state = message
+
+    def __init__(self, capacity=RING_CAPACITY, n_axes=len(AXES)):
+        self.capacity = capacity
+        self.samples = np.zeros((capacity, n_axes))
+        self.times = np.zeros(capacity)
+        self.count = 0
+
+    def extend(self, samples, arrival):
+        start = self.count % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.samples[start:start + first] = samples[:first]
+        self.samples[:len(samples) - first] = samples[first:]
+        self.times[start:start + first] = arrival
+        self.times[:len(samples) - first] = arrival
+        self.count += len(samples)
+
+    def snapshot(self, seconds=None):
+        """
+        Copies of the newest samples (all of them, or those that arrived in the last
+        `seconds`) and their arrival times, oldest first.
+        """
+        end = self.count
+        n = min(end, self.capacity - MAX_FRAME_SAMPLES)
+        rows = np.arange(end - n, end) % self.capacity
+        samples, times = self.samples[rows], self.times[rows]
+        # Slots of rows older than this may have been rewritten by the frame being written now.
+        oldest_valid = self.count + MAX_FRAME_SAMPLES - self.capacity
+        keep = max(oldest_valid - (end - n), 0)
+        samples, times = samples[keep:], times[keep:]
+        if seconds is not None and len(times):
+            start = np.searchsorted(times, times[-1] - seconds, side="left")
+            samples, times = samples[start:], times[start:]
+        return samples, times
+
+    def latest(self):
+        return self.samples[(self.count - 1) % self.capacity] if self.count else None
+
+
+class LinkStats:
+    """
+    Link health as seen by the notification handler: notifications, samples, frames
+    missing from the binary sequence numbers (text frames carry none), malformed
+    notifications and the jitter (std) of notification inter-arrival times. Written by
+    the BLE thread only; readers just take the current values.
+    """
+
+    def __init__(self, jitter_window=JITTER_WINDOW):
+        self.notifications = 0
+        self.samples = 0
+        self.dropped = 0
+        self.malformed = 0
+        self.last_seq = None
+        self.last_arrival = None
+        self.intervals = np.zeros(jitter_window)
+        self.interval_count = 0
+        self.interval_stats = RollingStats(jitter_window)
+        self.rate = 0.0
+        self.rate_mark = (time.monotonic(), 0)
+
+    def record_frame(self, frame, arrival):
+        self.notifications += 1
+        self.samples += len(frame.samples)
+        self.dropped += sequence_gap(self.last_seq, frame.seq)
+        if frame.seq is not None:
+            self.last_seq = frame.seq
+        if self.last_arrival is not None:
+            slot = self.interval_count % len(self.intervals)
+            leaving = self.intervals[slot:slot + 1] if self.interval_count >= len(self.intervals) else None
+            interval = arrival - self.last_arrival
+            self.interval_stats.push((interval,), leaving)
+            self.intervals[slot] = interval
+            self.interval_count += 1
+        self.last_arrival = arrival
+
+    def update_rate(self):
+        """
+        Samples per second since the previous call; called by the display once per STATS_INTERVAL.
+        """
+        current, samples = time.monotonic(), self.samples
+        then, previous = self.rate_mark
+        if current > then:
+            self.rate = (samples - previous) / (current - then)
+        self.rate_mark = (current, samples)
+        return self.rate
+
+    def summary(self):
+        mean_ms = self.interval_stats.mean[0] * 1e3 if self.interval_stats.count else 0.0
+        return (
+            f"{self.rate:6.1f} samples/s, {self.notifications} notifications, dropped {self.dropped}, "
+            f"malformed {self.malformed}, inter-arrival {mean_ms:.1f}ms jitter {self.interval_stats.std() * 1e3:.1f}ms"
+        )
+
+
+class SensorMonitor:
+    """
+    Notification handler that feeds the ring buffer and link stats instead of
+    printing every line.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self.ring = SampleRing(capacity)
+        self.stats = LinkStats()
+        self.temp = 0.0
+        self.button_state = "Released"
+
+    def notification_handler(self, sender, data):
+        arrival = time.monotonic()
+        frame = decode_notification(data)
+        self.stats.record_frame(frame, arrival)
+        if len(frame.samples):
+            self.ring.extend(frame.samples, arrival)
+            if frame.temp is not None:
+                self.temp = frame.temp
+        for line in frame.events:
+            if line.startswith("Button"):
+                self.button_state = line
             else:
-                parts = message.split(",")
-                imu_data = {
-                    "AccelX": float(parts[0]),
-                    "AccelY": float(parts[1]),
-                    "AccelZ": float(parts[2]),
-                    "GyroX": float(parts[3]),
-                    "GyroY": float(parts[4]),
-                    "GyroZ": float(parts[5]),
-                    "Temp": float(parts[6]),
-                }
-        except (ValueError, IndexError):
-            print(f"Invalid data received: {message}")
-
-# BLE connection and data handling
-async def ble_main():
-    print("Scanning for devices...")
-    devices = await BleakScanner.discover()
-
-    # List available devices
-    for i, device in enumerate(devices):
-        print(f"[{i}] {device.name} ({device.address})")
-
-    # Select a device
-    device_index = int(input("Select the device index to connect: "))
-    selected_device = devices[device_index]
-
-    print(f"Connecting to {selected_device.name}...")
-    async with BleakClient(selected_device.address) as client:
-        print("Connected!")
-
-        # Subscribe to the RX characteristic
-        await client.start_notify(UART_TX_CHARACTERISTIC_UUID, notification_handler)
-
-        print("Receiving data. Press Ctrl+C to stop.")
-        try:
-            while True:
-                await asyncio.sleep(1)  # Keep the script running
-        except KeyboardInterrupt:
-            print("Stopping notifications...")
-            await client.stop_notify(UART_TX_CHARACTERISTIC_UUID)
-
-    print("Disconnected.")
-
-# Run BLE in a separate thread
-def start_ble_thread():
-    asyncio.run(ble_main())
-
-# GUI
-root = tk.Tk()
-root.title("IMU and Button State Panel")
-
-accel_label = tk.Label(root, text="Accelerometer: X=0.0, Y=0.0, Z=0.0", font=("Helvetica", 14))
-gyro_label = tk.Label(root, text="Gyroscope: X=0.0, Y=0.0, Z=0.0", font=("Helvetica", 14))
-temp_label = tk.Label(root, text="Temperature: 0.0", font=("Helvetica", 14))
-button_label = tk.Label(root, text="Button: Released", font=("Helvetica", 14))
-
-accel_label.pack(pady=10)
-gyro_label.pack(pady=10)
-temp_label.pack(pady=10)
-button_label.pack(pady=10)
-
-ble_thread = Thread(target=start_ble_thread, daemon=True)
-ble_thread.start()
-
-
-update_gui()
-
-root.mainloop()
+                self.stats.malformed += 1
+
+
+def decimate(values, columns):
+    """
+    Min/max of each axis per pixel column, so a trace keeps every peak however many
+    samples fall on one column. values is (n, axes); returns (x, y) with x the column
+    of each point and y shaped (points, axes), two points (min, max) per column.
+    Short traces are returned as they are.
+    """
+    n = len(values)
+    if n <= 2 * columns:
+        return np.linspace(0, columns - 1, n) if n > 1 else np.zeros(n), values
+    edges = np.arange(columns) * n // columns
+    y = np.empty((2 * columns, values.shape[1]))
+    y[0::2] = np.minimum.reduceat(values, edges, axis=0)
+    y[1::2] = np.maximum.reduceat(values, edges, axis=0)
+    return np.repeat(np.arange(columns), 2), y
+
+
+def trace_coordinates(values, width=TRACE_WIDTH, height=TRACE_HEIGHT):
+    """
+    Canvas polyline coordinates [x0, y0, x1, y1, ...] per axis of values, scaled
+    together to fill the height.
+    """
+    x, y = decimate(values, width)
+    low, high = y.min(), y.max()
+    span = high - low if high > low else 1.0
+    pixels = (height - 4) * (high - y) / span + 2
+    return [np.column_stack((x, pixels[:, axis])).ravel().tolist() for axis in range(y.shape[1])]
+
+
+def run_gui(source, monitor, traces=False, fps=FPS):
+    root = tk.Tk()
+    root.title("IMU and Button State Panel")
+
+    accel_label = tk.Label(root, text="Accelerometer: X=0.0, Y=0.0, Z=0.0", font=("Helvetica", 14))
+    gyro_label = tk.Label(root, text="Gyroscope: X=0.0, Y=0.0, Z=0.0", font=("Helvetica", 14))
+    temp_label = tk.Label(root, text="Temperature: 0.0", font=("Helvetica", 14))
+    button_label = tk.Label(root, text="Button: Released", font=("Helvetica", 14))
+    stats_label = tk.Label(root, text="Waiting for data...", font=("Helvetica", 11))
+
+    accel_label.pack(pady=10)
+    gyro_label.pack(pady=10)
+    temp_label.pack(pady=10)
+    button_label.pack(pady=10)
+    plots = []
+    if traces:
+        for name in ("Accelerometer", "Gyroscope"):
+            tk.Label(root, text=f"{name} (last {HISTORY_SECONDS}s, X/Y/Z = red/green/blue)").pack()
+            canvas = tk.Canvas(root, width=TRACE_WIDTH, height=TRACE_HEIGHT, background="white")
+            canvas.pack(padx=10, pady=5)
+            plots.append([canvas.create_line(0, 0, 0, 0, fill=color) for color in TRACE_COLORS])
+            plots[-1].insert(0, canvas)
+    stats_label.pack(pady=10)
+
+    def update_labels():
+        latest = monitor.ring.latest()
+        if latest is not None:
+            accel_label.config(text=f"Accelerometer: X={latest[0]:.3f}, Y={latest[1]:.3f}, Z={latest[2]:.3f}")
+            gyro_label.config(text=f"Gyroscope: X={latest[3]:.2f}, Y={latest[4]:.2f}, Z={latest[5]:.2f}")
+        temp_label.config(text=f"Temperature: {monitor.temp}")
+        button_label.config(text=f"Button: {monitor.button_state}")
+        root.after(100, update_labels)
+
+    def update_stats():
+        monitor.stats.update_rate()
+        stats_label.config(text=monitor.stats.summary())
+        root.after(int(STATS_INTERVAL * 1000), update_stats)
+
+    def draw_traces():
+        samples, _ = monitor.ring.snapshot(HISTORY_SECONDS)
+        if len(samples) > 1:
+            for (canvas, *lines), axes in zip(plots, (slice(0, 3), slice(3, 6))):
+                for line, coordinates in zip(lines, trace_coordinates(samples[:, axes])):
+                    canvas.coords(line, coordinates)
+        root.after(int(1000 / fps), draw_traces)
+
+    # Run the data source (BLE by default) in a separate thread
+    Thread(target=lambda: asyncio.run(source.run(monitor.notification_handler)), daemon=True).start()
+    update_labels()
+    update_stats()
+    if traces:
+        draw_traces()
+    root.mainloop()
+
+
+async def run_headless(source, monitor, fps=FPS):
+    """
+    Streams source into the monitor without a display, still decimating the traces
+    at fps, and prints one link stats line per STATS_INTERVAL. For replays and tests.
+    """
+    task = asyncio.create_task(source.run(monitor.notification_handler))
+    frames, render_time = 0, 0.0
+    next_stats = time.monotonic() + STATS_INTERVAL
+    while not task.done():
+        await asyncio.sleep(1 / fps)
+        start = time.perf_counter()
+        samples, _ = monitor.ring.snapshot(HISTORY_SECONDS)
+        if len(samples) > 1:
+            trace_coordinates(samples[:, :3])
+            trace_coordinates(samples[:, 3:])
+        render_time += time.perf_counter() - start
+        frames += 1
+        if time.monotonic() >= next_stats:
+            monitor.stats.update_rate()
+            print(monitor.stats.summary())
+            next_stats += STATS_INTERVAL
+    await task
+    monitor.stats.update_rate()
+    print(f"Final: {monitor.stats.summary()}")
+    print(f"{frames} frames decimated, {render_time / max(frames, 1) * 1e3:.2f}ms per frame")
+    return monitor.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IMU and button monitor with link statistics.")
+    add_source_arguments(parser)
+    parser.add_argument("--monitor", action="store_true", help="Also draw scrolling min/max-decimated sensor traces")
+    parser.add_argument("--fps", type=float, default=FPS, help="Trace redraw rate")
+    parser.add_argument("--headless", action="store_true", help="No window: print link stats (e.g. with --replay)")
+    args = parser.parse_args()
+    source = source_from_args(args)
+    if args.headless:
+        asyncio.run(run_headless(source, SensorMonitor(), args.fps))
+    else:
+        run_gui(source, SensorMonitor(), args.monitor, args.fps)
@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from data_sources import add_source_arguments, source_from_args
+from imu_protocol import decode_notification
+from movement_store import AXES, CSV_FIELDS
+from rolling_stats import RollingStats
+
+PROFILE_DIR = "profiles"
+WINDOW_SIZE = 20  # Samples per stability window; must match realtime_server.WINDOW_SIZE
+STABILITY_AXES = [0, 1]  # AccelX and AccelY, the axes the lean thresholds act on
+PHASES = [
+    ("neutral", "Stand upright and hold still"),
+    ("lean_left", "Lean left and hold"),
+    ("lean_right", "Lean right and hold"),
+    ("lean_forward", "Lean forward and hold"),
+    ("lean_backward", "Lean backward and hold"),
+]
+SETTLE_SECONDS = 1.5  # Time to get into position before a phase is recorded
+HOLD_SECONDS = 3.0  # Recorded seconds per phase
+THRESHOLD_FRACTION = 0.5  # Lean thresholds sit this far from the baseline toward the held lean
+MIN_THRESHOLD = 0.5  # A lean must move its axis at least MIN_THRESHOLD / THRESHOLD_FRACTION
+STABILITY_PERCENTILE = 95
+STABILITY_MARGIN = 1.5  # Stability threshold = margin * percentile of held-pose window stability
+
+
+class CalibrationProfile:
+    """
+    Per-player lean detection settings: the neutral AccelX/AccelY baseline, one
+    threshold per lean direction (distance from the baseline) and the stability
+    threshold above which a window counts as moving rather than leaning.
+    """
+
+    def __init__(self, player, baseline=(0.0, 0.0), thresholds=None, stability_threshold=3.0, created=None):
+        self.player = player
+        self.baseline = [float(value) for value in baseline]
+        self.thresholds = thresholds or {"left": 3.0, "right": 3.0, "forward": 3.0, "backward": 3.0}
+        self.stability_threshold = float(stability_threshold)
+        self.created = created
+
+    def lean_state(self, accel_x, accel_y):
+        """
+        Same decision order as the original constant thresholds, relative to the baseline.
+        """
+        dx = accel_x - self.baseline[0]
+        dy = accel_y - self.baseline[1]
+        if dx < -self.thresholds["left"]:
+            return "Leaning Left"
+        if dx > self.thresholds["right"]:
+            return "Leaning Right"
+        if dy > self.thresholds["forward"]:
+            return "Leaning Forward"
+        if dy < -self.thresholds["backward"]:
+            return "Leaning Backward"
+        return "Neutral"
+
+    def to_dict(self):
+        return {
+            "player": self.player,
+            "created": self.created,
+            "baseline": self.baseline,
+            "thresholds": self.thresholds,
+            "stability_threshold": self.stability_threshold,
+            "window_size": WINDOW_SIZE,
+        }
+
+    def save(self, path=None):
+        path = path or profile_path(self.player)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            data = json.load(file)
+        if data.get("window_size", WINDOW_SIZE) != WINDOW_SIZE:
+            raise ValueError(f"{path} was calibrated with {data['window_size']}-sample windows, not {WINDOW_SIZE}.")
+        return cls(data["player"], data["baseline"], data["thresholds"], data["stability_threshold"], data.get("created"))
+
+    def __str__(self):
+        thresholds = ", ".join(f"{name}={value:.2f}" for name, value in self.thresholds.items())
+        return (
+            f"{self.player}: baseline x={self.baseline[0]:.2f} y={self.baseline[1]:.2f}, "
+            f"thresholds {thresholds}, stability {self.stability_threshold:.2f}"
+        )
+
+
+def profile_path(player, directory=PROFILE_DIR):
+    return os.path.join(directory, f"{player}.json")
+
+
+def rolling_stability(samples, window=WINDOW_SIZE):
+    """
+    std(AccelX) + std(AccelY) of every full window, computed the way the server does.
+    """
+    stats = RollingStats(window, len(STABILITY_AXES))
+    values = np.asarray(samples)[:, STABILITY_AXES]
+    stability = []
+    for i, row in enumerate(values):
+        stats.push(row, values[i - window] if i >= window else None)
+        if stats.count == window:
+            stability.append(sum(stats.std(axis) for axis in range(len(STABILITY_AXES))))
+    return np.array(stability)
+
+
+def derive_profile(player, phases):
+    """
+    Builds a profile from {phase name: (n, 6) samples} covering every entry of PHASES.
+    """
+    missing = [name for name, _ in PHASES if len(phases.get(name, [])) < WINDOW_SIZE]
+    if missing:
+        raise ValueError(f"Not enough samples for phase(s) {', '.join(missing)}; need at least {WINDOW_SIZE} each.")
+    baseline = np.median(np.asarray(phases["neutral"])[:, :2], axis=0)
+    offsets = {name: np.median(np.asarray(phases[name])[:, :2], axis=0) - baseline for name, _ in PHASES}
+    # Signed distance of each held lean from the baseline along its axis, positive when in the expected direction.
+    distances = {
+        "left": -offsets["lean_left"][0],
+        "right": offsets["lean_right"][0],
+        "forward": offsets["lean_forward"][1],
+        "backward": -offsets["lean_backward"][1],
+    }
+    weak = [name for name, distance in distances.items() if distance * THRESHOLD_FRACTION < MIN_THRESHOLD]
+    if weak:
+        raise ValueError(f"Lean(s) {', '.join(weak)} barely moved from neutral; redo those phases with a clearer lean.")
+    stability = np.concatenate([rolling_stability(phases[name]) for name, _ in PHASES])
+    return CalibrationProfile(
+        player,
+        baseline,
+        {name: float(distance * THRESHOLD_FRACTION) for name, distance in distances.items()},
+        STABILITY_MARGIN * np.percentile(stability, STABILITY_PERCENTILE),
+        datetime.now().isoformat(),
+    )
+
+
+async def record_session(source, settle=SETTLE_SECONDS, hold=HOLD_SECONDS):
+    """
+    Guides the player through PHASES while streaming from source and returns
+    {phase name: list of (timestamp, sample)} for the held part of each phase.
+    """
+    phases = {}
+    current = {"phase": None}
+    streaming = asyncio.Event()
+
+    def handler(sender, data):
+        streaming.set()
+        phase = current["phase"]
+        if phase is not None:
+            timestamp = datetime.now().isoformat()
+            phases[phase].extend((timestamp, sample) for sample in decode_notification(data).samples)
+
+    task = asyncio.create_task(source.run(handler))
+    try:
+        waiter = asyncio.create_task(streaming.wait())
+        await asyncio.wait([task, waiter], return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        for phase, instruction in PHASES:
+            if task.done():
+                raise RuntimeError("The data source ended before the calibration finished.")
+            print(f"{instruction}...")
+            await asyncio.sleep(settle)
+            phases[phase] = []
+            current["phase"] = phase
+            await asyncio.sleep(hold)
+            current["phase"] = None
+            print(f"  {len(phases[phase])} samples")
+    finally:
+        task.cancel()
+    return phases
+
+
+def save_session_csv(phases, path):
+    """
+    Keeps the raw session in the movement_data.csv schema (one MovementID per phase)
+    so a profile can be re-derived later with `calibration.py fit`.
+    """
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_FIELDS)
+        for movement_id, (phase, rows) in enumerate(phases.items()):
+            for timestamp, sample in rows:
+                writer.writerow([timestamp, *np.asarray(sample).tolist(), movement_id, phase, ""])
+
+
+def load_session_csv(path):
+    phases = {}
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            phases.setdefault(row["MovementLabel"], []).append([float(row[axis]) for axis in AXES])
+    return phases
+
+
+def record_profile(player, source):
+    phases = asyncio.run(record_session(source))
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    session_path = os.path.join(PROFILE_DIR, f"{player}_session.csv")
+    save_session_csv(phases, session_path)
+    profile = derive_profile(player, {name: [sample for _, sample in rows] for name, rows in phases.items()})
+    print(f"Saved {profile} to {profile.save()} (raw session in {session_path}).")
+    return profile
+
+
+def fit_profile(player, session_path):
+    profile = derive_profile(player, load_session_csv(session_path))
+    print(f"Saved {profile} to {profile.save()}.")
+    return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or derive per-player lean calibration profiles.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser("record", help="Guide a player through a neutral/lean session and save the profile")
+    record.add_argument("player")
+    add_source_arguments(record)
+    fit = subparsers.add_parser("fit", help="Re-derive a profile from a saved session CSV")
+    fit.add_argument("player")
+    fit.add_argument("session", help="Session CSV with one MovementLabel per phase")
+    args = parser.parse_args()
+    if args.command == "record":
+        record_profile(args.player, source_from_args(args))
+    else:
+        fit_profile(args.player, args.session)
@@ -1,24 +1,62 @@
+import argparse
 import asyncio
-from bleak import BleakClient, BleakScanner
 import csv
 import os
+import queue
+import threading
 from datetime import datetime
+import numpy as np
+from data_sources import BleSource, add_source_arguments, source_from_args
+from imu_protocol import decode_notification
+from movement_store import CSV_FIELDS, MovementStore, epoch_to_iso
+from spectral_features import AXES, FS
 
 
-UART_TX_CHARACTERISTIC_UUID = "6E400003-B5A3-F393-E0A9-E50E24DCCA9E" 
-SAMPLE_RATE = 20 
+SAMPLE_RATE = FS
 WINDOW_SIZE = SAMPLE_RATE 
 OVERLAP_FRAMES = 10 
 OUTPUT_FILE = "movement_data.csv"
+STORE_PATH = None  # When set, windows go to this binary MovementStore directory instead of OUTPUT_FILE
+PROGRESS_INTERVAL = 5 * SAMPLE_RATE  # Samples between "Recording" progress lines
+EPOCH = datetime(1970, 1, 1)  # Timestamps are naive local time, matching the CSV's isoformat() strings
 
 is_recording = False
 movement_label = None
 initial_orientation = None
-current_movement_data = []
 movement_id = 0
-previous_imu = None
+write_queue = queue.Queue()
+writer_thread = None
+
+
+class CaptureBuffer:
+    """
+    Preallocated sample and timestamp arrays for one recording, grown by doubling.
+    """
+
+    def __init__(self, capacity=60 * SAMPLE_RATE):
+        self.samples = np.empty((capacity, len(AXES)))
+        self.timestamps = np.empty(capacity)
+        self.size = 0
+
+    def append(self, sample, timestamp):
+        if self.size == len(self.samples):
+            self.samples = np.concatenate([self.samples, np.empty_like(self.samples)])
+            self.timestamps = np.concatenate([self.timestamps, np.empty_like(self.timestamps)])
+        self.samples[self.size] = sample
+        self.timestamps[self.size] = timestamp
+        self.size += 1
+
+    def view(self):
+        return self.samples[:self.size], self.timestamps[:self.size]
+
+
+capture = CaptureBuffer()
+
 
 def initialize_movement_id():
+    if STORE_PATH:
+        # The store's index keeps the last MovementID, so nothing has to be re-read.
+        return MovementStore(STORE_PATH).next_movement_id()
     if not os.path.exists(OUTPUT_FILE):
         return 0
     try:
@@ -30,126 +68,125 @@ def initialize_movement_id():
         print(f"Error reading {OUTPUT_FILE}: {e}")
         return 0
 
-def save_to_csv(data):
+def window_starts(num_frames, window_size, overlap_frames):
+    """
+    First row of every (overlapping) window; window i covers rows starts[i]:starts[i] + window_size.
+    """
+    return np.arange(0, num_frames - window_size + 1, window_size - overlap_frames)
+
+def save_to_csv(samples, timestamps, starts, movement_ids, label, orientation):
     write_header = not os.path.exists(OUTPUT_FILE)
+    iso_timestamps = epoch_to_iso(timestamps)
     with open(OUTPUT_FILE, mode="a", newline="") as file:
-        writer = csv.DictWriter(
-            file,
-            fieldnames=[
-                "Timestamp",
-                "AccelX",
-                "AccelY",
-                "AccelZ",
-                "GyroX",
-                "GyroY",
-                "GyroZ",
-                "MovementID",
-                "MovementLabel"
-            ],
-        )
+        writer = csv.writer(file)
         if write_header:
-            writer.writeheader()
-        writer.writerows(data)
-
-def chop_into_windows(data, window_size, overlap_frames):
-    global movement_id
-    num_frames = len(data)
-    windows = []
-
-    for start_idx in range(0, num_frames - window_size + 1, window_size - overlap_frames):
-        window = data[start_idx : start_idx + window_size]
-        for frame in window:
-            frame["MovementID"] = movement_id
-        windows.extend(window)
-        movement_id += 1
-
-    return windows
+            writer.writerow(CSV_FIELDS)
+        for start, window_id in zip(starts, movement_ids):
+            for row in range(start, start + WINDOW_SIZE):
+                writer.writerow([iso_timestamps[row], *samples[row].tolist(), window_id, label, orientation or ""])
+
+def save_to_store(samples, timestamps, starts, movement_ids, label, orientation):
+    MovementStore(STORE_PATH).append_movements(
+        (window_id, label, samples[start:start + WINDOW_SIZE], timestamps[start:start + WINDOW_SIZE], orientation)
+        for start, window_id in zip(starts, movement_ids)
+    )
+
+def writer_loop():
+    """
+    Background thread that owns all disk writes, so saving never blocks the BLE callback.
+    """
+    while True:
+        batch = write_queue.get()
+        try:
+            starts = batch[2]
+            if STORE_PATH:
+                save_to_store(*batch)
+            else:
+                save_to_csv(*batch)
+            print(f"Saved {len(starts) * WINDOW_SIZE} frames ({len(starts)} windows) to {STORE_PATH or OUTPUT_FILE}.")
+        except Exception as e:
+            print(f"Error saving recording: {e}")
+        finally:
+            write_queue.task_done()
+
+def start_writer():
+    global writer_thread
+    if writer_thread is None:
+        writer_thread = threading.Thread(target=writer_loop, name="recording-writer", daemon=True)
+        writer_thread.start()
 
 def start_recording():
-    global is_recording, current_movement_data
+    global is_recording, capture
     is_recording = True
-    current_movement_data = [] 
+    capture = CaptureBuffer()
     print(f"Started recording movement {movement_label} with initial orientation {initial_orientation}.")
 
 def stop_recording():
-    global is_recording, current_movement_data
+    global is_recording, capture, movement_id
     is_recording = False
     print("Stopping recording...")
-    if current_movement_data:
-        print("Processing recorded data...")
-        windows = chop_into_windows(current_movement_data, WINDOW_SIZE, OVERLAP_FRAMES)
-        save_to_csv(windows)
-        print(f"Saved {len(windows)} frames to {OUTPUT_FILE}.")
-        current_movement_data = []
+    samples, timestamps = capture.view()
+    starts = window_starts(len(samples), WINDOW_SIZE, OVERLAP_FRAMES)
+    if len(starts):
+        # Every window gets its own MovementID; windows are just start offsets into
+        # the capture, which is handed over to the writer thread as is.
+        movement_ids = movement_id + np.arange(len(starts))
+        movement_id += len(starts)
+        start_writer()
+        write_queue.put((samples, timestamps, starts, movement_ids, movement_label, initial_orientation))
+        print(f"Queued {len(starts)} windows from {len(samples)} samples for saving.")
+    capture = CaptureBuffer()
 
 def notification_handler(sender, data):
-    global is_recording, current_movement_data, previous_imu
-    message = data.decode("utf-8").strip()
-
-    try:
-        if not message.startswith("Button"):
-            parts = message.split(",")
-            imu_data = {
-                "AccelX": float(parts[0]),
-                "AccelY": float(parts[1]),
-                "AccelZ": float(parts[2]),
-                "GyroX": float(parts[3]),
-                "GyroY": float(parts[4]),
-                "GyroZ": float(parts[5]),
-            }
-
-            imu_data["Timestamp"] = datetime.now().isoformat()
-            if is_recording:
-                imu_data["MovementID"] = movement_id
-                imu_data["MovementLabel"] = movement_label
-                imu_data["InitialOrientation"] = initial_orientation
-                current_movement_data.append(imu_data)
-                print(f"Recording: {imu_data}")
-
-        elif message.startswith("Button"):
-            if "Pressed" in message:
+    frame = decode_notification(data)
+
+    if is_recording and len(frame.samples):
+        timestamp = (datetime.now() - EPOCH).total_seconds()
+        for sample in frame.samples:
+            capture.append(sample, timestamp)
+            if capture.size % PROGRESS_INTERVAL == 0:
+                print(f"Recording: {capture.size} samples")
+
+    for event in frame.events:
+        if event.startswith("Button"):
+            if "Pressed" in event:
                 if is_recording:
                     stop_recording()  
                 else:
                     start_recording()  
-
-    except (ValueError, IndexError):
-        print(f"Invalid data received: {message}")
+        else:
+            print(f"Invalid data received: {event}")
 
 
-async def setup_bluetooth():
+async def setup_bluetooth(source=None, label=None):
     global movement_label, initial_orientation, movement_id
 
-    print("Define the movement label for this session: ")
-    movement_label = input("Movement Label: ").strip()
+    if label is None:
+        print("Define the movement label for this session: ")
+        label = input("Movement Label: ")
+    movement_label = label.strip()
 
     movement_id = initialize_movement_id()
 
-    print("Scanning for devices...")
-    devices = await BleakScanner.discover()
-
-    for i, device in enumerate(devices):
-        print(f"[{i}] {device.name} ({device.address})")
-
-    device_index = int(input("Select the device index to connect: "))
-    selected_device = devices[device_index]
-
-    print(f"Connecting to {selected_device.name}...")
-    async with BleakClient(selected_device.address) as client:
-        print("Connected!")
-
-        await client.start_notify(UART_TX_CHARACTERISTIC_UUID, notification_handler)
-
-        print("Receiving data. Press Ctrl+C to stop.")
-        try:
-            while True:
-                await asyncio.sleep(1)  
-        except KeyboardInterrupt:
-            print("Stopping notifications...")
-            await client.stop_notify(UART_TX_CHARACTERISTIC_UUID)
+    source = source or BleSource()
+    await source.run(notification_handler)
+    if is_recording:
+        stop_recording()
+    # Let the writer finish whatever is still queued before the process exits.
+    await asyncio.to_thread(write_queue.join)
 
 def main():
-    asyncio.run(setup_bluetooth())
+    global OUTPUT_FILE, STORE_PATH
+    parser = argparse.ArgumentParser(description="Record labelled movement windows from the controller.")
+    parser.add_argument("--label", help="Movement label for this session (prompted if omitted)")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="CSV file the windows are appended to")
+    parser.add_argument("--store", help="Append to a binary MovementStore directory instead of the CSV")
+    add_source_arguments(parser)
+    args = parser.parse_args()
+    OUTPUT_FILE = args.output
+    STORE_PATH = args.store
+    # A replayed session toggles recording itself via synthetic button presses.
+    asyncio.run(setup_bluetooth(source_from_args(args, buttons=True), args.label))
 
 if __name__ == "__main__":
     main()
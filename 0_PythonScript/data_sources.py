@@ -0,0 +1,188 @@
+import asyncio
+import csv
+import time
+from datetime import datetime
+
+import numpy as np
+
+from imu_protocol import encode_binary, encode_text
+from spectral_features import AXES
+
+UART_TX_CHARACTERISTIC_UUID = "6E400003-B5A3-F393-E0A9-E50E24DCCA9E"
+MAX_REPLAY_GAP = 1.0  # Seconds; longer pauses between recorded movements are shortened to this
+
+
+class BleSource:
+    """
+    Streams Nordic UART notifications from a real controller. Without an address
+    the user picks a device interactively, as the scripts always did.
+    """
+
+    def __init__(self, address=None):
+        self.address = address
+
+    async def select_address(self):
+        from bleak import BleakScanner
+
+        print("Scanning for devices...")
+        devices = await BleakScanner.discover()
+
+        for i, device in enumerate(devices):
+            print(f"[{i}] {device.name} ({device.address})")
+
+        # Prompt off the event loop so other tasks (e.g. the TCP server) keep running.
+        device_index = int(await asyncio.to_thread(input, "Select the device index to connect: "))
+        selected_device = devices[device_index]
+        print(f"Connecting to {selected_device.name}...")
+        return selected_device.address
+
+    async def run(self, handler):
+        from bleak import BleakClient
+
+        address = self.address or await self.select_address()
+        async with BleakClient(address) as client:
+            print("Connected!")
+
+            await client.start_notify(UART_TX_CHARACTERISTIC_UUID, handler)
+
+            print("Receiving data. Press Ctrl+C to stop.")
+            try:
+                while client.is_connected:
+                    await asyncio.sleep(1)
+            except (KeyboardInterrupt, asyncio.CancelledError):
+                print("Stopping notifications...")
+                await client.stop_notify(UART_TX_CHARACTERISTIC_UUID)
+                raise
+
+
+class ReplaySource:
+    """
+    Feeds recorded samples into a notification handler as if they came over BLE.
+    speed=1.0 replays in real time, N replays N times faster and None replays as
+    fast as possible. With buttons=True a "Button Pressed" notification is sent
+    before the first and after the last sample, which drives data_collection's
+    start/stop recording toggle.
+    """
+
+    def __init__(self, samples, offsets, speed=1.0, binary=False, samples_per_frame=1, buttons=False):
+        self.samples = np.asarray(samples, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=float)
+        self.speed = speed
+        self.binary = binary
+        self.samples_per_frame = samples_per_frame
+        self.buttons = buttons
+        self.samples_sent = 0
+        self.elapsed = 0.0
+
+    @classmethod
+    def from_csv(cls, path, rate=None, **kwargs):
+        """
+        Loads a movement_data.csv style recording. Sample timing comes from the
+        Timestamp column unless a fixed rate (Hz) is given.
+        """
+        with open(path, newline="") as file:
+            rows = list(csv.DictReader(file))
+        samples = [[float(row[axis]) for axis in AXES] for row in rows]
+        if rate is None and rows and "Timestamp" in rows[0]:
+            times = np.array([datetime.fromisoformat(row["Timestamp"]).timestamp() for row in rows])
+            gaps = np.clip(np.diff(times, prepend=times[0]), 0.0, MAX_REPLAY_GAP)
+            offsets = np.cumsum(gaps)
+        else:
+            offsets = np.arange(len(samples)) / (rate or 20)
+        return cls(samples, offsets, **kwargs)
+
+    @classmethod
+    def synthetic(cls, duration=60.0, rate=20, seed=0, **kwargs):
+        """
+        Generates a roughly realistic session: gravity on Z, slow lean drifts on
+        X/Y, occasional high-frequency shakes and sensor noise on every axis.
+        """
+        rng = np.random.default_rng(seed)
+        n = int(duration * rate)
+        t = np.arange(n) / rate
+        samples = rng.normal(0.0, [0.15, 0.15, 0.15, 2.0, 2.0, 2.0], size=(n, len(AXES)))
+        samples[:, 0] += 4.0 * np.sin(2 * np.pi * t / 17.0)
+        samples[:, 1] += 4.0 * np.sin(2 * np.pi * t / 23.0)
+        samples[:, 2] += 9.81
+        shaking = np.sin(2 * np.pi * t / 11.0) > 0.8
+        samples[shaking, :3] += 6.0 * np.sin(2 * np.pi * 4.0 * t[shaking])[:, None]
+        samples[shaking, 3:] += 150.0 * np.sin(2 * np.pi * 4.0 * t[shaking])[:, None]
+        return cls(samples, t, **kwargs)
+
+    def notifications(self):
+        """
+        Yields (offset_seconds, payload, sample_count) in the configured wire format.
+        """
+        step = self.samples_per_frame
+        for seq, start in enumerate(range(0, len(self.samples), step)):
+            chunk = self.samples[start:start + step]
+            offset = self.offsets[min(start + step, len(self.samples)) - 1]
+            if self.binary:
+                yield offset, encode_binary(seq, chunk, temp=25.0), len(chunk)
+            else:
+                for row_offset, row in zip(self.offsets[start:start + step], chunk):
+                    yield row_offset, encode_text(row[None, :], temp=25.0), 1
+
+    async def run(self, handler):
+        if self.buttons:
+            handler(None, b"Button Pressed\n")
+        start = time.monotonic()
+        for i, (offset, payload, count) in enumerate(self.notifications()):
+            if self.speed is None:
+                # Still yield to the event loop now and then so servers keep running.
+                if i % 256 == 0:
+                    await asyncio.sleep(0)
+            else:
+                delay = offset / self.speed - (time.monotonic() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            handler(None, payload)
+            self.samples_sent += count
+        if self.buttons:
+            handler(None, b"Button Pressed\n")
+        self.elapsed = time.monotonic() - start
+        rate = self.samples_sent / self.elapsed if self.elapsed else float("inf")
+        print(f"Replay finished: {self.samples_sent} samples in {self.elapsed:.2f}s ({rate:,.0f} samples/s)")
+
+
+def add_source_arguments(parser):
+    parser.add_argument(
+        "--address", action="append", help="BLE address to connect to without the interactive prompt (repeat for several controllers)"
+    )
+    parser.add_argument("--replay", metavar="CSV", help="Replay a recorded CSV instead of connecting over BLE")
+    parser.add_argument("--synthetic", type=float, metavar="SECONDS", help="Stream a synthetic session of this length")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier; 0 means as fast as possible")
+    parser.add_argument("--binary", action="store_true", help="Replay using packed binary frames")
+    parser.add_argument("--samples-per-frame", type=int, default=4, help="Samples per binary frame when replaying")
+
+
+def replay_options(args, **kwargs):
+    return dict(
+        speed=args.speed or None,
+        binary=args.binary,
+        samples_per_frame=args.samples_per_frame if args.binary else 1,
+        **kwargs,
+    )
+
+
+def source_from_args(args, **kwargs):
+    options = replay_options(args, **kwargs)
+    if args.replay:
+        return ReplaySource.from_csv(args.replay, **options)
+    if args.synthetic:
+        return ReplaySource.synthetic(args.synthetic, **options)
+    return BleSource(args.address[0] if args.address else None)
+
+
+def sources_from_args(args, count=1, **kwargs):
+    """
+    count sources for a multi-controller server: independent replays (synthetic
+    sessions get different seeds) or one BleSource per --address, with any
+    missing addresses left to the interactive prompt.
+    """
+    if args.replay:
+        return [source_from_args(args, **kwargs) for _ in range(count)]
+    if args.synthetic:
+        return [ReplaySource.synthetic(args.synthetic, seed=i, **replay_options(args, **kwargs)) for i in range(count)]
+    addresses = list(args.address or [])
+    return [BleSource(addresses[i] if i < len(addresses) else None) for i in range(max(count, len(addresses)))]
@@ -1,17 +1,49 @@
+import argparse
+import glob
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 from scipy.signal import welch
+from movement_store import MovementStore
+from spectral_features import AXES, FEATURE_COLUMNS, FEATURE_VERSION, FS, NFFT, WINDOW, compute_grouped_features
 
 input_file = "movement_data_delta.csv"
 output_file = "processed_training_data.csv"
 
-FS = 20  # Sampling frequency (Hz)
-NFFT = 64  # Length of FFT for spectral analysis
+CHUNK_SIZE = 100_000  # Raw rows read per chunk in streaming mode
+CACHE_DIR = ".feature_cache"  # Per-recording features keyed by file content and feature parameters
+LEGACY_SESSION = "legacy"  # Session of feature rows written before sessions were tracked
+RAW_COLUMNS = {"Timestamp", "MovementID", "MovementLabel", *AXES}
 
 
 def calculate_spectral_features(data):
     data["Timestamp"] = pd.to_datetime(data["Timestamp"])
     data = data.sort_values(by=["MovementID", "Timestamp"])
+    return features_from_sorted(data)
+
+
+def features_from_sorted(data):
+    """
+    One feature row per MovementID for data already ordered by MovementID and
+    Timestamp, computed in batched passes over equal-length movements.
+    """
+    movement_ids = data["MovementID"].values
+    group_starts = np.flatnonzero(np.diff(movement_ids, prepend=movement_ids[:1] - 1))
+    features = compute_grouped_features(data[AXES].values, group_starts, fs=FS, nfft=NFFT)
+    processed = pd.DataFrame(features, columns=FEATURE_COLUMNS)
+    processed["MovementID"] = movement_ids[group_starts]
+    processed["MovementLabel"] = data["MovementLabel"].values[group_starts]
+    return processed
+
+
+def calculate_spectral_features_per_group(data):
+    """
+    Reference implementation with one welch() call per axis per movement.
+    """
+    data["Timestamp"] = pd.to_datetime(data["Timestamp"])
+    data = data.sort_values(by=["MovementID", "Timestamp"])
 
     rows = []
     for movement_id, group in data.groupby("MovementID"):
@@ -25,7 +57,7 @@ def calculate_spectral_features(data):
 def compute_group_spectral_features(group):
     spectral_features = {}
 
-    for axis in ["AccelX", "AccelY", "AccelZ", "GyroX", "GyroY", "GyroZ"]:
+    for axis in AXES:
         signal = group[axis].values
         freq, psd = welch(signal, fs=FS, nfft=NFFT, nperseg=min(len(signal), NFFT))
 
@@ -35,12 +67,275 @@ def compute_group_spectral_features(group):
     return spectral_features
 
 
-def preprocess_dataset():
-    data = pd.read_csv(input_file)
-    processed_data = calculate_spectral_features(data)
-    print(f"Saving processed data to {output_file}...")
-    processed_data.to_csv(output_file, index=False)
+def calculate_store_features(store_path, skip_ids=None):
+    """
+    Features straight from a memory-mapped MovementStore: movements are already
+    contiguous, so no parsing or grouping is needed. Rows are only reordered by
+    Timestamp within a movement when they are not in time order already.
+    Movements in skip_ids are not read at all.
+    """
+    store = MovementStore(store_path)
+    movement_ids, starts, lengths, labels, _ = store.movement_table()
+    samples = store.samples()
+    if starts.size and not np.array_equal(starts[1:], starts[:-1] + lengths[:-1]):
+        raise ValueError(f"{store_path} has non-contiguous movements.")
+    timestamps = store.timestamps()
+    if skip_ids:
+        keep = ~np.isin(movement_ids, list(skip_ids))
+        if not keep.any():
+            return empty_features()
+        rows = np.concatenate([np.arange(start, start + length) for start, length in zip(starts[keep], lengths[keep])])
+        samples, timestamps = samples[rows], timestamps[rows]
+        movement_ids, lengths, labels = movement_ids[keep], lengths[keep], labels[keep]
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    row_movement = np.repeat(np.arange(len(starts)), lengths)
+    unordered = (np.diff(timestamps) < 0) & (np.diff(row_movement) == 0)
+    if unordered.any():
+        samples = samples[np.lexsort((timestamps, row_movement))]
+    features = compute_grouped_features(samples, starts, fs=FS, nfft=NFFT)
+    processed = pd.DataFrame(features, columns=FEATURE_COLUMNS)
+    processed["MovementID"] = movement_ids
+    processed["MovementLabel"] = labels
+    return processed
+
+
+def empty_features():
+    return pd.DataFrame(columns=[*FEATURE_COLUMNS, "MovementID", "MovementLabel"])
+
+
+def iter_movement_groups(path, chunksize=CHUNK_SIZE):
+    """
+    Yields (movement_id, group) from a raw recording read in chunks. data_collection
+    writes each MovementID as one contiguous run, so only the last (possibly
+    incomplete) run of a chunk is carried over into the next one.
+    """
+    seen_ids = set()
+    carry = None
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        run_starts = np.flatnonzero(np.diff(chunk["MovementID"].values)) + 1
+        bounds = [0, *run_starts, len(chunk)]
+        for start, end in zip(bounds[:-2], bounds[1:-1]):
+            yield _checked_group(chunk.iloc[start:end], seen_ids)
+        carry = chunk.iloc[bounds[-2]:]
+    if carry is not None and len(carry):
+        yield _checked_group(carry, seen_ids)
+
+
+def _checked_group(group, seen_ids):
+    movement_id = group["MovementID"].iloc[0]
+    if movement_id in seen_ids:
+        raise ValueError(
+            f"MovementID {movement_id} is not contiguous in the input; use the batch mode instead of --stream."
+        )
+    seen_ids.add(movement_id)
+    group = group.assign(Timestamp=pd.to_datetime(group["Timestamp"]))
+    return movement_id, group.sort_values(by="Timestamp", kind="stable")
+
+
+def stream_spectral_features(path, chunksize=CHUNK_SIZE, batch_size=1000):
+    """
+    Streaming counterpart of calculate_spectral_features: yields feature frames of
+    up to batch_size MovementIDs while holding about one chunk of raw samples in memory.
+    """
+    groups = []
+    for _, group in iter_movement_groups(path, chunksize):
+        groups.append(group)
+        if len(groups) >= batch_size:
+            yield features_from_sorted(pd.concat(groups, ignore_index=True))
+            groups = []
+    if groups:
+        yield features_from_sorted(pd.concat(groups, ignore_index=True))
+
+
+def preprocess_dataset_streaming(input_path=input_file, output_path=output_file, chunksize=CHUNK_SIZE):
+    print(f"Streaming {input_path} in chunks of {chunksize} rows...")
+    written = 0
+    with open(output_path, "w", newline="") as file:
+        for processed in stream_spectral_features(input_path, chunksize):
+            processed.to_csv(file, index=False, header=written == 0)
+            written += len(processed)
+    print(f"Saved {written} feature rows to {output_path}.")
+
+
+def preprocess_dataset(input_path=input_file, output_path=output_file):
+    if MovementStore.is_store(input_path):
+        processed_data = calculate_store_features(input_path)
+    else:
+        data = pd.read_csv(input_path)
+        processed_data = calculate_spectral_features(data)
+    print(f"Saving processed data to {output_path}...")
+    processed_data.to_csv(output_path, index=False)
+
+
+def expand_inputs(patterns):
+    """
+    Resolves files, directories (every raw recording CSV inside) and glob patterns
+    into a sorted list of raw recordings. Feature files and other CSVs are skipped.
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "*.csv"))
+        else:
+            matches = glob.glob(pattern)
+        paths.update(path for path in matches if is_raw_recording(path))
+    return sorted(paths)
+
+
+def is_raw_recording(path):
+    with open(path, newline="") as file:
+        header = set(file.readline().strip().split(","))
+    return RAW_COLUMNS <= header
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(path):
+    params = f"v{FEATURE_VERSION}-fs{FS}-nfft{NFFT}-{WINDOW}"
+    return f"{file_digest(path)[:32]}-{params}"
+
+
+def featurize_file(path, cache_dir=CACHE_DIR):
+    """
+    Features for one raw recording, served from cache_dir when the file content and
+    feature parameters are unchanged. Returns (path, features, was_cached).
+    Runs inside ProcessPoolExecutor workers.
+    """
+    cache_path = os.path.join(cache_dir, cache_key(path) + ".csv") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        return path, pd.read_csv(cache_path, float_precision="round_trip"), True
+
+    processed = calculate_spectral_features(pd.read_csv(path))
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        processed.to_csv(temp_path, index=False)
+        os.replace(temp_path, cache_path)
+    return path, processed, False
+
+
+def preprocess_files(paths, output_path=output_file, workers=None, cache_dir=CACHE_DIR):
+    """
+    Featurizes many recordings in parallel and merges them into one training file.
+    A Session column (the recording's file name) keeps MovementIDs from different
+    sessions distinguishable.
+    """
+    if not paths:
+        raise ValueError("No raw recordings found for the given inputs.")
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, processed, was_cached in executor.map(featurize_file, paths, [cache_dir] * len(paths)):
+            print(f"{'Cached' if was_cached else 'Processed'} {path}: {len(processed)} movements")
+            results[path] = processed.assign(Session=os.path.splitext(os.path.basename(path))[0])
+
+    merged = pd.concat([results[path] for path in paths], ignore_index=True)
+    print(f"Saving {len(merged)} feature rows from {len(paths)} recordings to {output_path}...")
+    merged.to_csv(output_path, index=False)
+    return merged
+
+
+def session_name(path):
+    return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+
+
+def featurized_movements(features, default_session=LEGACY_SESSION):
+    """
+    {session: set of MovementIDs} already present in a features frame. Files written
+    by the single-input modes have no Session column; their rows count as default_session.
+    """
+    sessions = features["Session"] if "Session" in features else [default_session] * len(features)
+    known = {}
+    for session, movement_id in zip(sessions, features["MovementID"]):
+        known.setdefault(session, set()).add(int(movement_id))
+    return known
+
+
+def featurize_new_movements(path, known_ids):
+    """
+    Features for the movements of one recording that are not in known_ids. Raw rows
+    of known movements are dropped before any feature work. Runs in worker processes.
+    """
+    if MovementStore.is_store(path):
+        return path, calculate_store_features(path, skip_ids=known_ids)
+    data = pd.read_csv(path)
+    data = data[~data["MovementID"].isin(known_ids)]
+    return path, calculate_spectral_features(data) if len(data) else empty_features()
+
+
+def update_features(paths, output_path=output_file, workers=None, legacy_session=LEGACY_SESSION):
+    """
+    Incremental counterpart of preprocess_files: featurizes only the movements of
+    each recording (keyed by Session and MovementID) that output_path does not have
+    yet and merges them in. Recordings are assumed append-only, as data_collection
+    writes them. Rows of an output without a Session column are tagged legacy_session,
+    never with an incoming recording, whose MovementIDs restart at 0 as well.
+    """
+    if not paths:
+        raise ValueError("No raw recordings found for the given inputs.")
+    if os.path.exists(output_path):
+        existing = pd.read_csv(output_path, float_precision="round_trip")
+    else:
+        existing = empty_features()
+    known = featurized_movements(existing, legacy_session)
+    if "Session" not in existing:
+        existing["Session"] = legacy_session
+
+    new_frames = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        known_ids = [known.get(session_name(path), set()) for path in paths]
+        for path, processed in executor.map(featurize_new_movements, paths, known_ids):
+            print(f"{path}: {len(processed)} new movements")
+            if len(processed):
+                new_frames.append(processed.assign(Session=session_name(path)))
+
+    if not new_frames:
+        print(f"{output_path} is up to date ({len(existing)} movements).")
+        return existing, 0
+    added = sum(len(frame) for frame in new_frames)
+    merged = pd.concat([existing, *new_frames], ignore_index=True) if len(existing) else pd.concat(new_frames, ignore_index=True)
+    temp_path = f"{output_path}.tmp"
+    merged.to_csv(temp_path, index=False)
+    os.replace(temp_path, output_path)
+    print(f"Added {added} movements to {output_path} ({len(merged)} total).")
+    return merged, added
 
 
 if __name__ == "__main__":
-    preprocess_dataset()
+    parser = argparse.ArgumentParser(description="Turn raw movement recordings into spectral training features.")
+    parser.add_argument("--input", nargs="+", default=[input_file], help="Raw CSV file(s), a MovementStore directory, directories or glob patterns")
+    parser.add_argument("--output", default=output_file)
+    parser.add_argument("--stream", action="store_true", help="Process a single input in bounded-memory chunks")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, help="Worker processes for multiple recordings (default: CPU count)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Feature cache directory; empty string disables it")
+    parser.add_argument("--incremental", action="store_true", help="Only featurize movements missing from --output and append them")
+    parser.add_argument(
+        "--legacy-session", default=LEGACY_SESSION,
+        help="Session for --output rows written without one (name it after their recording to skip re-featurizing it)",
+    )
+    args = parser.parse_args()
+
+    single_file = len(args.input) == 1 and (os.path.isfile(args.input[0]) or MovementStore.is_store(args.input[0]))
+    if args.incremental:
+        inputs = []
+        for path in args.input:
+            inputs += [path] if MovementStore.is_store(path) else expand_inputs([path])
+        update_features(inputs, args.output, args.workers, args.legacy_session)
+    elif args.stream:
+        if not single_file:
+            parser.error("--stream takes exactly one input file")
+        if MovementStore.is_store(args.input[0]):
+            parser.error("--stream reads CSV recordings; a MovementStore is already read through a memory map, drop --stream")
+        preprocess_dataset_streaming(args.input[0], args.output, args.chunksize)
+    elif single_file:
+        preprocess_dataset(args.input[0], args.output)
+    else:
+        preprocess_files(expand_inputs(args.input), args.output, args.workers, args.cache_dir or None)
@@ -1,38 +1,90 @@
+import argparse
+import os
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
+from movement_store import MovementStore
+from visualization_report import MAX_POINTS, downsample, session_inputs, session_name, write_report
+
+ACCEL_AXES = ["AccelX", "AccelY", "AccelZ"]
+COLORS = ['blue', 'orange', 'green', 'red', 'purple']
 
 # Load the resampled dataset
 def load_resampled_dataset(file_path):
-    data = pd.read_csv(file_path)
-    grouped = data.groupby("MovementID")
-    X = [group[["AccelX", "AccelY", "AccelZ"]].mean(axis=0).values for _, group in grouped]
-    y = grouped["MovementLabel"].first().values
+    if MovementStore.is_store(file_path):
+        return load_store_dataset(file_path)
+    data = pd.read_csv(file_path, usecols=[*ACCEL_AXES, "MovementID", "MovementLabel"])
+    # One vectorized pass: per-movement accelerometer means and the movement's label.
+    grouped = data.groupby("MovementID").agg(
+        **{axis: (axis, "mean") for axis in ACCEL_AXES}, MovementLabel=("MovementLabel", "first")
+    )
+    return grouped[ACCEL_AXES].reset_index(drop=True), grouped["MovementLabel"].reset_index(drop=True)
 
-    return pd.DataFrame(X, columns=["AccelX", "AccelY", "AccelZ"]), pd.Series(y)
+def load_store_dataset(store_path):
+    # Per-movement means straight from the memory-mapped samples, one reduceat per axis.
+    store = MovementStore(store_path)
+    _, starts, lengths, labels, _ = store.movement_table()
+    accel = np.asarray(store.samples()[:, :3], dtype=float)
+    means = np.add.reduceat(accel, starts, axis=0) / lengths[:, None]
+    return pd.DataFrame(means, columns=["AccelX", "AccelY", "AccelZ"]), pd.Series(labels)
 
-def visualize_dataset_3d(X, y):
+def visualize_dataset_3d(X, y, output_file=None, title="3D Visualization of The Dataset"):
     fig = plt.figure(figsize=(12, 8))
     ax = fig.add_subplot(111, projection='3d')
     labels = y.unique()
-    colors = ['blue', 'orange'] 
-    
+    colors = COLORS
+
     for label, color in zip(labels, colors):
         idx = y == label
-        ax.scatter(X.loc[idx, "AccelX"], 
-                   X.loc[idx, "AccelY"], 
-                   X.loc[idx, "AccelZ"], 
+        ax.scatter(X.loc[idx, "AccelX"],
+                   X.loc[idx, "AccelY"],
+                   X.loc[idx, "AccelZ"],
                    label=label, color=color, alpha=0.7)
 
-    ax.set_title("3D Visualization of The Dataset")
+    ax.set_title(title)
     ax.set_xlabel("Accelerometer X")
     ax.set_ylabel("Accelerometer Y")
     ax.set_zlabel("Accelerometer Z")
     ax.legend(title="Movement Label")
-    plt.show()
+    if output_file:
+        fig.savefig(output_file, dpi=100, bbox_inches="tight")
+        plt.close(fig)
+    else:
+        plt.show()
+
+def render_sessions(paths, output_dir, max_points=MAX_POINTS):
+    """
+    Headless batch mode: one PNG per session (raw CSV recording or MovementStore)
+    plus an index.html report, drawn with the Agg backend.
+    """
+    plt.switch_backend("Agg")
+    inputs = session_inputs(paths, ["MovementID", "MovementLabel", *ACCEL_AXES])
+    if not inputs:
+        raise ValueError("No raw recordings or movement stores found for the given inputs.")
+    os.makedirs(output_dir, exist_ok=True)
+    entries = []
+    for path in inputs:
+        X, y = load_resampled_dataset(path)
+        rows = downsample(len(X), max_points)
+        image = f"{session_name(path)}_accel3d.png"
+        visualize_dataset_3d(
+            X.iloc[rows].reset_index(drop=True), y.iloc[rows].reset_index(drop=True),
+            os.path.join(output_dir, image), title=f"{session_name(path)}: mean acceleration per movement",
+        )
+        entries.append((session_name(path), image, y.value_counts().to_dict(), len(rows)))
+        print(f"Rendered {path} ({len(X)} movements) to {image}")
+    print(f"Report written to {write_report(output_dir, 'Raw movement sessions', entries)}")
 
 if __name__ == "__main__":
-    file = "movement_data_delta.csv"
-    X, y = load_resampled_dataset(file)
-    y = y.replace({"idle": "idle", "shake": "shake"})  # Ensure correct label names
-    visualize_dataset_3d(X, y)
+    parser = argparse.ArgumentParser(description="3D plot of per-movement mean acceleration.")
+    parser.add_argument("--input", nargs="+", default=["movement_data_delta.csv"], help="Recordings, movement stores or directories of them")
+    parser.add_argument("--output-dir", help="Render PNGs and an HTML report here instead of opening a window")
+    parser.add_argument("--max-points", type=int, default=MAX_POINTS, help="Downsample sessions with more movements (headless mode)")
+    args = parser.parse_args()
+    if args.output_dir:
+        render_sessions(args.input, args.output_dir, args.max_points)
+    else:
+        X, y = load_resampled_dataset(args.input[0])
+        y = y.replace({"idle": "idle", "shake": "shake"})  # Ensure correct label names
+        visualize_dataset_3d(X, y)
@@ -1,40 +1,118 @@
+import argparse
+import os
+from collections import namedtuple
+import joblib
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
 from mpl_toolkits.mplot3d import Axes3D
+from visualization_report import MAX_POINTS, downsample, session_inputs, session_name, write_report
+
+FEATURE_COLUMNS = ["TotalPower_AccelX","DominantFreq_AccelX","TotalPower_AccelY","DominantFreq_AccelY","TotalPower_AccelZ","DominantFreq_AccelZ","TotalPower_GyroX","DominantFreq_GyroX","TotalPower_GyroY","DominantFreq_GyroY","TotalPower_GyroZ","DominantFreq_GyroZ"]
+SCALER_FILE = "scaler_spectral.joblib"
+PCA_FILE = "pca_spectral.joblib"
+COLORS = ['blue', 'orange', 'green', 'red', 'purple']
+
+# sessions holds the Session of each movement, or None for a file without a Session column.
+ResampledDataset = namedtuple("ResampledDataset", ["X", "y", "sessions"])
 
 def load_resampled_dataset(file_path):
     data = pd.read_csv(file_path)
-    grouped = data.groupby("MovementID")
-    X = [group[["TotalPower_AccelX","DominantFreq_AccelX","TotalPower_AccelY","DominantFreq_AccelY","TotalPower_AccelZ","DominantFreq_AccelZ","TotalPower_GyroX","DominantFreq_GyroX","TotalPower_GyroY","DominantFreq_GyroY","TotalPower_GyroZ","DominantFreq_GyroZ"]].values.flatten() for _, group in grouped]    
-    y = grouped["MovementLabel"].first().values
+    # Featurized files hold one row per movement; merged multi-session files repeat MovementIDs per Session.
+    keys = ["Session", "MovementID"] if "Session" in data.columns else ["MovementID"]
+    grouped = data.groupby(keys).agg(**{column: (column, "first") for column in [*FEATURE_COLUMNS, "MovementLabel"]})
+    sessions = grouped.index.get_level_values(0) if len(keys) == 2 else None
+    X = grouped[FEATURE_COLUMNS].reset_index(drop=True)
+    X.columns = range(len(FEATURE_COLUMNS))
+    y = grouped["MovementLabel"].reset_index(drop=True)
+    return ResampledDataset(X, y, sessions)
 
-    return pd.DataFrame(X), pd.Series(y)
+def load_projection(scaler_file=SCALER_FILE, pca_file=PCA_FILE):
+    """
+    The scaler and PCA saved by training.py, so every plot shares the model's axes.
+    """
+    if os.path.exists(scaler_file) and os.path.exists(pca_file):
+        return joblib.load(scaler_file), joblib.load(pca_file)
+    return None
 
+def project(X, projection=None):
+    if projection is None:
+        # No trained model yet: fit on the data being plotted, as before.
+        scaler = StandardScaler()
+        return PCA(n_components=2).fit_transform(scaler.fit_transform(X))
+    scaler, pca = projection
+    return pca.transform(scaler.transform(np.asarray(X, dtype=float)))[:, :2]
 
-def visualize_dataset(X, y, labels):
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    pca = PCA()
-    X_pca = pca.fit_transform(X_scaled)
-    plt.figure(figsize=(10, 7))
-    colors = ['blue', 'orange']
+def visualize_dataset(X, y, labels, projection=None, output_file=None, title="Visualization of The Dataset (# PCA Features = 2)"):
+    X_pca = project(X, projection)
+    fig = plt.figure(figsize=(10, 7))
+    y = pd.Series(np.asarray(y))
+    codes = pd.Categorical(y, categories=labels).codes
+    shown = codes >= 0
+    colors = np.array(COLORS[:len(labels)])
+    # One scatter call for every point; the legend gets one proxy handle per label.
+    plt.scatter(X_pca[shown, 0], X_pca[shown, 1], c=colors[codes[shown]], alpha=0.7)
     for label, color in zip(labels, colors):
-        idx = y == label
-        plt.scatter(X_pca[idx, 0], X_pca[idx, 1], color=color, label=label, alpha=0.7)
+        plt.scatter([], [], color=color, label=label, alpha=0.7)
 
-    plt.title("Visualization of The Dataset (# PCA Features = 2)")
+    plt.title(title)
     plt.xlabel("PCA Component 1")
     plt.ylabel("PCA Component 2")
     plt.legend(title="Movement Label")
     plt.grid()
-    plt.show()
+    if output_file:
+        fig.savefig(output_file, dpi=100, bbox_inches="tight")
+        plt.close(fig)
+    else:
+        plt.show()
+
+def render_sessions(paths, output_dir, max_points=MAX_POINTS, refit=False):
+    """
+    Headless batch mode: one PNG per featurized session (per Session of a merged
+    file) plus an index.html report, all projected with the saved scaler and PCA.
+    """
+    plt.switch_backend("Agg")
+    inputs = session_inputs(paths, ["MovementID", "MovementLabel", *FEATURE_COLUMNS])
+    if not inputs:
+        raise ValueError("No featurized session CSVs found for the given inputs.")
+    projection = None if refit else load_projection()
+    if projection is None and not refit:
+        print(f"{SCALER_FILE}/{PCA_FILE} not found; fitting a projection per session.")
+    os.makedirs(output_dir, exist_ok=True)
+    entries = []
+    for path in inputs:
+        X, y, sessions = load_resampled_dataset(path)
+        if sessions is not None:
+            groups = pd.Series(np.arange(len(X))).groupby(np.asarray(sessions)).indices.items()
+            groups = [(f"{session_name(path)}_{session}", rows) for session, rows in groups]
+        else:
+            groups = [(session_name(path), np.arange(len(X)))]
+        labels = sorted(y.unique())
+        for name, rows in groups:
+            shown = rows[downsample(len(rows), max_points)]
+            image = f"{name}_pca.png"
+            visualize_dataset(
+                X.iloc[shown], y.iloc[shown], labels, projection,
+                os.path.join(output_dir, image), title=f"{name}: spectral features (# PCA Features = 2)",
+            )
+            entries.append((name, image, y.iloc[rows].value_counts().to_dict(), len(shown)))
+            print(f"Rendered {name} ({len(rows)} movements) to {image}")
+    print(f"Report written to {write_report(output_dir, 'Featurized movement sessions', entries)}")
 
 
 if __name__ == "__main__":
-    resampled_file = "processed_training_data.csv"
-    X, y = load_resampled_dataset(resampled_file)
-    y = pd.Series(y).map({"idle": "idle", "shake": "shake"}).astype("category")
-    label_names = ["idle", "shake"]
-    visualize_dataset(X, y, label_names)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="2D PCA plot of the spectral movement features.")
+    parser.add_argument("--input", nargs="+", default=["processed_training_data.csv"], help="Featurized CSVs or directories of them")
+    parser.add_argument("--output-dir", help="Render PNGs and an HTML report here instead of opening a window")
+    parser.add_argument("--max-points", type=int, default=MAX_POINTS, help="Downsample sessions with more movements (headless mode)")
+    parser.add_argument("--refit", action="store_true", help="Fit a fresh scaler and PCA instead of loading the saved ones")
+    args = parser.parse_args()
+    if args.output_dir:
+        render_sessions(args.input, args.output_dir, args.max_points, args.refit)
+    else:
+        X, y, _ = load_resampled_dataset(args.input[0])
+        y = pd.Series(y).map({"idle": "idle", "shake": "shake"}).astype("category")
+        label_names = ["idle", "shake"]
+        visualize_dataset(X, y, label_names, None if args.refit else load_projection())
@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import json
+import socket
+import time
+
+from gesture_protocol import SUBSCRIBE, UNSUBSCRIBE, decode_event, decode_events, sequence_gap
+from latency_stats import Histogram
+
+TCP_PORT = 65432  # realtime_server.TCP_PORT
+UDP_PORT = 65433  # realtime_server.UDP_PORT
+IDLE_TIMEOUT = 1.0  # Stop once events have arrived and then none for this many seconds
+RESUBSCRIBE_INTERVAL = 1.0  # UDP clients repeat SUBSCRIBE so a restarted server picks them up
+
+
+class ReceiverStats:
+    """
+    What one client saw: events received, sequence gaps (lost), events that arrived
+    after a later one (reordered, which also fills an earlier gap) and the one-way
+    latency from the server's monotonic send timestamp, valid on the same host.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.highest_seq = None
+        self.last_arrival = None
+        self.latency = Histogram()
+
+    def add(self, event, arrival_ns):
+        self.received += 1
+        self.last_arrival = arrival_ns
+        self.latency.record(max(arrival_ns - event.timestamp_ns, 0) / 1e9)
+        gap = sequence_gap(self.highest_seq, event.seq)
+        if self.highest_seq is not None and gap >= 2 ** 31:
+            self.reordered += 1
+            self.lost = max(self.lost - 1, 0)
+            return
+        self.lost += gap
+        self.highest_seq = event.seq
+
+    def summary(self):
+        expected = self.received + self.lost
+        return {
+            "received": self.received,
+            "lost": self.lost,
+            "loss_ratio": self.lost / expected if expected else 0.0,
+            "reordered": self.reordered,
+            **self.latency.summary(),
+        }
+
+
+def idle(stats, started, seconds):
+    current = time.monotonic_ns()
+    if (current - started) / 1e9 >= seconds:
+        return True
+    return stats.last_arrival is not None and (current - stats.last_arrival) / 1e9 >= IDLE_TIMEOUT
+
+
+async def receive_tcp(host, port, seconds, stats):
+    """
+    Reads binary events (realtime_server --events binary) until seconds pass or the stream goes idle.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    started = time.monotonic_ns()
+    buffer = b""
+    try:
+        while not idle(stats, started, seconds):
+            try:
+                data = await asyncio.wait_for(reader.read(65536), 0.1)
+            except asyncio.TimeoutError:
+                continue
+            if not data:
+                break
+            arrival = time.monotonic_ns()
+            buffer += data
+            events, used = decode_events(buffer)
+            buffer = buffer[used:]
+            for event in events:
+                stats.add(event, arrival)
+    finally:
+        writer.close()
+
+
+class UdpReceiver(asyncio.DatagramProtocol):
+    def __init__(self, stats):
+        self.stats = stats
+        self.malformed = 0
+
+    def datagram_received(self, data, addr):
+        arrival = time.monotonic_ns()
+        try:
+            self.stats.add(decode_event(data), arrival)
+        except Exception:
+            self.malformed += 1
+
+
+async def receive_udp(host, port, seconds, stats):
+    """
+    Subscribes to the server's UDP events (realtime_server --udp) until seconds pass or the stream goes idle.
+    """
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: UdpReceiver(stats), remote_addr=(host, port)
+    )
+    started = time.monotonic_ns()
+    last_subscribe = 0.0
+    try:
+        while not idle(stats, started, seconds):
+            if time.monotonic() - last_subscribe >= RESUBSCRIBE_INTERVAL:
+                transport.sendto(SUBSCRIBE)
+                last_subscribe = time.monotonic()
+            await asyncio.sleep(0.05)
+        transport.sendto(UNSUBSCRIBE)
+    finally:
+        transport.close()
+
+
+async def run_clients(transport, host, port, seconds, clients):
+    receive = receive_udp if transport == "udp" else receive_tcp
+    stats = [ReceiverStats() for _ in range(clients)]
+    await asyncio.gather(*(receive(host, port, seconds, client) for client in stats))
+    return stats
+
+
+def format_summary(name, summary):
+    return (
+        f"{name}: {summary['received']} events, lost {summary['lost']} ({summary['loss_ratio']:.2%}), "
+        f"reordered {summary['reordered']}, one-way latency p50={summary['p50_us']:.0f}us "
+        f"p95={summary['p95_us']:.0f}us p99={summary['p99_us']:.0f}us max={summary['max_us']:.0f}us"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local test client for the binary gesture events: one-way latency and loss.")
+    parser.add_argument("--transport", choices=["tcp", "udp"], default="udp")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help=f"Server port (default {TCP_PORT} for TCP, {UDP_PORT} for UDP)")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Longest time to listen")
+    parser.add_argument("--clients", type=int, default=1, help="Concurrent receivers, to load the server's fan-out")
+    parser.add_argument("--json", action="store_true", help="Print one JSON summary per client instead of text")
+    args = parser.parse_args()
+    port = args.port or (UDP_PORT if args.transport == "udp" else TCP_PORT)
+    results = asyncio.run(run_clients(args.transport, args.host, port, args.seconds, args.clients))
+    for i, stats in enumerate(results):
+        summary = stats.summary()
+        print(json.dumps(summary) if args.json else format_summary(f"{args.transport} client {i + 1}", summary))
@@ -0,0 +1,57 @@
+from collections import namedtuple
+import struct
+import time
+
+# Fixed-size binary gesture event, the compact alternative to the newline-terminated text
+# messages ("Leaning Left", "P2:shake", ...) the server sends by default:
+#   uint8 magic, uint8 version, uint8 state id (index into STATES), uint8 player slot
+#   (0 for an untagged single controller, else 1-based in connection order), uint32 sequence
+#   number, int64 send time in time.monotonic_ns() units, float32 confidence.
+# Everything is little-endian, 20 bytes per event. On TCP events are simply concatenated;
+# over UDP each datagram holds one event. Text messages never start with EVENT_MAGIC.
+EVENT_MAGIC = 0xE7
+EVENT_VERSION = 1
+EVENT = struct.Struct("<BBBBIqf")
+STATES = [
+    "Neutral", "Leaning Left", "Leaning Right", "Leaning Forward", "Leaning Backward",
+    "shake", "Button Pressed", "Button Released",
+]
+STATE_IDS = {state: i for i, state in enumerate(STATES)}
+UNKNOWN_STATE = 0xFF
+SUBSCRIBE = b"SUBSCRIBE"  # Datagram a UDP client sends to start (or keep) receiving events
+UNSUBSCRIBE = b"UNSUBSCRIBE"
+
+GestureEvent = namedtuple("GestureEvent", ["seq", "state", "player", "timestamp_ns", "confidence"])
+
+
+def encode_event(seq, state, player=0, confidence=1.0, timestamp_ns=None):
+    timestamp_ns = time.monotonic_ns() if timestamp_ns is None else timestamp_ns
+    return EVENT.pack(
+        EVENT_MAGIC, EVENT_VERSION, STATE_IDS.get(state, UNKNOWN_STATE), player, seq & 0xFFFFFFFF, timestamp_ns, confidence
+    )
+
+
+def decode_event(data, offset=0):
+    magic, version, state_id, player, seq, timestamp_ns, confidence = EVENT.unpack_from(data, offset)
+    if magic != EVENT_MAGIC or version != EVENT_VERSION:
+        raise ValueError(f"Not a version {EVENT_VERSION} gesture event (magic {magic:#x}, version {version}).")
+    state = STATES[state_id] if state_id < len(STATES) else None
+    return GestureEvent(seq, state, player, timestamp_ns, confidence)
+
+
+def decode_events(buffer):
+    """
+    Decodes every complete event in a TCP byte stream buffer.
+    Returns (events, number of bytes consumed); keep the rest for the next read.
+    """
+    count = len(buffer) // EVENT.size
+    return [decode_event(buffer, i * EVENT.size) for i in range(count)], count * EVENT.size
+
+
+def sequence_gap(previous_seq, seq):
+    """
+    Events lost between two consecutive sequence numbers (mod 2**32).
+    """
+    if previous_seq is None:
+        return 0
+    return (seq - previous_seq - 1) & 0xFFFFFFFF
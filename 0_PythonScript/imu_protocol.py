@@ -0,0 +1,96 @@
+from collections import namedtuple
+import struct
+
+import numpy as np
+
+# Packed binary frame sent over Nordic UART when the firmware is built with BINARY_FRAMES:
+#   uint8 magic, uint8 sample count, uint16 sequence number, int16 temperature * TEMP_SCALE,
+#   then `count` samples of six int16 axes (AccelX..Z scaled by ACCEL_SCALE, GyroX..Z by GYRO_SCALE).
+# Everything is little-endian. The text protocol ("ax,ay,az,gx,gy,gz,temp\n") never starts
+# with FRAME_MAGIC, so both formats can share the characteristic.
+FRAME_MAGIC = 0xA5
+FRAME_HEADER = struct.Struct("<BBHh")
+ACCEL_SCALE = 100.0  # int16 units per m/s^2 (covers the firmware's +/-16 g clamp)
+GYRO_SCALE = 10.0  # int16 units per deg/s
+TEMP_SCALE = 100.0
+NUM_AXES = 6
+SAMPLE_DTYPE = np.dtype("<i2")
+AXIS_SCALE = np.array([ACCEL_SCALE] * 3 + [GYRO_SCALE] * 3)
+
+Frame = namedtuple("Frame", ["seq", "samples", "temp", "events"])
+
+
+def decode_notification(data):
+    """
+    Decodes one BLE notification in either format without raising.
+    Returns a Frame whose samples is an (n, 6) float array; non-IMU lines such as
+    "Button Pressed", malformed text and truncated binary frames end up in events.
+    seq is None for text and malformed frames.
+    """
+    if data and data[0] == FRAME_MAGIC:
+        return decode_binary(data)
+    return decode_text(data)
+
+
+def decode_binary(data):
+    if len(data) < FRAME_HEADER.size:
+        return malformed_frame(data)
+    _, count, seq, temp = FRAME_HEADER.unpack_from(data)
+    if len(data) != FRAME_HEADER.size + count * NUM_AXES * SAMPLE_DTYPE.itemsize:
+        return malformed_frame(data)
+    raw = np.frombuffer(data, dtype=SAMPLE_DTYPE, count=count * NUM_AXES, offset=FRAME_HEADER.size)
+    samples = raw.reshape(count, NUM_AXES) / AXIS_SCALE
+    return Frame(seq, samples, temp / TEMP_SCALE, [])
+
+
+def malformed_frame(data):
+    return Frame(None, np.empty((0, NUM_AXES)), None, [f"Malformed binary frame ({len(data)} bytes): {bytes(data[:16]).hex()}"])
+
+
+def decode_text(data):
+    message = data.decode("utf-8", errors="replace").strip()
+    rows = []
+    events = []
+    temp = None
+    for line in message.split("\n"):
+        line = line.strip()
+        parts = line.split(",")
+        if len(parts) >= NUM_AXES and not line.startswith("Button"):
+            rows.append(parts[:NUM_AXES])
+            if len(parts) > NUM_AXES:
+                temp = parts[NUM_AXES]
+        elif line:
+            events.append(line)
+    if not rows:
+        return Frame(None, np.empty((0, NUM_AXES)), None, events)
+    try:
+        samples = np.array(rows, dtype=float)
+        temp = float(temp) if temp is not None else None
+    except ValueError:
+        return Frame(None, np.empty((0, NUM_AXES)), None, events + [message])
+    return Frame(None, samples, temp, events)
+
+
+def encode_binary(seq, samples, temp=0.0):
+    """
+    Packs an (n, 6) array of samples into one binary frame (the firmware's layout).
+    """
+    samples = np.asarray(samples, dtype=float)
+    scaled = np.clip(np.round(samples * AXIS_SCALE), -32768, 32767).astype(SAMPLE_DTYPE)
+    header = FRAME_HEADER.pack(FRAME_MAGIC, len(samples), seq & 0xFFFF, int(round(temp * TEMP_SCALE)))
+    return header + scaled.tobytes()
+
+
+def encode_text(samples, temp=0.0):
+    return "".join(
+        ",".join(f"{value:.3f}" for value in row) + f",{temp:.3f}\n" for row in samples
+    ).encode("utf-8")
+
+
+def sequence_gap(previous_seq, seq):
+    """
+    Number of frames lost between two consecutive sequence numbers (mod 2**16).
+    """
+    if previous_seq is None or seq is None:
+        return 0
+    return (seq - previous_seq - 1) & 0xFFFF
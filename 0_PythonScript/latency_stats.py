@@ -0,0 +1,108 @@
+import json
+import math
+import os
+import threading
+import time
+
+# Log-spaced buckets from 100 ns to ~100 s, 20 per decade (~12% resolution).
+MIN_SECONDS = 1e-7
+BUCKETS_PER_DECADE = 20
+NUM_BUCKETS = 9 * BUCKETS_PER_DECADE + 1
+
+now = time.perf_counter
+
+
+class Histogram:
+    """
+    Fixed-size log-bucketed latency histogram. record() is a log10, a clamp and an
+    integer increment, cheap enough to leave on during play sessions.
+    """
+
+    def __init__(self):
+        self.counts = [0] * NUM_BUCKETS
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        if seconds <= MIN_SECONDS:
+            index = 0
+        else:
+            index = min(int(math.log10(seconds / MIN_SECONDS) * BUCKETS_PER_DECADE) + 1, NUM_BUCKETS - 1)
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        if not self.total:
+            return 0.0
+        rank = math.ceil(self.total * p / 100.0)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                # Report the bucket's upper edge, capped by the largest value seen.
+                return min(MIN_SECONDS * 10 ** (index / BUCKETS_PER_DECADE), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "mean_us": self.sum / self.total * 1e6 if self.total else 0.0,
+            "p50_us": self.percentile(50) * 1e6,
+            "p95_us": self.percentile(95) * 1e6,
+            "p99_us": self.percentile(99) * 1e6,
+            "max_us": self.max * 1e6,
+        }
+
+
+class LatencyStats:
+    """
+    Named per-stage histograms. Stages are created on first use, so callers just do
+    stats.record("features", start) with start taken from latency_stats.now().
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, start, end=None):
+        """
+        Records end - start for stage and returns end, so consecutive stages can chain.
+        """
+        end = now() if end is None else end
+        if self.enabled:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                with self.lock:
+                    histogram = self.histograms.setdefault(stage, Histogram())
+            histogram.record(end - start)
+        return end
+
+    def summary(self):
+        return {stage: histogram.summary() for stage, histogram in list(self.histograms.items())}
+
+    def format_line(self, stages=None):
+        summary = self.summary()
+        parts = []
+        for stage in stages or summary:
+            if stage in summary and summary[stage]["count"]:
+                s = summary[stage]
+                parts.append(f"{stage} p50={s['p50_us']:.0f} p95={s['p95_us']:.0f} p99={s['p99_us']:.0f}us")
+        return "Latency: " + (", ".join(parts) if parts else "no samples yet")
+
+    def dump(self, path):
+        """
+        Writes the summary as JSON, replacing the file atomically so readers never see a partial write.
+        """
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"time": time.time(), "stages": self.summary()}, file, indent=2)
+        os.replace(temp_path, path)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
@@ -0,0 +1,401 @@
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+import spectral_features
+
+BUNDLE_FORMAT = "movement-model"
+BUNDLE_VERSION = 1
+DEFAULT_BUNDLE = "movement_model.npz"
+MIN_PROB = 1e-7  # libsvm clamps pairwise probabilities to [MIN_PROB, 1 - MIN_PROB]
+# Classifier arrays stored after the shared projection (W, b), per estimator kind.
+ESTIMATOR_ARRAYS = {
+    "svc": ["support_vectors", "coefficients", "intercept", "prob_a", "prob_b"],
+    "logistic": ["coef", "intercept"],
+    "tree": ["children_left", "children_right", "feature", "threshold", "value"],
+}
+
+
+def fused_projection(scaler, pca):
+    """
+    Folds StandardScaler and PCA into a single affine map: X_pca = features @ W + b.
+    """
+    components = pca.components_
+    if getattr(pca, "whiten", False):
+        components = components / np.sqrt(pca.explained_variance_)[:, None]
+    W = (components / scaler.scale_).T
+    b = -(scaler.mean_ / scaler.scale_) @ components.T - pca.mean_ @ components.T
+    return W, b
+
+
+def pairwise_coefficients(svc):
+    """
+    Dense (n_pairs, n_support_vectors) coefficient matrix for libsvm's one-vs-one
+    classifiers, in libsvm's pair order (0,1), (0,2), ..., (1,2), ...
+    """
+    n_classes = len(svc.classes_)
+    bounds = np.concatenate([[0], np.cumsum(svc.n_support_)])
+    dual_coef = svc._dual_coef_  # libsvm sign convention, unlike the public dual_coef_
+    pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+    coefficients = np.zeros((len(pairs), dual_coef.shape[1]))
+    for p, (i, j) in enumerate(pairs):
+        coefficients[p, bounds[i]:bounds[i + 1]] = dual_coef[j - 1, bounds[i]:bounds[i + 1]]
+        coefficients[p, bounds[j]:bounds[j + 1]] = dual_coef[i, bounds[j]:bounds[j + 1]]
+    return coefficients
+
+
+def multiclass_probability(pairwise):
+    """
+    libsvm's pairwise coupling (Wu, Lin and Weng, method 2), vectorized over rows.
+    pairwise is (n, k, k) with pairwise[:, i, j] = P(i | i or j); returns (n, k).
+    libsvm runs this even for two classes, so it is needed to match predict_proba exactly.
+    """
+    n, k, _ = pairwise.shape
+    Q = -pairwise.transpose(0, 2, 1) * pairwise
+    diagonal = np.arange(k)
+    Q[:, diagonal, diagonal] = (pairwise ** 2).sum(axis=1)
+    p = np.full((n, k), 1.0 / k)
+    eps = 0.005 / k
+    active = np.ones(n, dtype=bool)
+    for _ in range(max(100, k)):
+        Qp = np.einsum("ntj,nj->nt", Q, p)
+        pQp = (p * Qp).sum(axis=1)
+        active &= np.abs(Qp - pQp[:, None]).max(axis=1) >= eps
+        if not active.any():
+            break
+        for t in range(k):
+            diff = np.where(active, (pQp - Qp[:, t]) / Q[:, t, t], 0.0)
+            p[:, t] += diff
+            pQp = (pQp + diff * (diff * Q[:, t, t] + 2 * Qp[:, t])) / (1 + diff) ** 2
+            Qp = (Qp + diff[:, None] * Q[:, t, :]) / (1 + diff)[:, None]
+            p /= (1 + diff)[:, None]
+    return p
+
+
+def multiclass_probability_row(pairwise):
+    """
+    Same algorithm as multiclass_probability for a single row, on plain floats. For
+    the one-window-at-a-time realtime path this avoids NumPy's per-call overhead.
+    """
+    k = len(pairwise)
+    Q = [[0.0] * k for _ in range(k)]
+    for t in range(k):
+        for j in range(k):
+            if j != t:
+                Q[t][t] += pairwise[j][t] * pairwise[j][t]
+                Q[t][j] = -pairwise[j][t] * pairwise[t][j]
+    p = [1.0 / k] * k
+    eps = 0.005 / k
+    for _ in range(max(100, k)):
+        Qp = [sum(Q[t][j] * p[j] for j in range(k)) for t in range(k)]
+        pQp = sum(p[t] * Qp[t] for t in range(k))
+        if max(abs(Qp[t] - pQp) for t in range(k)) < eps:
+            break
+        for t in range(k):
+            diff = (pQp - Qp[t]) / Q[t][t]
+            p[t] += diff
+            pQp = (pQp + diff * (diff * Q[t][t] + 2 * Qp[t])) / (1 + diff) / (1 + diff)
+            for j in range(k):
+                Qp[j] = (Qp[j] + diff * Q[t][j]) / (1 + diff)
+                p[j] /= 1 + diff
+    return p
+
+
+def svc_arrays(svc):
+    if svc.kernel not in ("rbf", "linear"):
+        raise ValueError(f"Only RBF and linear SVC models can be bundled, got kernel={svc.kernel!r}.")
+    if not len(getattr(svc, "_probA", [])):
+        raise ValueError("The SVC must be trained with probability=True.")
+    arrays = {
+        "support_vectors": svc.support_vectors_,
+        "coefficients": pairwise_coefficients(svc),
+        "intercept": svc._intercept_,
+        "prob_a": svc._probA,
+        "prob_b": svc._probB,
+    }
+    return arrays, {"kernel": svc.kernel, "gamma": float(svc._gamma)}
+
+
+def logistic_arrays(model):
+    """
+    Multinomial logistic regression as softmax(X @ coef.T + intercept). The binary
+    model's sigmoid is the softmax of [0, z], so it is stored with a zero first row.
+    """
+    if len(model.classes_) > 2 and model.solver == "liblinear":
+        raise ValueError("One-vs-rest (liblinear) logistic regression cannot be bundled.")
+    coef, intercept = model.coef_, model.intercept_
+    if len(model.classes_) == 2:
+        coef = np.vstack([np.zeros_like(coef), coef])
+        intercept = np.concatenate([[0.0], intercept])
+    return {"coef": coef, "intercept": intercept}, {}
+
+
+def tree_arrays(model):
+    tree = model.tree_
+    value = tree.value[:, 0, :]
+    return {
+        "children_left": tree.children_left,
+        "children_right": tree.children_right,
+        "feature": tree.feature,
+        "threshold": tree.threshold,
+        "value": value / value.sum(axis=1, keepdims=True),
+    }, {"max_depth": int(tree.max_depth)}
+
+
+def classifier_arrays(classifier):
+    """
+    (estimator kind, arrays, extra meta) for a fitted classifier the bundle can evaluate.
+    """
+    name = type(classifier).__name__
+    if name == "SVC":
+        return ("svc", *svc_arrays(classifier))
+    if name == "LogisticRegression":
+        return ("logistic", *logistic_arrays(classifier))
+    if name == "DecisionTreeClassifier":
+        return ("tree", *tree_arrays(classifier))
+    raise ValueError(f"Cannot bundle a {name}; supported: SVC, LogisticRegression, DecisionTreeClassifier.")
+
+
+class ModelBundle:
+    """
+    Everything realtime inference needs from one training run, as plain arrays:
+    the fused scaler + PCA projection followed by one of
+    - "svc": an RBF or linear SVC's support vectors, pairwise coefficients,
+      intercepts and Platt parameters
+    - "logistic": a multinomial logistic regression's weights
+    - "tree": a decision tree's node arrays and per-leaf class probabilities
+    Evaluating it needs only NumPy. dtype=np.float32 runs the projection and
+    kernel in single precision; the Platt and coupling steps always use float64.
+    """
+
+    def __init__(self, meta, arrays, dtype=np.float64):
+        self.meta = meta
+        self.dtype = np.dtype(dtype)
+        self.estimator = meta.get("estimator", "svc")
+        self.arrays = {name: np.asarray(arrays[name], dtype=float) for name in array_names(self.estimator)}
+        for name, array in self.arrays.items():
+            setattr(self, name, array.astype(self.dtype))
+        self.classes_ = np.array(meta["classes"])
+        if self.estimator == "svc":
+            self.kernel = meta.get("kernel", "rbf")
+            self.gamma = float(meta["gamma"])
+            self.sv_sq_norms = (self.support_vectors ** 2).sum(axis=1)
+            # The linear kernel collapses to one weight vector per class pair.
+            self.pair_weights = self.coefficients @ self.support_vectors
+            n_classes = len(self.classes_)
+            self.pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+        elif self.estimator == "tree":
+            for name in ("children_left", "children_right", "feature"):
+                setattr(self, name, self.arrays[name].astype(np.intp))
+            self.value = self.arrays["value"]
+
+    @classmethod
+    def from_estimators(cls, scaler, pca, classifier, feature_spec=None):
+        return cls.from_projection(*fused_projection(scaler, pca), classifier, feature_spec)
+
+    @classmethod
+    def from_projection(cls, W, b, classifier, feature_spec=None):
+        """
+        Bundle for a classifier trained on features @ W + b, e.g. an existing
+        bundle's projection when only the classifier is refit.
+        """
+        estimator, classifier_data, classifier_meta = classifier_arrays(classifier)
+        arrays = {"W": W, "b": b, **classifier_data}
+        meta = {
+            "format": BUNDLE_FORMAT,
+            "version": BUNDLE_VERSION,
+            "created": datetime.now().isoformat(),
+            "estimator": estimator,
+            **classifier_meta,
+            "classes": [str(label) for label in classifier.classes_],
+            "classifier": type(classifier).__name__,
+            # Plain hyperparameters, enough to refit the same model incrementally.
+            "params": {
+                key: value for key, value in classifier.get_params().items()
+                if value is None or isinstance(value, (bool, int, float, str))
+            },
+            "feature_spec": feature_spec or default_feature_spec(),
+        }
+        meta["run_id"] = run_id(arrays, estimator)
+        return cls(meta, arrays)
+
+    def save(self, path=DEFAULT_BUNDLE):
+        """
+        Writes the bundle atomically, so a watching server never sees a half-written file.
+        """
+        temp_path = f"{path}.tmp.npz"
+        np.savez(temp_path, meta=np.array(json.dumps(self.meta)), **self.arrays)
+        os.replace(temp_path, path)
+
+    def astype(self, dtype):
+        return ModelBundle(self.meta, self.arrays, dtype)
+
+    @classmethod
+    def load(cls, path=DEFAULT_BUNDLE, dtype=np.float64):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("format") != BUNDLE_FORMAT or meta.get("version") != BUNDLE_VERSION:
+                raise ValueError(f"{path} is not a version {BUNDLE_VERSION} {BUNDLE_FORMAT} bundle.")
+            estimator = meta.get("estimator", "svc")
+            if estimator not in ESTIMATOR_ARRAYS:
+                raise ValueError(f"{path} holds an unknown estimator {estimator!r}.")
+            arrays = {name: data[name] for name in array_names(estimator)}
+        if run_id(arrays, estimator) != meta["run_id"]:
+            raise ValueError(f"{path} is corrupt: arrays do not match run_id {meta['run_id']}.")
+        return cls(meta, arrays, dtype)
+
+    def check_feature_spec(self, fs, nfft):
+        spec = self.meta["feature_spec"]
+        if (spec["fs"], spec["nfft"]) != (fs, nfft) or spec["feature_version"] != spectral_features.FEATURE_VERSION:
+            raise ValueError(f"Model was trained on features {spec}, server computes fs={fs}, nfft={nfft}.")
+
+    def project(self, features):
+        return np.atleast_2d(features).astype(self.dtype, copy=False) @ self.W + self.b
+
+    def decision_values(self, X):
+        """
+        libsvm decision values, (n, n_pairs). sklearn's binary decision_function is the negation.
+        """
+        X = np.atleast_2d(X).astype(self.dtype, copy=False)
+        if self.kernel == "linear":
+            return X @ self.pair_weights.T + self.intercept
+        sq_dist = (X ** 2).sum(axis=1)[:, None] + self.sv_sq_norms - 2.0 * X @ self.support_vectors.T
+        kernel = np.exp(-self.gamma * np.maximum(sq_dist, 0.0))
+        return kernel @ self.coefficients.T + self.intercept
+
+    def predict_proba(self, X):
+        if self.estimator == "logistic":
+            return self.logistic_proba(X)
+        if self.estimator == "tree":
+            return self.tree_proba(X)
+        decision = self.decision_values(X).astype(np.float64)
+        f = decision * self.arrays["prob_a"] + self.arrays["prob_b"]
+        # Numerically stable sigmoid, as in libsvm's sigmoid_predict.
+        exp_neg = np.exp(-np.abs(f))
+        pair_prob = np.where(f >= 0, exp_neg / (1.0 + exp_neg), 1.0 / (1.0 + exp_neg))
+        pair_prob = np.clip(pair_prob, MIN_PROB, 1 - MIN_PROB)
+        k = len(self.classes_)
+        if len(decision) == 1:
+            pairwise = [[0.0] * k for _ in range(k)]
+            for p, (i, j) in enumerate(self.pairs):
+                pairwise[i][j] = float(pair_prob[0, p])
+                pairwise[j][i] = 1 - pairwise[i][j]
+            return np.array([multiclass_probability_row(pairwise)])
+        pairwise = np.zeros((len(decision), k, k))
+        for p, (i, j) in enumerate(self.pairs):
+            pairwise[:, i, j] = pair_prob[:, p]
+            pairwise[:, j, i] = 1 - pair_prob[:, p]
+        return multiclass_probability(pairwise)
+
+    def logistic_proba(self, X):
+        logits = (np.atleast_2d(X).astype(self.dtype, copy=False) @ self.coef.T + self.intercept).astype(np.float64)
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def tree_proba(self, X):
+        # sklearn compares float32 inputs against float64 thresholds.
+        X = np.atleast_2d(X).astype(np.float32)
+        rows = np.arange(len(X))
+        node = np.zeros(len(X), dtype=np.intp)
+        for _ in range(self.meta["max_depth"]):
+            left = self.children_left[node]
+            go_left = X[rows, self.feature[node]] <= self.arrays["threshold"][node]
+            node = np.where(left < 0, node, np.where(go_left, left, self.children_right[node]))
+        return self.value[node]
+
+
+def array_names(estimator):
+    return ["W", "b", *ESTIMATOR_ARRAYS[estimator]]
+
+
+def default_feature_spec():
+    """
+    The parameters dataset_preprocessing featurized the training data with; it and
+    the server both take them from spectral_features.
+    """
+    return {
+        "fs": spectral_features.FS,
+        "nfft": spectral_features.NFFT,
+        "window": spectral_features.WINDOW,
+        "feature_version": spectral_features.FEATURE_VERSION,
+        "feature_columns": spectral_features.FEATURE_COLUMNS,
+    }
+
+
+def verify_against_sklearn(data_file="processed_training_data.csv", test_size=0.2, random_state=42):
+    """
+    Compares the NumPy evaluator with the joblib SVC on training.py's held-out split
+    (same test_size/random_state), in double and single precision.
+    """
+    import pandas as pd
+    from joblib import load
+    from sklearn.model_selection import train_test_split
+
+    scaler, pca, svc = load("scaler_spectral.joblib"), load("pca_spectral.joblib"), load("svm_model_pca_spectral.joblib")
+    data = pd.read_csv(data_file)
+    X = data[spectral_features.FEATURE_COLUMNS].values
+    # The split only depends on the row count and seed, so splitting indices picks the same rows.
+    _, test_rows = train_test_split(np.arange(len(X)), test_size=test_size, random_state=random_state)
+    X_test = X[test_rows]
+    expected = svc.predict_proba(pca.transform(scaler.transform(X_test)))
+    expected_labels = svc.classes_[expected.argmax(axis=1)]
+
+    bundle = ModelBundle.from_estimators(scaler, pca, svc)
+    results = {}
+    for dtype in (np.float64, np.float32):
+        model = bundle.astype(dtype)
+        batch = model.predict_proba(model.project(X_test))
+        single = np.vstack([model.predict_proba(model.project(row)) for row in X_test])
+        labels = model.classes_[batch.argmax(axis=1)]
+        result = {
+            "max_abs_diff_batch": float(np.abs(batch - expected).max()),
+            "max_abs_diff_single": float(np.abs(single - expected).max()),
+            "label_agreement": float((labels == expected_labels).mean()),
+        }
+        results[np.dtype(dtype).name] = result
+        print(
+            f"{np.dtype(dtype).name}: max |p - sklearn| batch={result['max_abs_diff_batch']:.2e} "
+            f"single={result['max_abs_diff_single']:.2e}, "
+            f"label agreement {result['label_agreement']:.1%} on {len(X_test)} held-out windows"
+        )
+    return results
+
+
+def run_id(arrays, estimator="svc"):
+    """
+    Content hash of the model arrays; identifies the training run a bundle came from.
+    """
+    digest = hashlib.sha256()
+    for name in array_names(estimator):
+        digest.update(np.ascontiguousarray(arrays[name], dtype=float).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def convert_joblib_models(
+    svc_path="svm_model_pca_spectral.joblib",
+    scaler_path="scaler_spectral.joblib",
+    pca_path="pca_spectral.joblib",
+    output_path=DEFAULT_BUNDLE,
+):
+    from joblib import load
+
+    bundle = ModelBundle.from_estimators(load(scaler_path), load(pca_path), load(svc_path))
+    bundle.save(output_path)
+    print(f"Wrote {output_path} (run {bundle.meta['run_id']}) from {svc_path}, {scaler_path}, {pca_path}.")
+    return bundle
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a model bundle from the separate joblib models.")
+    parser.add_argument("--output", default=DEFAULT_BUNDLE)
+    parser.add_argument("--verify", action="store_true", help="Check the NumPy evaluator against sklearn instead")
+    args = parser.parse_args()
+    if args.verify:
+        verify_against_sklearn()
+    else:
+        convert_joblib_models(output_path=args.output)
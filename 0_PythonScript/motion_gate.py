@@ -0,0 +1,122 @@
+import argparse
+import csv
+
+import numpy as np
+
+from spectral_features import AXES, FS, NFFT, WINDOW, get_window
+
+TRAINING_FILE = "processed_training_data.csv"
+IDLE_LABEL = "idle"
+GATE_MARGIN = 0.5  # Thresholds sit at this fraction of the quietest training shake on each axis
+GATE_MIN_COVERAGE = 0.9  # An axis joins the gate only if this fraction of idle movements fall under its threshold
+
+
+class MotionGate:
+    """
+    Cheap first stage of the classifier cascade. A window counts as obviously idle
+    when the Welch TotalPower of every gated axis is certainly below its threshold;
+    anything else goes on to the SVM.
+
+    With a single Welch segment (window length <= NFFT), Parseval gives
+    TotalPower = NFFT / (FS * sum(w**2)) * sum((w * (x - mean))**2), and since
+    w**2 <= 1 that is at most NFFT * L / (FS * sum(w**2)) * var(x). So comparing
+    the rolling variance against threshold * FS * sum(w**2) / (NFFT * L) is an O(1)
+    check that never lets a window above the threshold through.
+    """
+
+    def __init__(self, axes, thresholds, window_size, fs=FS, nfft=NFFT):
+        if window_size > nfft:
+            raise ValueError(f"The motion gate needs windows of at most NFFT={nfft} samples, not {window_size}.")
+        self.axes = [int(axis) for axis in axes]
+        self.thresholds = [float(threshold) for threshold in thresholds]
+        self.window_size = window_size
+        hann_power = np.sum(get_window(WINDOW, window_size) ** 2)
+        self.variance_limits = [threshold * fs * hann_power / (nfft * window_size) for threshold in self.thresholds]
+
+    @property
+    def stats_axes(self):
+        """
+        Series a RollingStats needs (the leading AXES up to the last gated one).
+        """
+        return max(self.axes) + 1 if self.axes else 0
+
+    def is_idle(self, stats):
+        """
+        stats is the session's RollingStats over the current window.
+        """
+        for axis, limit in zip(self.axes, self.variance_limits):
+            if stats.variance(axis) >= limit:
+                return False
+        return bool(self.axes)
+
+    def is_idle_window(self, window):
+        variances = np.asarray(window)[:, self.axes].var(axis=0)
+        return bool(self.axes) and bool(np.all(variances < self.variance_limits))
+
+    @classmethod
+    def learn(cls, features, labels, window_size, margin=GATE_MARGIN, min_coverage=GATE_MIN_COVERAGE):
+        """
+        features is (movements, len(AXES)) TotalPower per axis. Each axis's threshold
+        is margin times the lowest power any non-idle movement reached on it, so no
+        training movement of another class passes the gate. Axes where that would
+        leave fewer than min_coverage of idle movements under the threshold are left
+        out; they would only make the gate fire less often.
+        """
+        features = np.asarray(features, dtype=float)
+        labels = np.asarray(labels)
+        idle = labels == IDLE_LABEL
+        if not idle.any() or idle.all():
+            raise ValueError("Learning the motion gate needs both idle and non-idle movements.")
+        axes, thresholds = [], []
+        for axis in range(features.shape[1]):
+            threshold = margin * features[~idle, axis].min()
+            if np.mean(features[idle, axis] < threshold) >= min_coverage:
+                axes.append(axis)
+                thresholds.append(threshold)
+        return cls(axes, thresholds, window_size)
+
+    @classmethod
+    def from_csv(cls, path=TRAINING_FILE, window_size=20, **kwargs):
+        return cls.learn(*load_training_powers(path), window_size, **kwargs)
+
+    def coverage(self, features, labels):
+        """
+        Fraction of idle and of non-idle movements whose TotalPower clears every gated threshold.
+        """
+        features = np.asarray(features, dtype=float)
+        idle = np.asarray(labels) == IDLE_LABEL
+        passed = np.all(features[:, self.axes] < self.thresholds, axis=1) if self.axes else np.zeros(len(features), bool)
+        return passed[idle].mean(), passed[~idle].mean()
+
+    def __str__(self):
+        if not self.axes:
+            return "motion gate with no usable axes (every window goes to the SVM)"
+        limits = ", ".join(f"{AXES[axis]} < {threshold:.3g}" for axis, threshold in zip(self.axes, self.thresholds))
+        return f"motion gate: idle when TotalPower {limits}"
+
+
+def load_training_powers(path=TRAINING_FILE):
+    """
+    TotalPower per axis and MovementLabel of every movement in a featurized CSV.
+    Read with the csv module so the server does not need pandas at startup.
+    """
+    columns = [f"TotalPower_{axis}" for axis in AXES]
+    features, labels = [], []
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            features.append([float(row[column]) for column in columns])
+            labels.append(row["MovementLabel"])
+    return np.array(features), np.array(labels)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Learn the motion gate thresholds from featurized training data.")
+    parser.add_argument("--input", default=TRAINING_FILE)
+    parser.add_argument("--margin", type=float, default=GATE_MARGIN)
+    parser.add_argument("--min-coverage", type=float, default=GATE_MIN_COVERAGE)
+    args = parser.parse_args()
+    features, labels = load_training_powers(args.input)
+    gate = MotionGate.learn(features, labels, 20, args.margin, args.min_coverage)
+    idle_passed, other_passed = gate.coverage(features, labels)
+    print(gate)
+    print(f"Training movements passing the gate: {idle_passed:.1%} of idle, {other_passed:.1%} of the rest.")
@@ -0,0 +1,204 @@
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+
+from spectral_features import AXES
+
+CSV_FIELDS = ["Timestamp", *AXES, "MovementID", "MovementLabel", "InitialOrientation"]
+SAMPLES_FILE = "samples.f32"  # (rows, 6) float32, row-major, append-only
+TIMESTAMPS_FILE = "timestamps.f64"  # (rows,) float64 seconds since the epoch (naive local time, like the CSV)
+INDEX_FILE = "index.json"
+STORE_VERSION = 1
+
+
+class MovementStore:
+    """
+    Append-only binary alternative to movement_data.csv, kept in a directory:
+
+    - samples.f32 / timestamps.f64: raw sample columns, memory-mappable
+    - index.json: row count, last MovementID, label/orientation dictionaries and
+      one [movement_id, start_row, length, label, orientation] entry per movement
+
+    The index is rewritten atomically after the data files are flushed, so a crash
+    mid-append leaves at most some unreferenced trailing rows. Readers never look
+    past the rows in the index (an append may be in progress); the next append cuts
+    them off before writing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as file:
+                self.index = json.load(file)
+        else:
+            self.index = {
+                "version": STORE_VERSION,
+                "axes": AXES,
+                "rows": 0,
+                "last_movement_id": None,
+                "labels": [],
+                "orientations": [],
+                "movements": [],
+            }
+
+    @staticmethod
+    def is_store(path):
+        return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _truncate_to_index(self):
+        rows = self.index["rows"]
+        for name, row_bytes in [(SAMPLES_FILE, 4 * len(AXES)), (TIMESTAMPS_FILE, 8)]:
+            if os.path.exists(self._file(name)) and os.path.getsize(self._file(name)) > rows * row_bytes:
+                os.truncate(self._file(name), rows * row_bytes)
+
+    def _dictionary_index(self, key, value):
+        values = self.index[key]
+        if value not in values:
+            values.append(value)
+        return values.index(value)
+
+    def next_movement_id(self):
+        last = self.index["last_movement_id"]
+        return 0 if last is None else last + 1
+
+    def append_movements(self, movements):
+        """
+        movements: iterable of (movement_id, label, samples (n, 6), timestamps (n,), orientation).
+        Appends all of them with a single index rewrite.
+        """
+        movements = list(movements)
+        if not movements:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        # Rows a crashed append left behind, past the committed index.
+        self._truncate_to_index()
+        with open(self._file(SAMPLES_FILE), "ab") as samples_file, open(self._file(TIMESTAMPS_FILE), "ab") as times_file:
+            for movement_id, label, samples, timestamps, orientation in movements:
+                samples = np.ascontiguousarray(samples, dtype="<f4").reshape(-1, len(AXES))
+                timestamps = np.ascontiguousarray(timestamps, dtype="<f8")
+                samples_file.write(samples.tobytes())
+                times_file.write(timestamps.tobytes())
+                self.index["movements"].append([
+                    int(movement_id),
+                    self.index["rows"],
+                    len(samples),
+                    self._dictionary_index("labels", label),
+                    self._dictionary_index("orientations", orientation),
+                ])
+                self.index["rows"] += len(samples)
+                last = self.index["last_movement_id"]
+                self.index["last_movement_id"] = int(movement_id) if last is None else max(last, int(movement_id))
+            samples_file.flush()
+            times_file.flush()
+            os.fsync(samples_file.fileno())
+            os.fsync(times_file.fileno())
+        self._write_index()
+
+    def _write_index(self):
+        temp_path = self._file(INDEX_FILE + ".tmp")
+        with open(temp_path, "w") as file:
+            json.dump(self.index, file)
+        os.replace(temp_path, self._file(INDEX_FILE))
+
+    def samples(self):
+        """
+        Read-only memory map of all samples, shaped (rows, 6).
+        """
+        if not self.index["rows"]:
+            return np.empty((0, len(AXES)), dtype="<f4")
+        return np.memmap(self._file(SAMPLES_FILE), dtype="<f4", mode="r", shape=(self.index["rows"], len(AXES)))
+
+    def timestamps(self):
+        if not self.index["rows"]:
+            return np.empty(0, dtype="<f8")
+        return np.memmap(self._file(TIMESTAMPS_FILE), dtype="<f8", mode="r", shape=(self.index["rows"],))
+
+    def movement_table(self):
+        """
+        Per-movement arrays: (movement_ids, starts, lengths, labels, orientations).
+        """
+        table = np.array(self.index["movements"], dtype=np.int64).reshape(-1, 5)
+        labels = np.array(self.index["labels"], dtype=object)
+        orientations = np.array(self.index["orientations"], dtype=object)
+        return table[:, 0], table[:, 1], table[:, 2], labels[table[:, 3]], orientations[table[:, 4]]
+
+
+def iso_to_epoch(timestamps):
+    return np.array(timestamps, dtype="datetime64[us]").astype(np.int64) / 1e6
+
+
+def epoch_to_iso(seconds):
+    return np.datetime_as_string(np.round(np.asarray(seconds) * 1e6).astype(np.int64).astype("datetime64[us]"))
+
+
+def movements_from_rows(rows):
+    """
+    Groups CSV-schema row dicts into append_movements() tuples; consecutive rows
+    sharing a MovementID become one movement.
+    """
+    movements = []
+    start = 0
+    for end in range(1, len(rows) + 1):
+        if end == len(rows) or rows[end]["MovementID"] != rows[start]["MovementID"]:
+            run = rows[start:end]
+            movements.append((
+                int(run[0]["MovementID"]),
+                run[0]["MovementLabel"],
+                np.array([[float(row[axis]) for axis in AXES] for row in run]),
+                iso_to_epoch([row["Timestamp"] for row in run]),
+                run[0].get("InitialOrientation") or None,
+            ))
+            start = end
+    return movements
+
+
+def csv_to_store(csv_path, store_path):
+    with open(csv_path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    store = MovementStore(store_path)
+    movements = movements_from_rows(rows)
+    store.append_movements(movements)
+    print(f"Imported {len(rows)} rows ({len(movements)} movements) from {csv_path} into {store_path}.")
+    return store
+
+
+def store_to_csv(store_path, csv_path):
+    store = MovementStore(store_path)
+    samples = store.samples()
+    timestamps = epoch_to_iso(store.timestamps())
+    with open(csv_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_FIELDS)
+        for movement_id, start, length, label, orientation in zip(*store.movement_table()):
+            for row in range(start, start + length):
+                writer.writerow([
+                    timestamps[row],
+                    *(f"{value:.7g}" for value in samples[row]),
+                    movement_id,
+                    label,
+                    orientation if orientation is not None else "",
+                ])
+    print(f"Exported {store.index['rows']} rows from {store_path} to {csv_path}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert movement recordings between CSV and the binary store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    to_store = subparsers.add_parser("to-store", help="Import a CSV recording into a store directory")
+    to_store.add_argument("csv")
+    to_store.add_argument("store")
+    to_csv = subparsers.add_parser("to-csv", help="Export a store directory to the CSV schema")
+    to_csv.add_argument("store")
+    to_csv.add_argument("csv")
+    args = parser.parse_args()
+    if args.command == "to-store":
+        csv_to_store(args.csv, args.store)
+    else:
+        store_to_csv(args.store, args.csv)
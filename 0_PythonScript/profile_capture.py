@@ -0,0 +1,199 @@
+import cProfile
+import glob
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+CAPTURE_DIR = "captures"
+CAPTURE_SECONDS = 10.0  # Default capture length
+CAPTURE_MODES = ["cprofile", "sample"]
+SAMPLE_INTERVAL = 0.002  # Seconds between stack samples in "sample" mode
+TRACEMALLOC_FRAMES = 10  # Stack depth tracemalloc records per allocation
+TOP_ENTRIES = 30  # Rows in the text summaries
+
+
+class StackSampler(threading.Thread):
+    """
+    Low-overhead alternative to cProfile: every interval, records the current stack
+    of one thread. Counts are kept per collapsed stack ("outer;...;inner"), the
+    format flame graph tools read.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class ProfileCapture:
+    """
+    One on-demand capture at a time of the thread that calls start() (in the server,
+    the event loop thread that runs the notification handlers, classification and
+    broadcasts): cProfile or stack sampling, plus tracemalloc snapshots at the start
+    and the end. stop() ends it and returns the collected data; write() turns that
+    into files and can run on another thread so the loop is not held up.
+    """
+
+    def __init__(self):
+        self.mode = None
+        self.profiler = None
+        self.sampler = None
+        self.started = None
+        self.started_tracemalloc = False
+        self.start_snapshot = None
+
+    @property
+    def active(self):
+        return self.mode is not None
+
+    def start(self, mode="cprofile"):
+        if self.active:
+            raise RuntimeError(f"A {self.mode} capture is already running.")
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode {mode!r}; use one of {', '.join(CAPTURE_MODES)}.")
+        self.started_tracemalloc = not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.start_snapshot = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self.started = datetime.now()
+        self.mode = mode
+        if mode == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.sampler = StackSampler(threading.get_ident())
+            self.sampler.start()
+
+    def stop(self):
+        if self.mode == "cprofile":
+            self.profiler.disable()
+            result = self.profiler
+        else:
+            self.sampler.stop()
+            result = self.sampler.stacks
+        end_snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        capture = {
+            "mode": self.mode,
+            "started": self.started,
+            "seconds": (datetime.now() - self.started).total_seconds(),
+            "result": result,
+            "start_snapshot": self.start_snapshot,
+            "end_snapshot": end_snapshot,
+            "traced_memory": (current, peak),
+        }
+        self.mode = self.profiler = self.sampler = self.start_snapshot = None
+        return capture
+
+
+def write(capture, directory=CAPTURE_DIR):
+    """
+    Writes a stopped capture to directory and returns the file paths:
+    <stamp>_cprofile.prof (pstats/snakeviz) and .txt summary, or <stamp>_samples.folded
+    and .txt summary, plus <stamp>_tracemalloc.snap (tracemalloc.Snapshot.load) and
+    a .txt of the source lines that allocated most during the capture.
+    """
+    os.makedirs(directory, exist_ok=True)
+    prefix = capture_prefix(directory, capture["started"])
+    paths = []
+    if capture["mode"] == "cprofile":
+        paths.append(f"{prefix}_cprofile.prof")
+        capture["result"].dump_stats(paths[-1])
+        summary = io.StringIO()
+        stats = pstats.Stats(capture["result"], stream=summary)
+        stats.sort_stats("cumulative").print_stats(TOP_ENTRIES)
+        stats.sort_stats("tottime").print_stats(TOP_ENTRIES)
+        paths.append(f"{prefix}_cprofile.txt")
+        with open(paths[-1], "w") as file:
+            file.write(f"cProfile capture of {capture['seconds']:.1f}s\n{summary.getvalue()}")
+    else:
+        stacks = capture["result"]
+        paths.append(f"{prefix}_samples.folded")
+        with open(paths[-1], "w") as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        paths.append(f"{prefix}_samples.txt")
+        with open(paths[-1], "w") as file:
+            file.write(sampling_summary(stacks, capture["seconds"]))
+
+    capture["end_snapshot"].dump(f"{prefix}_tracemalloc.snap")
+    paths.append(f"{prefix}_tracemalloc.snap")
+    paths.append(f"{prefix}_tracemalloc.txt")
+    with open(paths[-1], "w") as file:
+        file.write(tracemalloc_summary(capture))
+    return paths
+
+
+def capture_prefix(directory, started):
+    """
+    <directory>/<start time to the microsecond>, with a counter appended should
+    files of another capture already use it.
+    """
+    stamp = os.path.join(directory, started.strftime("%Y%m%d-%H%M%S-%f"))
+    prefix, count = stamp, 1
+    while glob.glob(glob.escape(prefix) + "_*"):
+        count += 1
+        prefix = f"{stamp}-{count}"
+    return prefix
+
+
+def sampling_summary(stacks, seconds):
+    total = sum(stacks.values())
+    inclusive, leaf = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        leaf[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    lines = [f"{total} samples over {seconds:.1f}s\n", "\nInclusive (on the stack):"]
+    lines += [f"{count / total:7.1%}  {frame}" for frame, count in inclusive.most_common(TOP_ENTRIES)]
+    lines += ["", "Self (innermost frame):"]
+    lines += [f"{count / total:7.1%}  {frame}" for frame, count in leaf.most_common(TOP_ENTRIES)]
+    return "\n".join(lines) + "\n"
+
+
+def tracemalloc_summary(capture):
+    """
+    Net allocation change per source line between the start and end snapshots. Lines
+    whose count keeps growing point at objects made per window and kept alive;
+    short-lived churn is freed again and shows up in the peak instead.
+    """
+    current, peak = capture["traced_memory"]
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    differences = capture["end_snapshot"].filter_traces(ignore).compare_to(capture["start_snapshot"].filter_traces(ignore), "lineno")
+    lines = [
+        f"tracemalloc over {capture['seconds']:.1f}s: {current / 1024:.1f} KiB traced at the end, peak {peak / 1024:.1f} KiB during the capture",
+        "",
+        "Top source lines by size change (size change, count change, size, count):",
+    ]
+    for difference in differences[:TOP_ENTRIES]:
+        frame = difference.traceback[0]
+        lines.append(
+            f"{difference.size_diff / 1024:+9.1f} KiB {difference.count_diff:+7d}  "
+            f"{difference.size / 1024:9.1f} KiB {difference.count:7d}  {frame.filename}:{frame.lineno}"
+        )
+    return "\n".join(lines) + "\n"
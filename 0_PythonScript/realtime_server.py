@@ -1,188 +1,757 @@
+import argparse
 import asyncio
-from bleak import BleakClient, BleakScanner
-from sklearn.preprocessing import StandardScaler
-from joblib import load
-import pandas as pd
-from collections import deque
-from scipy.signal import welch, find_peaks
 import numpy as np
+import itertools
+import os
+import signal
 import socket
-import threading
+import time
+from calibration import CalibrationProfile, profile_path
+from data_sources import BleSource, add_source_arguments, sources_from_args
+from gesture_protocol import SUBSCRIBE, UNSUBSCRIBE, encode_event
+from imu_protocol import decode_notification, sequence_gap
+from latency_stats import LatencyStats, now
+from model_bundle import DEFAULT_BUNDLE, ModelBundle
+from motion_gate import TRAINING_FILE, MotionGate
+from profile_capture import CAPTURE_DIR, CAPTURE_MODES, CAPTURE_SECONDS, ProfileCapture
+from profile_capture import write as write_capture
+from rolling_stats import RollingStats
+from spectral_features import AXES, FS, NFFT, compute_features_batch, compute_window_features
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 WINDOW_SIZE = 20  
 OVERLAP_SIZE = 10  
-FS = 20  # Sampling frequency (Hz)
-NFFT = 64  # Length of FFT for spectral analysis
 THRESHOLD_X = 3  # Threshold for leaning left/right
 THRESHOLD_Y = 3  # Threshold for leaning forward/backward
 STABILITY_THRESHOLD = 3.0  # Threshold for stability in accelerometer data
+# The constants above are the uncalibrated default; calibration.py profiles replace them per player.
+STABILITY_AXES = 2  # std of the first N axes (AccelX, AccelY) decides whether the player is holding a lean
 TCP_HOST = "127.0.0.1"  
 TCP_PORT = 65432  
-UART_TX_CHARACTERISTIC_UUID = "6E400003-B5A3-F393-E0A9-E50E24DCCA9E" 
+TCP_QUEUE_SIZE = 32  # Pending messages kept per client before the oldest is dropped
+TCP_QUEUE_POLICY = "drop_oldest"  # "latest" keeps only the newest state message per player (button events are all kept)
+EVENT_FORMAT = "text"  # What TCP clients receive: "text" lines or "binary" gesture_protocol events
+UDP_EVENTS = False  # Also send binary events as datagrams to clients that SUBSCRIBE on UDP_PORT
+UDP_PORT = 65433
 CONFIDENCE_THRESHOLD = 0.7
+HOP_SAMPLES = WINDOW_SIZE - OVERLAP_SIZE  # Classify every N samples once the window is full
+HOP_MS = None  # If set, classify at most once every T ms instead of every HOP_SAMPLES
+INFERENCE_IN_WORKER = False  # Run classify_state on a worker thread instead of the BLE callback
+BATCH_INFERENCE = False  # Classify windows from all sessions together in micro-batches
+BATCH_MAX_SIZE = 64  # Windows per batch; a full batch runs immediately
+BATCH_DEADLINE_MS = 2.0  # Longest a ready window waits for others to join its batch
+MOTION_GATE = False  # Send windows the motion gate deems idle straight to lean detection, skipping the SVM
+GATE_TRAINING_FILE = TRAINING_FILE  # Featurized movements the gate thresholds are learned from at startup
+MODEL_BUNDLE = DEFAULT_BUNDLE  # Written by training.py; falls back to the joblib models if missing
+MODEL_DTYPE = np.float64  # np.float32 evaluates projection and RBF kernel in single precision
+MODEL_RELOAD_INTERVAL = 1.0  # Seconds between checks of MODEL_BUNDLE for a newer model
+STATS_INTERVAL = 10  # Seconds between classification counter log lines
+CONTROLLER_RETRIES = 3  # Reconnects of a failed BLE controller before its session is retired
+RECONNECT_DELAY = 2.0  # Seconds between those reconnects
+LATENCY_STATS_FILE = "latency_stats.json"  # Rewritten every STATS_INTERVAL; None disables the dump
+LATENCY_STAGES = [
+    "decode", "append", "batch_wait", "features", "projection", "svm", "update_state", "decision", "socket_send", "end_to_end",
+]
 
-rolling_buffer = deque(maxlen=WINDOW_SIZE) 
-current_state = "Neutral" 
-svc_model = None 
-scaler = None  
-pca = None  
+sessions = {}  # player_id -> PlayerSession; a single controller uses player_id None
+model = None  # ModelBundle; replaced as a whole on hot reload
+model_signature = None  # (mtime, size) of the bundle file the current model came from
 tcp_clients = []  
+tcp_loop = None
+udp_transport = None  # Datagram endpoint, set by start_udp_server()
+udp_subscribers = set()  # (host, port) of every subscribed UDP client
+event_seq = itertools.count()  # One sequence across all events, so every client can count its losses
+inference_executor = None
+batcher = None  # InferenceBatcher, created on first use when BATCH_INFERENCE is set
+motion_gate = None  # MotionGate, set by load_motion_gate() when MOTION_GATE is on
+latency = LatencyStats()
+capture = ProfileCapture()  # On-demand profiling of the event loop thread (CAPTURE command or SIGUSR1)
+capture_timer = None
 
-def start_tcp_server():
-    global tcp_clients
+class TcpClient:
+    """
+    One connected Unity client with its own bounded send queue, drained by a
+    dedicated writer task so a stalled client never delays the others.
+    """
 
-    def handle_client(client_socket):
-        while True:
-            try:
-                client_socket.recv(1024)
-            except:
-                tcp_clients.remove(client_socket)
-                client_socket.close()
-                break
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = deque(maxlen=TCP_QUEUE_SIZE)
+        self.ready = asyncio.Event()
+        self.dropped = 0
 
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((TCP_HOST, TCP_PORT))
-    server.listen(5)
-    print(f"TCP server started on {TCP_HOST}:{TCP_PORT}")
+    def enqueue(self, payload, origin=None, key=None):
+        """
+        key is the player of a state message; under the "latest" policy it replaces
+        that player's older queued state. Button events have no key and are never replaced.
+        """
+        if TCP_QUEUE_POLICY == "latest" and key is not None:
+            for i, (_, _, queued_key) in enumerate(self.queue):
+                if queued_key == key:
+                    del self.queue[i]
+                    self.dropped += 1
+                    break
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append((payload, origin, key))
+        self.ready.set()
 
-    while True:
-        client_socket, addr = server.accept()
-        print(f"TCP Client connected: {addr}")
-        tcp_clients.append(client_socket)
-        client_handler = threading.Thread(target=handle_client, args=(client_socket,))
-        client_handler.start()
+    async def drain_forever(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                start = now()
+                origins = []
+                while self.queue:
+                    payload, origin, _ = self.queue.popleft()
+                    self.writer.write(payload)
+                    if origin is not None:
+                        origins.append(origin)
+                await self.writer.drain()
+                sent = latency.record("socket_send", start)
+                for origin in origins:
+                    latency.record("end_to_end", origin, sent)
+        except (ConnectionError, OSError):
+            pass
+
+async def handle_tcp_client(reader, writer):
+    addr = writer.get_extra_info("peername")
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        # Gesture messages are tiny; never let Nagle hold one back waiting for an ACK.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    print(f"TCP Client connected: {addr}")
+    client = TcpClient(writer)
+    tcp_clients.append(client)
+    sender = asyncio.create_task(client.drain_forever())
+    try:
+        # Unity never sends anything meaningful; besides detecting disconnects, lines
+        # "PROFILE [player_id] <name>" load a calibration profile and "CAPTURE ..." profiles the server.
+        while line := await reader.readline():
+            handle_command(line.decode(errors="replace").strip())
+    except (ConnectionError, OSError, ValueError):
+        # ValueError: a line longer than the stream limit.
+        pass
+    finally:
+        sender.cancel()
+        tcp_clients.remove(client)
+        writer.close()
+        print(f"TCP Client disconnected: {addr}")
 
+def handle_command(command):
+    name, _, argument = command.partition(" ")
+    arguments = argument.split()
+    if name.upper() == "CAPTURE":
+        handle_capture_command(arguments)
+    elif name.upper() == "PROFILE" and 1 <= len(arguments) <= 2:
+        handle_profile_command(arguments)
 
-def notification_handler(sender, data):
-    global rolling_buffer
-    message = data.decode("utf-8").strip()
+def handle_profile_command(arguments):
+    if len(arguments) == 2:
+        player_id, profile_name = arguments
+    elif len(sessions) == 1:
+        player_id, profile_name = next(iter(sessions)), arguments[0]
+    else:
+        print("PROFILE needs a player ID when several controllers are connected.")
+        return
+    session = sessions.get(player_id)
+    if session is None:
+        print(f"PROFILE for unknown player {player_id!r}.")
+        return
     try:
-        parts = message.split(",")
-        current_data = {
-            "AccelX": float(parts[0]),
-            "AccelY": float(parts[1]),
-            "AccelZ": float(parts[2]),
-            "GyroX": float(parts[3]),
-            "GyroY": float(parts[4]),
-            "GyroZ": float(parts[5]),
-        }
+        session.load_profile(profile_name)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Keeping calibration profile {session.profile.player} for {session.name}; could not load {profile_name!r}: {e}")
 
-        rolling_buffer.append(current_data)
-        if len(rolling_buffer) == WINDOW_SIZE:
-            classify_state()
-
-    except (ValueError, IndexError):
-        if "Button Pressed" in message:
-            broadcast_tcp("Button Pressed")
-            print("Button Pressed")
-        elif "Button Released" in message:
-            broadcast_tcp("Button Released")
-            print("Button Released")
-
-def broadcast_tcp(message):
-    global tcp_clients
-    for client_socket in tcp_clients:
-        try:
-            client_socket.sendall((message + "\n").encode())
-        except:
-            tcp_clients.remove(client_socket)
-
-def update_state(new_state):
-    global current_state
-    if(current_state=="shake" and new_state=="shake"): 
-        print(f"Cannot Shake again until returning to Neutral.")
-    elif not(current_state=="Leaning Forward" and new_state=="Leaning Forward"):
-        current_state = new_state
-        broadcast_tcp(current_state)
-        print(f"Updated State: {current_state}")
-
-def compute_spectral_features(df):
-    spectral_features = {}
-    for axis in ["AccelX", "AccelY", "AccelZ", "GyroX", "GyroY", "GyroZ"]:
-        signal = df[axis].values
-        freq, psd = welch(signal, fs=FS, nfft=NFFT, nperseg=min(len(signal), NFFT))
-        spectral_features[f"TotalPower_{axis}"] = np.sum(psd)
-        spectral_features[f"DominantFreq_{axis}"] = freq[np.argmax(psd)]
-    return spectral_features
-
-def classify_state():
-    global rolling_buffer, svc_model, scaler, pca
-    df = pd.DataFrame(list(rolling_buffer))
-    spectral_features = compute_spectral_features(df)
-    feature_vector = np.array(list(spectral_features.values())).reshape(1, -1)
-    X_scaled = scaler.transform(feature_vector)
-    X_pca = pca.transform(X_scaled)
-
-    if hasattr(svc_model, "predict_proba"):
-        probabilities = svc_model.predict_proba(X_pca)[0]
-        max_confidence = max(probabilities)
-        prediction = svc_model.classes_[np.argmax(probabilities)]
+def handle_capture_command(arguments):
+    """
+    "CAPTURE [seconds] [cprofile|sample]" starts a capture, "CAPTURE STOP" ends one early.
+    """
+    if arguments and arguments[0].upper() == "STOP":
+        finish_capture()
+        return
+    seconds, mode = CAPTURE_SECONDS, "cprofile"
+    for argument in arguments:
+        if argument.lower() in CAPTURE_MODES:
+            mode = argument.lower()
+        else:
+            try:
+                seconds = float(argument)
+            except ValueError:
+                print(f"Ignoring CAPTURE argument {argument!r}.")
+    start_capture(seconds, mode)
+
+def start_capture(seconds=CAPTURE_SECONDS, mode="cprofile"):
+    """
+    Profiles the event loop thread (notification handlers, classification unless it
+    runs in the inference worker, broadcasts) for seconds, with tracemalloc, then
+    writes the results to CAPTURE_DIR. Must run on the event loop thread.
+    """
+    global capture_timer
+    if capture.active:
+        print(f"A {capture.mode} capture is already running.")
+        return
+    try:
+        capture.start(mode)
+    except ValueError as e:
+        print(e)
+        return
+    capture_timer = asyncio.get_running_loop().call_later(seconds, finish_capture)
+    print(f"Started a {seconds:g}s {mode} capture.")
+
+def finish_capture():
+    global capture_timer
+    if capture_timer is not None:
+        capture_timer.cancel()
+        capture_timer = None
+    if not capture.active:
+        return
+    result = capture.stop()
+    # Writing the stats and snapshot takes a while; keep it off the event loop.
+    future = asyncio.get_running_loop().run_in_executor(None, write_capture, result, CAPTURE_DIR)
+    future.add_done_callback(report_capture)
+
+def report_capture(future):
+    try:
+        print(f"Capture written to {', '.join(future.result())}.")
+    except Exception as e:
+        print(f"Could not write the capture: {e}")
+
+def toggle_capture():
+    # SIGUSR1: start a default capture, or end the running one early.
+    if capture.active:
+        finish_capture()
     else:
-        decision_scores = svc_model.decision_function(X_pca)[0]
-        max_confidence = abs(decision_scores) / max(abs(decision_scores)) 
-        prediction = svc_model.classes_[np.argmax(decision_scores)]
+        start_capture()
 
-    if max_confidence >= CONFIDENCE_THRESHOLD:
-        if prediction == "idle":
-            process_threshold_based_detection()
+async def start_tcp_server(host=TCP_HOST, port=TCP_PORT):
+    global tcp_loop
+    tcp_loop = asyncio.get_running_loop()
+    server = await asyncio.start_server(handle_tcp_client, host, port)
+    print(f"TCP server started on {host}:{port}")
+    return server
+
+class UdpEventProtocol(asyncio.DatagramProtocol):
+    """
+    UDP side of the server: a client sends SUBSCRIBE (again at any time, e.g. after
+    a restart) to receive binary events and UNSUBSCRIBE to stop. Any other datagram
+    is handled like a TCP command line.
+    """
+
+    def datagram_received(self, data, addr):
+        message = data.strip()
+        if message == SUBSCRIBE:
+            if addr not in udp_subscribers:
+                print(f"UDP client subscribed: {addr}")
+            udp_subscribers.add(addr)
+        elif message == UNSUBSCRIBE:
+            udp_subscribers.discard(addr)
+            print(f"UDP client unsubscribed: {addr}")
         else:
-            update_state("shake")
-
-def process_threshold_based_detection():
-    global rolling_buffer
-    most_recent = rolling_buffer[-1]
-    accel_x = most_recent["AccelX"]
-    accel_y = most_recent["AccelY"]
-    accel_stability = np.std([d["AccelX"] for d in rolling_buffer]) + \
-                      np.std([d["AccelY"] for d in rolling_buffer])
-    if accel_stability > STABILITY_THRESHOLD:
+            handle_command(message.decode(errors="replace"))
+
+    def error_received(self, exc):
+        # ICMP port unreachable from a client that went away; it can SUBSCRIBE again.
+        pass
+
+async def start_udp_server(host=TCP_HOST, port=UDP_PORT):
+    global udp_transport
+    udp_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(UdpEventProtocol, local_addr=(host, port))
+    print(f"UDP event server started on {host}:{udp_transport.get_extra_info('sockname')[1]}")
+    return udp_transport
+
+class PlayerSession:
+    """
+    Everything that belongs to one controller: its ring buffer and rolling
+    stability stats, hop and sequence bookkeeping, state machine and calibration
+    profile. The model, TCP clients, inference worker and latency stats are shared
+    by all sessions on the loop. Messages are tagged "<player_id>:<message>"; a
+    session without a player_id (single-controller mode) sends them untagged as before.
+    """
+
+    def __init__(self, player_id=None, profile=None):
+        self.player_id = player_id
+        self.slot = 0  # Player number in binary events; create_session numbers tagged players from 1
+        self.profile = profile or default_profile()
+        # Every sample is written twice (at i and i + WINDOW_SIZE) so the latest window
+        # is always the contiguous view ring_buffer[write_index:write_index + WINDOW_SIZE].
+        self.ring_buffer = np.zeros((2 * WINDOW_SIZE, len(AXES)))
+        self.write_index = 0
+        self.sample_count = 0
+        # Kept in step with the ring buffer; also covers the motion gate's axes when it is on.
+        stats_axes = max(STABILITY_AXES, motion_gate.stats_axes) if motion_gate is not None else STABILITY_AXES
+        self.window_stats = RollingStats(WINDOW_SIZE, stats_axes)
+        self.current_state = "Neutral"
+        self.last_seq = None
+        self.frames_lost = 0
+        self.frames_malformed = 0  # Truncated or corrupt notifications
+        self.windows_classified = 0
+        self.windows_skipped = 0
+        self.windows_gated = 0  # Classified by the motion gate without running the SVM
+        self.last_hop_time = 0.0
+        self.inference_pending = False
+        self.window_origin = 0.0  # Arrival time of the newest sample in the window being classified
+
+    @property
+    def name(self):
+        return self.player_id or "default"
+
+    def append_sample(self, values):
+        # Once the window is full, the slot being overwritten holds the sample leaving it.
+        self.window_stats.push(values, self.ring_buffer[self.write_index] if self.sample_count >= WINDOW_SIZE else None)
+        self.ring_buffer[self.write_index] = values
+        self.ring_buffer[self.write_index + WINDOW_SIZE] = values
+        self.write_index = (self.write_index + 1) % WINDOW_SIZE
+        self.sample_count += 1
+
+    def current_window(self):
+        return self.ring_buffer[self.write_index:self.write_index + WINDOW_SIZE]
+
+    def window_stability(self):
+        return sum(self.window_stats.std(axis) for axis in range(STABILITY_AXES))
+
+    def notification_handler(self, sender, data):
+        arrival = now()
+        frame = decode_notification(data)
+        start = latency.record("decode", arrival)
+        self.frames_lost += sequence_gap(self.last_seq, frame.seq)
+        if frame.seq is not None:
+            self.last_seq = frame.seq
+
+        for sample in frame.samples:
+            self.append_sample(sample)
+            start = latency.record("append", start)
+            if self.sample_count >= WINDOW_SIZE:
+                self.window_origin = arrival
+                self.schedule_classification()
+                start = now()
+
+        for event in frame.events:
+            if "Button Pressed" in event:
+                self.broadcast("Button Pressed", arrival)
+                print(self.tag("Button Pressed"))
+            elif "Button Released" in event:
+                self.broadcast("Button Released", arrival)
+                print(self.tag("Button Released"))
+            else:
+                self.frames_malformed += 1
+
+    def hop_due(self):
+        if HOP_MS is not None:
+            t = time.monotonic()
+            if (t - self.last_hop_time) * 1000 < HOP_MS:
+                return False
+            self.last_hop_time = t
+            return True
+        return (self.sample_count - WINDOW_SIZE) % HOP_SAMPLES == 0
+
+    def schedule_classification(self):
+        global inference_executor
+        if not self.hop_due():
+            self.windows_skipped += 1
+            return
+        if motion_gate is not None and motion_gate.is_idle(self.window_stats):
+            self.windows_classified += 1
+            self.windows_gated += 1
+            self.apply_gate()
+            return
+        if BATCH_INFERENCE:
+            self.windows_classified += 1
+            get_batcher().submit(self, self.current_window().copy(), self.window_origin, self.window_stability())
+            return
+        if not INFERENCE_IN_WORKER:
+            self.windows_classified += 1
+            self.classify_state()
+            return
+        if self.inference_pending:
+            # The worker is still busy with an older window; drop this one rather than queue up lag.
+            self.windows_skipped += 1
+            return
+        if inference_executor is None:
+            inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.inference_pending = True
+        self.windows_classified += 1
+        inference_executor.submit(self.run_inference, self.current_window().copy(), self.window_origin, self.window_stability())
+
+    def run_inference(self, window, origin, stability):
+        try:
+            self.classify_state(window, origin, stability)
+        except Exception as e:
+            print(f"Inference failed for {self.name}: {e}")
+        finally:
+            self.inference_pending = False
+
+    def classification_stats(self):
+        total = self.windows_classified + self.windows_skipped
+        return {
+            "classified": self.windows_classified,
+            "skipped": self.windows_skipped,
+            "gated": self.windows_gated,
+            "classified_ratio": self.windows_classified / total if total else 0.0,
+        }
+
+    def tag(self, message):
+        return f"{self.player_id}:{message}" if self.player_id else message
+
+    def broadcast(self, message, origin=None, confidence=1.0):
+        broadcast_tcp(message, origin, self, confidence)
+
+    def update_state(self, new_state, origin=None, confidence=1.0):
+        if(self.current_state=="shake" and new_state=="shake"): 
+            print(self.tag("Cannot Shake again until returning to Neutral."))
+        elif not(self.current_state=="Leaning Forward" and new_state=="Leaning Forward"):
+            self.current_state = new_state
+            self.broadcast(self.current_state, origin, confidence)
+            print(f"Updated State: {self.tag(self.current_state)}")
+
+    def classify_state(self, window=None, origin=None, stability=None):
+        # Take one reference so a hot swap mid-window cannot mix two models.
+        current_model = model
+        if window is None:
+            window = self.current_window()
+        if origin is None:
+            origin = self.window_origin
+        start = now()
+        # Same feature code as dataset_preprocessing, so training and serving cannot drift apart.
+        feature_vector = compute_window_features(window, fs=FS, nfft=NFFT)
+        start = latency.record("features", start)
+        X_pca = current_model.project(feature_vector)
+        start = latency.record("projection", start)
+
+        probabilities = current_model.predict_proba(X_pca)[0]
+        start = latency.record("svm", start)
+        self.apply_prediction(current_model.classes_, probabilities, window, origin, stability)
+
+    def apply_prediction(self, classes, probabilities, window, origin, stability=None):
+        start = now()
+        if probabilities.max() >= CONFIDENCE_THRESHOLD:
+            if classes[probabilities.argmax()] == "idle":
+                self.process_threshold_based_detection(window, origin, stability, probabilities.max())
+            else:
+                self.update_state("shake", origin, probabilities.max())
+            start = latency.record("update_state", start)
+        latency.record("decision", origin, start)
+
+    def apply_gate(self):
+        # An obviously idle window takes the same path as a confident "idle" prediction.
+        start = now()
+        self.process_threshold_based_detection(None, self.window_origin, self.window_stability())
+        start = latency.record("update_state", start)
+        latency.record("decision", self.window_origin, start)
+
+    def process_threshold_based_detection(self, window=None, origin=None, stability=None, confidence=1.0):
+        current_profile = self.profile
+        if stability is None:
+            if window is None:
+                stability = self.window_stability()
+            else:
+                # An explicit window without a matching stats snapshot (e.g. from a benchmark).
+                stability = sum(window[:, axis].std() for axis in range(STABILITY_AXES))
+        if window is None:
+            window = self.current_window()
+        if stability > current_profile.stability_threshold:
+            return
+        self.update_state(current_profile.lean_state(window[-1, 0], window[-1, 1]), origin, confidence)
+
+    def load_profile(self, name):
+        """
+        Swaps in a calibration profile (calibration.py record/fit) by player name or path.
+        """
+        path = name if name.endswith(".json") else profile_path(name)
+        self.profile = CalibrationProfile.load(path)
+        print(f"Loaded calibration profile {self.profile} for {self.name}")
+
+class InferenceBatcher:
+    """
+    Collects windows that became ready in any session and classifies them together:
+    one batched feature pass, one projection matrix multiply and one predict_proba
+    call per batch instead of per window. A batch runs when it reaches max_size or
+    when its oldest window has waited deadline_ms, whichever comes first. Runs on
+    the event loop thread, where notification handlers call submit().
+    """
+
+    def __init__(self, max_size=BATCH_MAX_SIZE, deadline_ms=BATCH_DEADLINE_MS):
+        self.max_size = max_size
+        self.deadline = deadline_ms / 1000
+        self.pending = []
+        self.timer = None
+        self.batches = 0
+        self.windows = 0
+
+    def submit(self, session, window, origin, stability):
+        self.pending.append((session, window, origin, stability, now()))
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif self.timer is None:
+            try:
+                self.timer = asyncio.get_running_loop().call_later(self.deadline, self.flush)
+            except RuntimeError:
+                # No event loop (e.g. a synchronous caller): nothing else can join the batch.
+                self.flush()
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        current_model = model
+        start = now()
+        for _, _, _, _, queued in batch:
+            latency.record("batch_wait", queued, start)
+        features = compute_features_batch(np.stack([window for _, window, _, _, _ in batch]), fs=FS, nfft=NFFT)
+        start = latency.record("features", start)
+        X_pca = current_model.project(features)
+        start = latency.record("projection", start)
+        probabilities = current_model.predict_proba(X_pca)
+        latency.record("svm", start)
+        self.batches += 1
+        self.windows += len(batch)
+        for (session, window, origin, stability, _), row in zip(batch, probabilities):
+            session.apply_prediction(current_model.classes_, row, window, origin, stability)
+
+def get_batcher():
+    global batcher
+    if batcher is None:
+        batcher = InferenceBatcher(BATCH_MAX_SIZE, BATCH_DEADLINE_MS)
+    return batcher
+
+def default_profile():
+    # The constant thresholds, used until a player's calibration profile is loaded.
+    return CalibrationProfile(
+        "default",
+        thresholds={"left": THRESHOLD_X, "right": THRESHOLD_X, "forward": THRESHOLD_Y, "backward": THRESHOLD_Y},
+        stability_threshold=STABILITY_THRESHOLD,
+    )
+
+def create_session(player_id=None, profile_name=None):
+    """
+    Registers a session for one controller. Named players pick up
+    profiles/<player_id>.json automatically when it exists.
+    """
+    session = PlayerSession(player_id)
+    if player_id:
+        session.slot = sum(1 for other in sessions if other) + 1
+    if profile_name is None and player_id and os.path.exists(profile_path(player_id)):
+        profile_name = player_id
+    if profile_name:
+        session.load_profile(profile_name)
+    sessions[player_id] = session
+    return session
+
+def load_motion_gate(path=None):
+    global motion_gate
+    path = path or GATE_TRAINING_FILE
+    motion_gate = MotionGate.from_csv(path, WINDOW_SIZE)
+    print(f"Learned {motion_gate} from {path}.")
+
+def broadcast_tcp(message, origin=None, session=None, confidence=1.0):
+    """
+    Sends one state or button message to every TCP client (as text or binary,
+    per EVENT_FORMAT) and UDP subscriber. session tags the message with its player.
+    """
+    if tcp_loop is None:
         return
-    if accel_x < -THRESHOLD_X:
-        update_state("Leaning Left")
-    elif accel_x > THRESHOLD_X:
-        update_state("Leaning Right")
-    elif accel_y > THRESHOLD_Y:
-        update_state("Leaning Forward")
-    elif accel_y < -THRESHOLD_Y:
-        update_state("Leaning Backward")
+    event = None
+    if EVENT_FORMAT == "binary" or udp_transport is not None:
+        event = encode_event(next(event_seq), message, session.slot if session else 0, float(confidence))
+    if EVENT_FORMAT == "binary":
+        payload = event
+    else:
+        player_id = session.player_id if session else None
+        payload = ((f"{player_id}:{message}" if player_id else message) + "\n").encode()
+    key = None if message.startswith("Button") else (session.slot if session else 0)
+    try:
+        on_loop = asyncio.get_running_loop() is tcp_loop
+    except RuntimeError:
+        on_loop = False
+    if on_loop:
+        enqueue_broadcast(payload, origin, event, key)
     else:
-        update_state("Neutral")
+        # Called from the inference worker; hand off to the event loop thread.
+        tcp_loop.call_soon_threadsafe(enqueue_broadcast, payload, origin, event, key)
 
-def load_models():
-    global svc_model, scaler, pca
-    svc_model = load("svm_model_pca_spectral.joblib")
-    scaler = load("scaler_spectral.joblib")
-    pca = load("pca_spectral.joblib")
-    print("Models loaded successfully.")
+def enqueue_broadcast(payload, origin=None, event=None, key=None):
+    for client in tcp_clients:
+        client.enqueue(payload, origin, key)
+    if event is not None and udp_transport is not None and udp_subscribers:
+        start = now()
+        for addr in udp_subscribers:
+            udp_transport.sendto(event, addr)
+        sent = latency.record("socket_send", start)
+        if origin is not None:
+            latency.record("end_to_end", origin, sent)
 
-async def setup_bluetooth():
-    print("Scanning for devices...")
-    devices = await BleakScanner.discover()
+def load_joblib_models():
+    from joblib import load
 
-    for i, device in enumerate(devices):
-        print(f"[{i}] {device.name} ({device.address})")
+    return ModelBundle.from_estimators(
+        load("scaler_spectral.joblib"), load("pca_spectral.joblib"), load("svm_model_pca_spectral.joblib")
+    )
 
-    device_index = int(input("Select the device index to connect: "))
-    selected_device = devices[device_index]
+def load_models(path=None):
+    global model, model_signature
+    path = path or MODEL_BUNDLE
+    start = time.perf_counter()
+    if os.path.exists(path):
+        new_model = ModelBundle.load(path, MODEL_DTYPE)
+        source = path
+    else:
+        new_model = load_joblib_models().astype(MODEL_DTYPE)
+        source = "joblib models"
+    new_model.check_feature_spec(FS, NFFT)
+    model = new_model
+    model_signature = file_signature(path)
+    print(f"Models loaded successfully from {source} (run {model.meta['run_id']}) in {(time.perf_counter() - start) * 1e3:.1f}ms.")
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
-    print(f"Connecting to {selected_device.name}...")
-    async with BleakClient(selected_device.address) as client:
-        print("Connected!")
+async def watch_model_bundle(path=None):
+    """
+    Hot-swaps the model when the bundle file changes. The new bundle is loaded and
+    validated off the event loop, then swapped in with a single assignment, so
+    TCP clients stay connected and in-flight windows finish on the old model.
+    """
+    global model, model_signature
+    path = path or MODEL_BUNDLE
+    while True:
+        await asyncio.sleep(MODEL_RELOAD_INTERVAL)
+        signature = file_signature(path)
+        if signature is None or signature == model_signature:
+            continue
+        model_signature = signature
+        try:
+            new_model = await asyncio.to_thread(ModelBundle.load, path, MODEL_DTYPE)
+            new_model.check_feature_spec(FS, NFFT)
+        except Exception as e:
+            print(f"Keeping current model; could not load {path}: {e}")
+            continue
+        model = new_model
+        print(f"Hot-swapped model to run {model.meta['run_id']} from {path}.")
 
-        await client.start_notify(UART_TX_CHARACTERISTIC_UUID, notification_handler)
+def log_stats():
+    if batcher is not None and batcher.batches:
+        print(f"Batched inference: {batcher.windows} windows in {batcher.batches} batches ({batcher.windows / batcher.batches:.1f} per batch)")
+    for session in sessions.values():
+        prefix = f"[{session.name}] " if len(sessions) > 1 else ""
+        print(
+            f"{prefix}Windows classified: {session.windows_classified} ({session.windows_gated} by the motion gate), "
+            f"skipped: {session.windows_skipped}, "
+            f"frames lost: {session.frames_lost}, malformed: {session.frames_malformed}"
+        )
+    print(latency.format_line(LATENCY_STAGES))
+    if LATENCY_STATS_FILE:
+        latency.dump(LATENCY_STATS_FILE)
 
-        print("Receiving data. Press Ctrl+C to stop.")
+async def log_stats_periodically():
+    while True:
+        await asyncio.sleep(STATS_INTERVAL)
+        log_stats()
+
+async def run_controller(source, session):
+    """
+    Runs one source into its session. A failure is logged and only affects this
+    controller: a BLE controller is reconnected up to CONTROLLER_RETRIES times in
+    a row (BleSource.run returning means the link dropped), anything else (or a
+    controller that keeps failing) is retired.
+    """
+    ble = isinstance(source, BleSource)
+    retries = CONTROLLER_RETRIES if ble else 0
+    while True:
+        samples_before = session.sample_count
         try:
-            while True:
-                await asyncio.sleep(1)
-        except KeyboardInterrupt:
-            print("Stopping notifications...")
-            await client.stop_notify(UART_TX_CHARACTERISTIC_UUID)
+            await source.run(session.notification_handler)
+            if not ble:
+                return
+            print(session.tag("Controller disconnected."))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(session.tag(f"Controller failed: {e!r}"))
+        if ble and session.sample_count > samples_before:
+            # The link worked for a while; a later drop gets the full number of retries again.
+            retries = CONTROLLER_RETRIES
+        if retries == 0:
+            print(session.tag("Controller retired; the other players keep running."))
+            return
+        retries -= 1
+        await asyncio.sleep(RECONNECT_DELAY)
+        print(session.tag(f"Reconnecting ({CONTROLLER_RETRIES - retries}/{CONTROLLER_RETRIES})..."))
+
+async def run_controllers(sources, player_ids=None, profile_name=None):
+    """
+    Streams each source (BLE controllers by default, or data_sources.ReplaySource)
+    into its own PlayerSession, all on this event loop, until every source ends.
+    With one source and no player_ids, the session is untagged as in the
+    single-controller server. Each source runs in its own task (see run_controller),
+    so one failing controller does not stop the others.
+    """
+    sources = sources or [BleSource()]
+    player_ids = player_ids or ([None] if len(sources) == 1 else [f"P{i + 1}" for i in range(len(sources))])
+    if len(player_ids) != len(sources):
+        raise ValueError(f"{len(player_ids)} player IDs for {len(sources)} controllers.")
+    # Interactive device selection has to happen one controller at a time.
+    for player_id, source in zip(player_ids, sources):
+        if isinstance(source, BleSource) and not source.address:
+            if player_id:
+                print(f"Select the controller for {player_id}.")
+            source.address = await source.select_address()
+    controller_sessions = [create_session(player_id, profile_name) for player_id in player_ids]
+    stats_task = asyncio.create_task(log_stats_periodically())
+    try:
+        tasks = [asyncio.create_task(run_controller(source, session)) for source, session in zip(sources, controller_sessions)]
+        await asyncio.gather(*tasks)
+    finally:
+        stats_task.cancel()
+        if batcher is not None:
+            batcher.flush()
+        log_stats()
+
+
+async def main(sources=None, player_ids=None, profile_name=None):
+    server = await start_tcp_server()
+    if UDP_EVENTS:
+        await start_udp_server()
+    watcher = asyncio.create_task(watch_model_bundle())
+    if hasattr(signal, "SIGUSR1"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, toggle_capture)
+    async with server:
+        try:
+            await run_controllers(sources, player_ids, profile_name)
+        finally:
+            watcher.cancel()
+            finish_capture()
+            if udp_transport is not None:
+                udp_transport.close()
 
 
 # Main function
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Realtime movement classifier and Unity TCP server.")
+    add_source_arguments(parser)
+    parser.add_argument("--profile", help="Calibration profile (player name or JSON path) to start with")
+    parser.add_argument("--controllers", type=int, default=1, help="Number of controllers (BLE devices or replays)")
+    parser.add_argument("--players", nargs="+", help="Player IDs tagging each controller's messages (default P1..PN)")
+    parser.add_argument("--batch", action="store_true", help="Micro-batch inference across controllers")
+    parser.add_argument("--batch-size", type=int, default=BATCH_MAX_SIZE)
+    parser.add_argument("--batch-deadline-ms", type=float, default=BATCH_DEADLINE_MS)
+    parser.add_argument("--motion-gate", action="store_true", help="Skip the SVM for windows a cheap energy gate deems idle")
+    parser.add_argument("--events", choices=["text", "binary"], default=EVENT_FORMAT, help="Message format for TCP clients")
+    parser.add_argument("--udp", action="store_true", help=f"Also send binary events to UDP clients that subscribe on port {UDP_PORT}")
+    args = parser.parse_args()
+    EVENT_FORMAT, UDP_EVENTS = args.events, UDP_EVENTS or args.udp
+    BATCH_INFERENCE, BATCH_MAX_SIZE, BATCH_DEADLINE_MS = args.batch, args.batch_size, args.batch_deadline_ms
+    MOTION_GATE = MOTION_GATE or args.motion_gate
+    count = len(args.players) if args.players else args.controllers
     load_models()
-    tcp_server_thread = threading.Thread(target=start_tcp_server, daemon=True)
-    tcp_server_thread.start()
-    asyncio.run(setup_bluetooth())
+    if MOTION_GATE:
+        load_motion_gate()
+    asyncio.run(main(sources_from_args(args, count), args.players, args.profile))
@@ -0,0 +1,48 @@
+import math
+
+
+class RollingStats:
+    """
+    Mean and population variance (np.std's ddof=0) of the last `window` values of
+    n series, updated in O(1) per sample: Welford's update while the window fills,
+    then a combined add/remove step that takes the value leaving the window from
+    the caller (e.g. the ring buffer slot about to be overwritten).
+    """
+
+    def __init__(self, window, n=1):
+        self.window = window
+        self.n = n
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = [0.0] * self.n
+        self.m2 = [0.0] * self.n
+
+    def push(self, values, leaving=None):
+        """
+        Adds values[:n], one value per series. Once the window is full, leaving[:n]
+        must hold the values that drop out of it. Passing whole sample rows (views)
+        rather than sliced copies keeps this around a microsecond.
+        """
+        if self.count < self.window:
+            self.count += 1
+            for i in range(self.n):
+                x = float(values[i])
+                delta = x - self.mean[i]
+                self.mean[i] += delta / self.count
+                self.m2[i] += delta * (x - self.mean[i])
+            return
+        for i in range(self.n):
+            x = float(values[i])
+            y = float(leaving[i])
+            old_mean = self.mean[i]
+            self.mean[i] += (x - y) / self.window
+            self.m2[i] += (x - y) * (x - self.mean[i] + y - old_mean)
+
+    def variance(self, i=0):
+        # Floating-point drift can leave m2 a hair below zero for constant input.
+        return max(self.m2[i], 0.0) / self.count if self.count else 0.0
+
+    def std(self, i=0):
+        return math.sqrt(self.variance(i))
@@ -0,0 +1,94 @@
+from functools import lru_cache
+
+import numpy as np
+
+FS = 20  # Sampling frequency (Hz)
+NFFT = 64  # Length of FFT for spectral analysis
+WINDOW = "hann"
+FEATURE_VERSION = 1  # Bump whenever the feature definition changes so cached features are rebuilt
+AXES = ["AccelX", "AccelY", "AccelZ", "GyroX", "GyroY", "GyroZ"]
+FEATURE_COLUMNS = [f"{name}_{axis}" for axis in AXES for name in ("TotalPower", "DominantFreq")]
+
+
+def get_window(name, length):
+    """
+    Periodic window as scipy.signal.get_window builds it for welch. Hann is computed
+    here so serving does not have to import SciPy.
+    """
+    if name == "hann":
+        if length == 1:
+            return np.ones(1)
+        return 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(length) / length)
+    from scipy.signal import get_window as scipy_get_window
+
+    return scipy_get_window(name, length)
+
+
+@lru_cache(maxsize=None)
+def welch_plan(length, fs=FS, nfft=NFFT):
+    """
+    Cached constants reproducing scipy.signal.welch(x, fs, nfft=nfft,
+    nperseg=min(length, nfft)) with its defaults (periodic Hann window, 50%
+    overlap, constant detrend, one-sided density scaling, mean averaging).
+    """
+    nperseg = min(length, nfft)
+    step = nperseg - nperseg // 2
+    starts = np.arange(0, length - nperseg + 1, step)
+    window = get_window(WINDOW, nperseg)
+    scale = np.full(nfft // 2 + 1, 2.0 / (fs * np.sum(window ** 2)))
+    scale[0] /= 2
+    if nfft % 2 == 0:
+        scale[-1] /= 2
+    freqs = np.fft.rfftfreq(nfft, d=1.0 / fs)
+    return nperseg, starts, window, scale, freqs
+
+
+def psd_batch(windows, fs=FS, nfft=NFFT):
+    """
+    Welch PSD of every axis of every window in one pass.
+    windows is (N, L, axes); returns (freqs, psd) with psd shaped (N, nfft // 2 + 1, axes).
+    """
+    windows = np.asarray(windows, dtype=float)
+    nperseg, starts, window, scale, freqs = welch_plan(windows.shape[1], fs, nfft)
+    if len(starts) == 1:
+        segments = windows[:, None, :nperseg]
+    else:
+        segments = windows[:, starts[:, None] + np.arange(nperseg)]
+    # segments: (N, segments, nperseg, axes)
+    segments = segments - segments.mean(axis=2, keepdims=True)
+    spectrum = np.fft.rfft(segments * window[:, None], n=nfft, axis=2)
+    psd = (spectrum.real ** 2 + spectrum.imag ** 2).mean(axis=1) * scale[:, None]
+    return freqs, psd
+
+
+def compute_features_batch(windows, fs=FS, nfft=NFFT):
+    """
+    (N, L, 6) windows -> (N, 12) features ordered like FEATURE_COLUMNS
+    (TotalPower and DominantFreq interleaved per axis).
+    """
+    freqs, psd = psd_batch(windows, fs, nfft)
+    features = np.empty((psd.shape[0], 2 * psd.shape[2]))
+    features[:, 0::2] = psd.sum(axis=1)
+    features[:, 1::2] = freqs[psd.argmax(axis=1)]
+    return features
+
+
+def compute_window_features(window, fs=FS, nfft=NFFT):
+    return compute_features_batch(window[None], fs, nfft)[0]
+
+
+def compute_grouped_features(values, group_starts, fs=FS, nfft=NFFT):
+    """
+    Features for consecutive variable-length groups of rows in values (rows, 6).
+    group_starts holds each group's first row index. Groups are bucketed by exact
+    length so each bucket is one (N, L, 6) batch; returns (groups, 12) in input order.
+    """
+    values = np.asarray(values, dtype=float)
+    group_starts = np.asarray(group_starts)
+    lengths = np.diff(np.append(group_starts, len(values)))
+    features = np.empty((len(group_starts), 2 * values.shape[1]))
+    for length in np.unique(lengths):
+        members = np.flatnonzero(lengths == length)
+        windows = values[group_starts[members, None] + np.arange(length)]
+        features[members] = compute_features_batch(windows, fs, nfft)
+    return features
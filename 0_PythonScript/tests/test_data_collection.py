@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_collection
+from data_collection import WINDOW_SIZE, OVERLAP_FRAMES, window_starts
+from imu_protocol import encode_binary
+from movement_store import MovementStore
+
+CAPTURED = 47  # Samples in the synthetic recording; the last ones do not fill a window
+
+
+def record(monkeypatch, tmp_path, store):
+    monkeypatch.setattr(data_collection, "OUTPUT_FILE", str(tmp_path / "movements.csv"))
+    monkeypatch.setattr(data_collection, "STORE_PATH", str(tmp_path / "store") if store else None)
+    monkeypatch.setattr(data_collection, "movement_id", 5)
+    monkeypatch.setattr(data_collection, "movement_label", "shake")
+    monkeypatch.setattr(data_collection, "initial_orientation", "upward")
+    # AccelX of sample i is i, so every window's rows tell where in the capture they came from.
+    samples = np.zeros((CAPTURED, 6))
+    samples[:, 0] = np.arange(CAPTURED)
+    samples[:, 2] = 9.81
+
+    data_collection.notification_handler(None, b"Button Pressed")
+    for seq, start in enumerate(range(0, CAPTURED, 4)):
+        data_collection.notification_handler(None, encode_binary(seq, samples[start:start + 4]))
+    data_collection.notification_handler(None, b"Button Pressed")
+    data_collection.write_queue.join()
+
+
+def expected_windows():
+    starts = window_starts(CAPTURED, WINDOW_SIZE, OVERLAP_FRAMES)
+    return {5 + i: np.arange(start, start + WINDOW_SIZE) for i, start in enumerate(starts)}
+
+
+def test_window_starts():
+    assert window_starts(47, 20, 10).tolist() == [0, 10, 20]
+    assert window_starts(19, 20, 10).tolist() == []
+    assert window_starts(20, 20, 0).tolist() == [0]
+
+
+@pytest.mark.parametrize("store", [False, True], ids=["csv", "store"])
+def test_recording_is_written_as_overlapping_windows(monkeypatch, tmp_path, store):
+    record(monkeypatch, tmp_path, store)
+    expected = expected_windows()
+
+    if store:
+        movements = MovementStore(str(tmp_path / "store"))
+        ids, starts, lengths, labels, orientations = movements.movement_table()
+        samples = np.asarray(movements.samples())
+        windows = {int(i): samples[start:start + length, 0] for i, start, length in zip(ids, starts, lengths)}
+        assert set(labels) == {"shake"} and set(orientations) == {"upward"}
+    else:
+        data = pd.read_csv(tmp_path / "movements.csv")
+        windows = {int(i): group["AccelX"].to_numpy() for i, group in data.groupby("MovementID")}
+        assert set(data["MovementLabel"]) == {"shake"} and set(data["InitialOrientation"]) == {"upward"}
+
+    assert list(windows) == list(expected)
+    for movement_id, rows in expected.items():
+        assert np.allclose(windows[movement_id], rows)
+    assert data_collection.movement_id == 5 + len(expected)
+    assert not data_collection.is_recording
@@ -0,0 +1,46 @@
+import numpy as np
+
+import data_collection
+from imu_protocol import FRAME_HEADER, FRAME_MAGIC, decode_notification, encode_binary
+from realtime_server import PlayerSession
+
+SAMPLES = np.array([[0.5, -1.25, 9.81, 10.0, -20.5, 3.0], [0.0, 0.1, 9.7, 0.0, 0.0, 0.0]])
+
+
+def test_binary_round_trip():
+    frame = decode_notification(encode_binary(7, SAMPLES, temp=25.5))
+    assert frame.seq == 7
+    assert np.allclose(frame.samples, SAMPLES)
+    assert frame.temp == 25.5
+    assert frame.events == []
+
+
+def test_truncated_and_corrupt_binary_frames_are_reported_not_raised():
+    frame = encode_binary(7, SAMPLES)
+    for data in (bytes([FRAME_MAGIC]), frame[:FRAME_HEADER.size - 1], frame[:-1], frame + b"\x00", bytearray(frame[:5])):
+        decoded = decode_notification(data)
+        assert decoded.seq is None
+        assert decoded.samples.shape == (0, 6)
+        assert len(decoded.events) == 1 and decoded.events[0].startswith("Malformed binary frame")
+
+
+def test_corrupt_text_ends_up_in_events():
+    decoded = decode_notification(b"1.0,2.0,x,4.0,5.0,6.0,25.0\n")
+    assert decoded.samples.shape == (0, 6)
+    assert decoded.events
+
+
+def test_session_counts_malformed_frames():
+    session = PlayerSession()
+    session.notification_handler(None, bytes([FRAME_MAGIC]))
+    session.notification_handler(None, encode_binary(1, SAMPLES)[:-3])
+    session.notification_handler(None, encode_binary(2, SAMPLES))
+    assert session.frames_malformed == 2
+    assert session.sample_count == len(SAMPLES)
+    assert session.frames_lost == 0
+
+
+def test_data_collection_handler_survives_truncated_frames(capsys):
+    data_collection.notification_handler(None, bytes([FRAME_MAGIC]))
+    data_collection.notification_handler(None, encode_binary(1, SAMPLES)[:-3])
+    assert capsys.readouterr().out.count("Invalid data received: Malformed binary frame") == 2
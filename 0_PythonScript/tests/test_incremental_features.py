@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from dataset_preprocessing import LEGACY_SESSION, calculate_spectral_features, update_features
+from spectral_features import AXES
+
+
+def write_recording(path, movements, samples=30, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    start = pd.Timestamp("2024-11-23T13:14:49")
+    for movement_id in range(movements):
+        label = "idle" if movement_id % 2 == 0 else "shake"
+        for i in range(samples):
+            timestamp = start + pd.Timedelta(seconds=(movement_id * samples + i) / 20)
+            rows.append([timestamp.strftime("%Y-%m-%dT%H:%M:%S.%f"), *rng.normal(size=len(AXES)), movement_id, label])
+    pd.DataFrame(rows, columns=["Timestamp", *AXES, "MovementID", "MovementLabel"]).to_csv(path, index=False)
+
+
+def test_second_recording_with_overlapping_ids_is_added(tmp_path):
+    first, second, output = tmp_path / "player_a.csv", tmp_path / "player_b.csv", tmp_path / "features.csv"
+    write_recording(first, 4, seed=1)
+    write_recording(second, 3, seed=2)
+    # A features file from before sessions were tracked: no Session column.
+    calculate_spectral_features(pd.read_csv(first)).to_csv(output, index=False)
+
+    merged, added = update_features([str(second)], str(output), workers=1)
+
+    assert added == 3
+    assert len(merged) == 7
+    assert len(pd.read_csv(output)) == 7
+    assert set(merged["Session"]) == {LEGACY_SESSION, "player_b"}
+
+
+def test_legacy_session_named_after_its_recording_is_not_refeaturized(tmp_path):
+    first, output = tmp_path / "player_a.csv", tmp_path / "features.csv"
+    write_recording(first, 4, seed=1)
+    calculate_spectral_features(pd.read_csv(first)).to_csv(output, index=False)
+
+    merged, added = update_features([str(first)], str(output), workers=1, legacy_session="player_a")
+
+    assert added == 0
+    assert len(merged) == 4
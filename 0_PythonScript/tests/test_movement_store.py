@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+
+from movement_store import SAMPLES_FILE, TIMESTAMPS_FILE, MovementStore
+
+
+def movement(movement_id, rows=20):
+    samples = np.full((rows, 6), movement_id, dtype=float)
+    return movement_id, "shake", samples, np.arange(rows, dtype=float), "upward"
+
+
+def test_opening_for_reads_creates_and_truncates_nothing(tmp_path):
+    path = str(tmp_path / "store")
+    store = MovementStore(path)
+    assert not os.path.exists(path)
+    assert len(store.samples()) == 0
+
+    store.append_movements([movement(0)])
+    # Bytes of an append in progress, not yet in the index.
+    with open(os.path.join(path, SAMPLES_FILE), "ab") as file:
+        file.write(b"\0" * 24 * 5)
+    size = os.path.getsize(os.path.join(path, SAMPLES_FILE))
+
+    reader = MovementStore(path)
+    assert os.path.getsize(os.path.join(path, SAMPLES_FILE)) == size
+    assert reader.samples().shape == (20, 6)
+
+
+def test_append_drops_rows_of_a_crashed_append(tmp_path):
+    path = str(tmp_path / "store")
+    MovementStore(path).append_movements([movement(0)])
+    with open(os.path.join(path, SAMPLES_FILE), "ab") as file:
+        file.write(b"\0" * 24 * 5)
+
+    MovementStore(path).append_movements([movement(1)])
+
+    store = MovementStore(path)
+    ids, starts, lengths, _, _ = store.movement_table()
+    assert ids.tolist() == [0, 1] and starts.tolist() == [0, 20]
+    assert os.path.getsize(os.path.join(path, SAMPLES_FILE)) == 40 * 24
+    assert os.path.getsize(os.path.join(path, TIMESTAMPS_FILE)) == 40 * 8
+    assert np.all(np.asarray(store.samples())[20:] == 1)
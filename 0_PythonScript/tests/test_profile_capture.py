@@ -0,0 +1,22 @@
+import os
+
+import profile_capture
+from profile_capture import ProfileCapture
+
+
+def capture_once(mode):
+    capture = ProfileCapture()
+    capture.start(mode)
+    sum(i * i for i in range(10000))
+    return capture.stop()
+
+
+def test_captures_started_in_the_same_instant_get_their_own_files(tmp_path):
+    first, second = capture_once("cprofile"), capture_once("cprofile")
+    second["started"] = first["started"]
+    first_paths = profile_capture.write(first, str(tmp_path))
+    second_paths = profile_capture.write(second, str(tmp_path))
+
+    assert not set(first_paths) & set(second_paths)
+    assert all(os.path.exists(path) for path in first_paths + second_paths)
+    assert len(os.listdir(tmp_path)) == len(first_paths) + len(second_paths)
@@ -0,0 +1,96 @@
+import asyncio
+
+import realtime_server
+from data_sources import BleSource
+
+
+class FailingSource:
+    async def run(self, handler):
+        await asyncio.sleep(0)
+        raise OSError("controller went away")
+
+
+class ButtonSource:
+    def __init__(self):
+        self.finished = False
+
+    async def run(self, handler):
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            handler(None, b"Button Pressed\n")
+        self.finished = True
+
+
+class FlakyBleSource(BleSource):
+    def __init__(self, failures):
+        super().__init__("00:00:00:00:00:00")
+        self.failures = failures
+        self.attempts = 0
+
+    async def run(self, handler):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise OSError("connection lost")
+
+
+def test_failing_controller_does_not_stop_the_others(monkeypatch, capsys):
+    monkeypatch.setattr(realtime_server, "LATENCY_STATS_FILE", None)
+    monkeypatch.setattr(realtime_server, "sessions", {})
+    working = ButtonSource()
+    asyncio.run(realtime_server.run_controllers([FailingSource(), working], ["P1", "P2"]))
+    assert working.finished
+    out = capsys.readouterr().out
+    assert "P1:Controller failed" in out and "P1:Controller retired" in out
+    assert "P2:Button Pressed" in out
+
+
+def test_ble_controller_is_reconnected_then_retired(monkeypatch):
+    monkeypatch.setattr(realtime_server, "RECONNECT_DELAY", 0)
+    session = realtime_server.PlayerSession("P1")
+
+    recovering = FlakyBleSource(failures=2)
+    asyncio.run(realtime_server.run_controller(recovering, session))
+    assert recovering.attempts == 3
+
+    broken = FlakyBleSource(failures=100)
+    asyncio.run(realtime_server.run_controller(broken, session))
+    assert broken.attempts == realtime_server.CONTROLLER_RETRIES + 1
+
+
+class DisconnectingBleSource(BleSource):
+    """
+    Like BleSource.run when client.is_connected goes False: streams a few samples, then returns.
+    """
+
+    def __init__(self, links, samples_per_link=0):
+        super().__init__("00:00:00:00:00:00")
+        self.links = links
+        self.samples_per_link = samples_per_link
+        self.attempts = 0
+
+    async def run(self, handler):
+        self.attempts += 1
+        for _ in range(self.samples_per_link):
+            handler(None, b"0.1,0.2,9.8,0.0,0.0,0.0,25.0\n")
+        if self.attempts > self.links:
+            raise OSError("device not found")
+
+
+def test_ble_disconnect_is_retried(monkeypatch, capsys):
+    monkeypatch.setattr(realtime_server, "RECONNECT_DELAY", 0)
+    session = realtime_server.PlayerSession("P1")
+    source = DisconnectingBleSource(links=100)
+    asyncio.run(realtime_server.run_controller(source, session))
+    assert source.attempts == realtime_server.CONTROLLER_RETRIES + 1
+    out = capsys.readouterr().out
+    assert out.count("P1:Controller disconnected.") == realtime_server.CONTROLLER_RETRIES + 1
+    assert "P1:Controller retired" in out
+
+
+def test_retries_reset_after_a_working_link(monkeypatch):
+    monkeypatch.setattr(realtime_server, "RECONNECT_DELAY", 0)
+    session = realtime_server.PlayerSession("P1")
+    # Every link delivers samples before dropping, so the retries never run out until connecting fails.
+    source = DisconnectingBleSource(links=2 * realtime_server.CONTROLLER_RETRIES, samples_per_link=3)
+    asyncio.run(realtime_server.run_controller(source, session))
+    assert source.attempts == 2 * realtime_server.CONTROLLER_RETRIES + 1 + realtime_server.CONTROLLER_RETRIES
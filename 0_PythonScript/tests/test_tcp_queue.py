@@ -0,0 +1,28 @@
+import realtime_server
+from realtime_server import TcpClient
+
+
+def test_latest_policy_keeps_newest_state_per_player_and_every_button_event(monkeypatch):
+    monkeypatch.setattr(realtime_server, "TCP_QUEUE_POLICY", "latest")
+    client = TcpClient(writer=None)
+    client.enqueue(b"P1:Leaning Left\n", key=1)
+    client.enqueue(b"P2:Neutral\n", key=2)
+    client.enqueue(b"P1:Button Pressed\n")
+    client.enqueue(b"P1:Leaning Right\n", key=1)
+    client.enqueue(b"P1:Button Released\n")
+
+    assert [payload for payload, _, _ in client.queue] == [
+        b"P2:Neutral\n", b"P1:Button Pressed\n", b"P1:Leaning Right\n", b"P1:Button Released\n",
+    ]
+    assert client.dropped == 1
+
+
+def test_drop_oldest_policy_keeps_every_message_until_full(monkeypatch):
+    monkeypatch.setattr(realtime_server, "TCP_QUEUE_POLICY", "drop_oldest")
+    client = TcpClient(writer=None)
+    for i in range(realtime_server.TCP_QUEUE_SIZE + 3):
+        client.enqueue(f"{i}\n".encode(), key=1)
+
+    assert len(client.queue) == realtime_server.TCP_QUEUE_SIZE
+    assert client.queue[0][0] == b"3\n"
+    assert client.dropped == 3
@@ -1,18 +1,44 @@
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 from sklearn.svm import SVC
-from sklearn.metrics import classification_report, confusion_matrix
-from sklearn.model_selection import train_test_split
-import seaborn as sns
-import matplotlib.pyplot as plt
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, f1_score
+from sklearn.model_selection import GridSearchCV, ParameterGrid, StratifiedKFold, train_test_split
+from sklearn.base import clone
 from joblib import dump
+import argparse
+import json
+import time
+import numpy as np
 import pandas as pd
+from dataset_preprocessing import LEGACY_SESSION
+from model_bundle import DEFAULT_BUNDLE, ModelBundle
 
 # Input and output files
 input_file = "processed_training_data.csv"
+search_results_file = "search_results.json"
+
+# Hyperparameter search
+CV_FOLDS = 5
+PCA_COMPONENTS = [4, 6, 8, 12]
+# Candidates are ranked by CV metric - LATENCY_WEIGHT * per-window latency (ms), so
+# 0.1 trades 0.01 of macro F1 for 100us; 0 ranks on the metric alone.
+OBJECTIVE_METRIC = "f1"  # "f1" (macro) or "accuracy"
+LATENCY_WEIGHT = 0.1
+MAX_LATENCY_US = None  # Optional hard per-window budget
+LATENCY_CALLS = 200  # Single-window predictions timed per candidate
+MAX_ACCURACY_DROP = 0.02  # An incremental refit doing this much worse on held-out movements is not saved
 
 # Plot confusion matrix
-def plot_confusion_matrix(y_true, y_pred, model_name, labels):
+def plot_confusion_matrix(y_true, y_pred, model_name, labels, output_file=None):
+    import matplotlib
+    if output_file:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     cm = confusion_matrix(y_true, y_pred, labels=labels)
     cm_df = pd.DataFrame(cm, index=labels, columns=labels)
 
@@ -21,15 +47,46 @@ def plot_confusion_matrix(y_true, y_pred, model_name, labels):
     plt.title(f"{model_name} Confusion Matrix")
     plt.xlabel("Predicted Label")
     plt.ylabel("True Label")
-    plt.show()
+    if output_file:
+        plt.savefig(output_file, bbox_inches="tight")
+        plt.close()
+        print(f"Confusion matrix saved to {output_file}.")
+    else:
+        plt.show()
 
-def train_model():
+def load_training_data():
     data = pd.read_csv(input_file)
 
     feature_columns = [col for col in data.columns if col.startswith("TotalPower") or col.startswith("DominantFreq")]
     X = data[feature_columns].values
     y = data["MovementLabel"].values
+    return X, y, feature_columns, movement_keys(data)
+
+def movement_keys(data):
+    """
+    "session/MovementID" per feature row; identifies which movements a model has seen.
+    """
+    sessions = data["Session"].astype(str) if "Session" in data else pd.Series("", index=data.index)
+    return (sessions + "/" + data["MovementID"].astype(str)).tolist()
+
+def save_bundle(bundle, movements, output_file=DEFAULT_BUNDLE):
+    bundle.meta["movements"] = movements
+    bundle.save(output_file)
 
+def dump_estimators(scaler, pca, classifier):
+    """
+    The joblib files realtime_server falls back to without a bundle and the
+    visualization projects with; kept in step with every exported model.
+    """
+    dump(scaler, "scaler_spectral.joblib")
+    dump(pca, "pca_spectral.joblib")
+    dump(classifier, "svm_model_pca_spectral.joblib")
+
+def fit_models(X, y, feature_columns):
+    """
+    The scaler -> PCA -> SVC fit of train_model, without saving or plotting.
+    Returns the fitted models and the held-out split.
+    """
     print("Scaling features...")
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
@@ -43,16 +100,257 @@ def train_model():
     print("Training SVM model...")
     svc = SVC(probability=True, random_state=42)
     svc.fit(X_train, y_train)
+    return scaler, pca, svc, X_test, y_test
+
+def train_model(headless=False):
+    X, y, feature_columns, movements = load_training_data()
+    scaler, pca, svc, X_test, y_test = fit_models(X, y, feature_columns)
     svc_predictions = svc.predict(X_test)
 
     # Save models
-    dump(scaler, "scaler_spectral.joblib")
-    dump(pca, "pca_spectral.joblib")
-    dump(svc, "svm_model_pca_spectral.joblib")
-    print("Models saved successfully.")
+    dump_estimators(scaler, pca, svc)
+    # Single versioned bundle that realtime_server loads (and hot-swaps) with NumPy only.
+    bundle = ModelBundle.from_estimators(scaler, pca, svc)
+    save_bundle(bundle, movements)
+    print(f"Models saved successfully (bundle run {bundle.meta['run_id']}).")
     print(classification_report(y_test, svc_predictions))
-    plot_confusion_matrix(y_test, svc_predictions, "SVC", labels=list(set(y)))
+    plot_confusion_matrix(
+        y_test, svc_predictions, "SVC", labels=list(set(y)), output_file="confusion_matrix_svc.png" if headless else None
+    )
+
+def search_space(n_features):
+    """
+    GridSearchCV parameter grids: one per model family, each sharing the PCA sweep.
+    SVCs are searched without probability=True (libsvm's internal Platt CV would
+    multiply the cost); candidates are refit with it afterwards.
+    """
+    components = [n for n in PCA_COMPONENTS if n <= n_features] or [n_features]
+    return [
+        {
+            "pca__n_components": components,
+            "clf": [SVC(kernel="rbf", random_state=42)],
+            "clf__C": [0.1, 1, 10, 100],
+            "clf__gamma": ["scale", 0.01, 0.1, 1],
+        },
+        {
+            "pca__n_components": components,
+            "clf": [SVC(kernel="linear", random_state=42)],
+            "clf__C": [0.01, 0.1, 1, 10],
+        },
+        {
+            "pca__n_components": components,
+            "clf": [LogisticRegression(max_iter=2000)],
+            "clf__C": [0.01, 0.1, 1, 10],
+        },
+        {
+            "pca__n_components": components,
+            "clf": [DecisionTreeClassifier(random_state=42)],
+            "clf__max_depth": [3, 5, 8],
+            "clf__min_samples_leaf": [1, 5],
+        },
+    ]
+
+def describe_candidate(params):
+    clf = params["clf"]
+    settings = {key[len("clf__"):]: value for key, value in params.items() if key.startswith("clf__")}
+    if isinstance(clf, SVC):
+        settings = {"kernel": clf.kernel, **settings}
+    text = ", ".join(f"{key}={value}" for key, value in settings.items())
+    return f"{type(clf).__name__}({text}) pca={params['pca__n_components']}"
+
+def candidate_pipeline(params):
+    pipeline = Pipeline([("scaler", StandardScaler()), ("pca", PCA()), ("clf", clone(params["clf"]))])
+    pipeline.set_params(**{key: value for key, value in params.items() if key != "clf"})
+    if isinstance(pipeline.named_steps["clf"], SVC):
+        pipeline.set_params(clf__probability=True)
+    return pipeline
+
+def bundle_latency_us(bundle, X):
+    """
+    Median per-window latency of the serving path (projection + predict_proba on one row).
+    """
+    timings = []
+    for i in range(LATENCY_CALLS):
+        row = X[i % len(X)]
+        start = time.perf_counter()
+        bundle.predict_proba(bundle.project(row))
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+def objective(result, metric=OBJECTIVE_METRIC, latency_weight=LATENCY_WEIGHT):
+    return result[f"cv_{metric}"] - latency_weight * result["latency_us"] / 1e3
+
+def search_models(n_jobs=-1, metric=OBJECTIVE_METRIC, latency_weight=LATENCY_WEIGHT, max_latency_us=MAX_LATENCY_US, output_file=DEFAULT_BUNDLE):
+    """
+    Headless model selection: parallel cross-validated grid search on the training
+    split, then every candidate is refit as the server would run it (a NumPy bundle)
+    to measure per-window latency and held-out accuracy/F1. The candidate with the
+    best objective is exported as the model bundle; the full table goes to
+    search_results.json.
+    """
+    X, y, feature_columns, movements = load_training_data()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    grids = search_space(len(feature_columns))
+    search = GridSearchCV(
+        Pipeline([("scaler", StandardScaler()), ("pca", PCA()), ("clf", SVC())]),
+        grids,
+        scoring={"accuracy": "accuracy", "f1": "f1_macro"},
+        refit=False,
+        cv=StratifiedKFold(n_splits=CV_FOLDS, shuffle=True, random_state=42),
+        n_jobs=n_jobs,
+    )
+    print(f"Cross-validating {len(ParameterGrid(grids))} candidates with n_jobs={n_jobs}...")
+    start = time.perf_counter()
+    search.fit(X_train, y_train)
+    print(f"Cross-validation took {time.perf_counter() - start:.1f}s.")
+
+    results = []
+    for index, params in enumerate(search.cv_results_["params"]):
+        pipeline = candidate_pipeline(params).fit(X_train, y_train)
+        bundle = ModelBundle.from_estimators(*(step for _, step in pipeline.steps))
+        predictions = bundle.classes_[bundle.predict_proba(bundle.project(X_test)).argmax(axis=1)]
+        results.append({
+            "candidate": describe_candidate(params),
+            "cv_accuracy": float(search.cv_results_["mean_test_accuracy"][index]),
+            "cv_f1": float(search.cv_results_["mean_test_f1"][index]),
+            "test_accuracy": float(accuracy_score(y_test, predictions)),
+            "test_f1": float(f1_score(y_test, predictions, average="macro")),
+            "latency_us": bundle_latency_us(bundle, X_test),
+            "pipeline": pipeline,
+            "bundle": bundle,
+        })
+
+    for result in results:
+        result["objective"] = objective(result, metric, latency_weight)
+        result["eligible"] = max_latency_us is None or result["latency_us"] <= max_latency_us
+    if not any(r["eligible"] for r in results):
+        raise ValueError(f"No candidate meets the {max_latency_us}us latency budget.")
+    results.sort(key=lambda r: (-r["objective"], r["latency_us"]))
+    best = next(r for r in results if r["eligible"])
+
+    print(f"{'candidate':<60} {'cv_acc':>6} {'cv_f1':>6} {'test_acc':>8} {'test_f1':>7} {'lat_us':>7} {'score':>7}")
+    for r in results:
+        marker = "*" if r is best else " "
+        print(
+            f"{marker}{r['candidate']:<59} {r['cv_accuracy']:6.3f} {r['cv_f1']:6.3f} {r['test_accuracy']:8.3f} "
+            f"{r['test_f1']:7.3f} {r['latency_us']:7.1f} {r['objective']:7.3f}"
+        )
+
+    pipeline, bundle = best["pipeline"], best["bundle"]
+    # The exported bundle must reproduce the sklearn pipeline it came from.
+    max_diff = np.abs(bundle.predict_proba(bundle.project(X_test)) - pipeline.predict_proba(X_test)).max()
+    bundle.meta["search"] = {
+        "candidate": best["candidate"],
+        "objective": {"metric": metric, "latency_weight": latency_weight, "max_latency_us": max_latency_us},
+        **{key: best[key] for key in ("cv_accuracy", "cv_f1", "test_accuracy", "test_f1", "latency_us")},
+    }
+    save_bundle(bundle, movements, output_file)
+    dump_estimators(*(step for _, step in pipeline.steps))
+    print(f"Exported {best['candidate']} to {output_file} (run {bundle.meta['run_id']}, max |p - sklearn| {max_diff:.1e}).")
+
+    with open(search_results_file, "w") as file:
+        json.dump({
+            "objective": bundle.meta["search"]["objective"],
+            "best": best["candidate"],
+            "candidates": [{key: value for key, value in r.items() if key not in ("pipeline", "bundle")} for r in results],
+        }, file, indent=2)
+    print(f"Search results saved to {search_results_file}.")
+    predictions = bundle.classes_[bundle.predict_proba(bundle.project(X_test)).argmax(axis=1)]
+    print(classification_report(y_test, predictions))
+    plot_confusion_matrix(y_test, predictions, best["candidate"], labels=sorted(set(y)), output_file="confusion_matrix_best.png")
+    return best
+
+def train_incremental(bundle_file=DEFAULT_BUNDLE, output_file=None, legacy_session=LEGACY_SESSION, force=False):
+    """
+    Updates the current model bundle with movements added to the feature file since
+    it was trained (see dataset_preprocessing.py --incremental). The bundle's scaler
+    + PCA projection is kept, so the cached features only need one matrix multiply,
+    and only the classifier is refit with the same hyperparameters. Logistic
+    regression warm-starts from the current weights; SVC and trees refit on the
+    projected matrix, which takes milliseconds at this data size.
+
+    As in train_model, 20% of the movements are held out. The refit is only saved
+    (and so hot-swapped by a running server) if its held-out accuracy is within
+    MAX_ACCURACY_DROP of the current model's, unless force is set.
+    """
+    start = time.perf_counter()
+    data = pd.read_csv(input_file)
+    bundle = ModelBundle.load(bundle_file)
+    movements = movement_keys(data)
+    known = set(bundle.meta.get("movements", []))
+    if known and "Session" in data and all(key.startswith("/") for key in known):
+        # Trained before sessions were tracked; update_features tags those rows legacy_session.
+        known = {f"{legacy_session}{key}" for key in known}
+    new_rows = np.array([key not in known for key in movements])
+    if known and not new_rows.any():
+        print(f"{bundle_file} is up to date ({len(known)} movements).")
+        return bundle
+
+    X = bundle.project(data[bundle.meta["feature_spec"]["feature_columns"]].values)
+    y = data["MovementLabel"].values.astype(str)
+    if known:
+        before = bundle.classes_[bundle.predict_proba(X[new_rows]).argmax(axis=1)]
+        print(f"Current model on the {new_rows.sum()} new movements: accuracy {accuracy_score(y[new_rows], before):.3f}")
+
+    rows = np.arange(len(y))
+    train_rows, test_rows = train_test_split(rows, test_size=0.2, random_state=42, stratify=y)
+    classifier = incremental_classifier(bundle, np.unique(y))
+    classifier.fit(X[train_rows], y[train_rows])
+    new_bundle = ModelBundle.from_projection(bundle.arrays["W"], bundle.arrays["b"], classifier, bundle.meta["feature_spec"])
+    if "search" in bundle.meta:
+        new_bundle.meta["search"] = bundle.meta["search"]
+
+    def held_out_accuracy(model):
+        return accuracy_score(y[test_rows], model.classes_[model.predict_proba(X[test_rows]).argmax(axis=1)])
+
+    current_accuracy, new_accuracy = held_out_accuracy(bundle), held_out_accuracy(new_bundle)
+    print(
+        f"Refit {new_bundle.meta['classifier']} on {len(train_rows)} of {len(y)} movements ({new_rows.sum()} new) "
+        f"in {time.perf_counter() - start:.2f}s; held-out accuracy {current_accuracy:.3f} -> {new_accuracy:.3f} "
+        f"on {len(test_rows)} movements."
+    )
+    if new_accuracy < current_accuracy - MAX_ACCURACY_DROP and not force:
+        print(f"Not saving: the refit lost more than {MAX_ACCURACY_DROP:.0%} held-out accuracy (use --force to save anyway).")
+        return bundle
+    save_bundle(new_bundle, movements, output_file or bundle_file)
+    print(f"Saved run {new_bundle.meta['run_id']} to {output_file or bundle_file}.")
+    return new_bundle
+
+def incremental_classifier(bundle, classes):
+    """
+    An unfitted classifier with the bundle's hyperparameters. Bundles from before
+    hyperparameters were recorded hold train_model's default SVC.
+    """
+    estimators = {"SVC": SVC, "LogisticRegression": LogisticRegression, "DecisionTreeClassifier": DecisionTreeClassifier}
+    if "classifier" not in bundle.meta:
+        return SVC(probability=True, random_state=42)
+    classifier = estimators[bundle.meta["classifier"]](**bundle.meta["params"])
+    if isinstance(classifier, LogisticRegression) and list(bundle.classes_) == list(classes):
+        # Binary bundles store the sigmoid as softmax over [0, z]; sklearn keeps only z.
+        rows = slice(1, None) if len(classes) == 2 else slice(None)
+        classifier.set_params(warm_start=True)
+        classifier.coef_ = bundle.arrays["coef"][rows].copy()
+        classifier.intercept_ = bundle.arrays["intercept"][rows].copy()
+    return classifier
 
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the movement classifier.")
+    parser.add_argument("--headless", action="store_true", help="Save the confusion matrix as a PNG instead of showing it")
+    parser.add_argument("--search", action="store_true", help="Run the headless hyperparameter search and export the best model")
+    parser.add_argument("--incremental", action="store_true", help="Refit the current bundle's classifier with newly featurized movements")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel cross-validation workers (-1 = all cores)")
+    parser.add_argument("--metric", choices=["f1", "accuracy"], default=OBJECTIVE_METRIC)
+    parser.add_argument("--latency-weight", type=float, default=LATENCY_WEIGHT, help="Metric points traded per ms of per-window latency")
+    parser.add_argument("--max-latency-us", type=float, default=MAX_LATENCY_US, help="Only export candidates under this per-window latency")
+    parser.add_argument("--output", default=DEFAULT_BUNDLE, help="Bundle path for the exported model")
+    parser.add_argument("--legacy-session", default=LEGACY_SESSION, help="Session dataset_preprocessing gave rows featurized without one")
+    parser.add_argument("--force", action="store_true", help="Save an incremental refit even if its held-out accuracy dropped")
+    args = parser.parse_args()
+    if args.incremental:
+        train_incremental(args.output, legacy_session=args.legacy_session, force=args.force)
+    elif args.search:
+        search_models(args.n_jobs, args.metric, args.latency_weight, args.max_latency_us, args.output)
+    else:
+        train_model(headless=args.headless)
@@ -0,0 +1,67 @@
+import glob
+import html
+import os
+
+import numpy as np
+
+from movement_store import MovementStore
+
+MAX_POINTS = 5000  # Points per plot in headless mode; larger sessions are randomly downsampled
+
+
+def session_inputs(paths, required_columns):
+    """
+    Expands files, MovementStore directories and directories of sessions into a
+    sorted list of inputs. CSVs are kept only if their header has required_columns.
+    """
+    inputs = set()
+    for path in paths:
+        if MovementStore.is_store(path):
+            inputs.add(path)
+        elif os.path.isdir(path):
+            inputs.update(entry for entry in glob.glob(os.path.join(path, "*")) if MovementStore.is_store(entry))
+            inputs.update(entry for entry in glob.glob(os.path.join(path, "*.csv")) if has_columns(entry, required_columns))
+        elif has_columns(path, required_columns):
+            inputs.add(path)
+    return sorted(inputs)
+
+
+def has_columns(path, columns):
+    with open(path, newline="") as file:
+        header = set(file.readline().strip().split(","))
+    return set(columns) <= header
+
+
+def session_name(path):
+    return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+
+
+def downsample(n, max_points=MAX_POINTS, seed=0):
+    """
+    Sorted row indices of a uniform random sample of at most max_points out of n,
+    which keeps label proportions in expectation.
+    """
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, max_points, replace=False))
+
+
+def write_report(output_dir, title, entries):
+    """
+    Writes output_dir/index.html linking every plot. entries is a list of
+    (session, image file name relative to output_dir, {label: count}, shown points).
+    """
+    rows = []
+    for session, image, counts, shown in entries:
+        total = sum(counts.values())
+        label_counts = ", ".join(f"{html.escape(str(label))}: {count}" for label, count in sorted(counts.items()))
+        note = f" (showing {shown} of {total})" if shown < total else ""
+        rows.append(
+            f"<h2>{html.escape(session)}</h2>\n<p>{total} movements &mdash; {label_counts}{note}</p>\n"
+            f'<img src="{html.escape(image)}" alt="{html.escape(session)}" style="max-width:100%">'
+        )
+    path = os.path.join(output_dir, "index.html")
+    with open(path, "w") as file:
+        file.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title></head>\n")
+        file.write(f"<body>\n<h1>{html.escape(title)}</h1>\n" + "\n".join(rows) + "\n</body></html>\n")
+    return path